@@ -1,51 +1,90 @@
+import argparse
+import json
 import os
-import requests
-import gzip
+import sys
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.async_download import DownloadJob, download_files, parse_digest
+from utils.wet import iter_wet_file
+
 # 路径设置
 BASE_URL = "https://data.commoncrawl.org/"
 WET_LIST_PATH = "wet.paths"
 WET_DIR = "wet_files"
 OUTPUT_TXT_PATH = "data/cleaned_output.txt"
+# 每条 WET 记录一行 JSON：URI、语言、抓取时间，以及正文在 OUTPUT_TXT_PATH 中的字节区间
+OUTPUT_META_PATH = "data/cleaned_output.meta.jsonl"
 
-# 创建所需目录
-os.makedirs(WET_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(OUTPUT_TXT_PATH), exist_ok=True)
 
-# 读取 wetpaths
-with open(WET_LIST_PATH, "r", encoding="utf-8") as f:
-    lines = [line.strip() for line in f if line.strip()]
+def parse_args():
+    p = argparse.ArgumentParser(description="并发下载 Common Crawl WET 文件，边下载边抽取正文")
+    p.add_argument("--paths", default=WET_LIST_PATH, help="wet.paths 列表（相对 --base_url 的路径）")
+    p.add_argument("--base_url", default=BASE_URL)
+    p.add_argument("--wet_dir", default=WET_DIR, help="WET 文件保存目录")
+    p.add_argument("--output", default=OUTPUT_TXT_PATH, help="正文输出（追加）")
+    p.add_argument("--meta", default=OUTPUT_META_PATH, help="元数据 JSONL 输出（追加）")
+    p.add_argument("--concurrency", "-c", type=int, default=8, help="同时下载的文件数，默认 8")
+    p.add_argument("--retries", "-r", type=int, default=5, help="每个文件的重试次数（断点续传），默认 5")
+    p.add_argument("--checksums",
+                   help="可选的校验文件，每行“<md5/sha1/sha256 十六进制>  <wet.paths 中的路径>”")
+    return p.parse_args()
 
-urls = [BASE_URL + path for path in lines]
 
-# 打开 output 文件
-with open(OUTPUT_TXT_PATH, "a", encoding="utf-8") as f_out:
-    for url in tqdm(urls, desc="批量下载 + 解压", unit="file"):
-        filename = url.split("/")[-1]
-        local_gz_path = os.path.join(WET_DIR, filename)
+def load_checksums(path):
+    sums = {}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    hexdigest, name = line.split(None, 1)
+                    sums[name.strip().lstrip("*")] = parse_digest(hexdigest)
+    return sums
 
-        # 如果 .gz 已存在，跳过下载
-        if not os.path.exists(local_gz_path):
-            try:
-                r = requests.get(url, stream=True, timeout=30)
-                if r.status_code != 200:
-                    print(f"❌ 跳过无效地址: {url}")
-                    continue
 
-                with open(local_gz_path, "wb") as f:
-                    for chunk in r.iter_content(1024 * 1024):
-                        f.write(chunk)
+def write_records(gz_path, f_out, f_meta):
+    """按 Content-Length 切分记录，只写出正文（不含 WARC 头），元数据写入旁路 JSONL；返回记录数"""
+    n = 0
+    for rec in iter_wet_file(gz_path):
+        if not rec.payload.strip():
+            continue
+        offset = f_out.tell()
+        f_out.write(rec.payload)
+        if not rec.payload.endswith(b"\n"):
+            f_out.write(b"\n")
+        f_meta.write(json.dumps({"uri": rec.uri, "lang": rec.lang, "date": rec.date,
+                                 "offset": offset, "length": f_out.tell() - offset},
+                                ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
 
-            except Exception as e:
-                print(f"❌ 下载失败: {url}，错误: {e}")
+def main():
+    args = parse_args()
+    os.makedirs(args.wet_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    with open(args.paths, "r", encoding="utf-8") as f:
+        paths = [line.strip() for line in f if line.strip()]
+    sums = load_checksums(args.checksums)
+    jobs = [DownloadJob(args.base_url + p, os.path.join(args.wet_dir, p.split("/")[-1]), None, sums.get(p))
+            for p in paths]
+
+    # 下载在后台事件循环中并发进行；每完成一个文件就在这里解压解析，与其余下载重叠
+    failed = []
+    with open(args.output, "ab") as f_out, open(args.meta, "a", encoding="utf-8") as f_meta:
+        for res in tqdm(download_files(jobs, args.concurrency, retries=args.retries),
+                        total=len(jobs), desc="批量下载 + 解压", unit="file"):
+            if res.status == "failed":
+                print(f"❌ 下载失败: {res.url}，错误: {res.error}")
+                failed.append(res.url)
                 continue
+            try:
+                write_records(res.path, f_out, f_meta)
+            except Exception as e:
+                print(f"⚠️ 解压失败: {os.path.basename(res.path)}，错误: {e}")
+    print(f"完成：{len(jobs) - len(failed)} / {len(jobs)} 个文件")
 
-        # 解压并提取文本内容到 cleaned_output.txt
-        try:
-            with gzip.open(local_gz_path, "rt", encoding="utf-8", errors="ignore") as f_in:
-                for line in f_in:
-                    f_out.write(line)
-        except Exception as e:
-            print(f"⚠️ 解压失败: {filename}，错误: {e}")
-            continue
+
+if __name__ == "__main__":
+    main()
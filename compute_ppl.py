@@ -1,56 +1,30 @@
-import torch
-import math
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.perplexity import load_lm, perplexity, score_lines
 
 MODEL_PATH = "gpt2"
 TEXT_PATH = "data/ppl_sample.txt"
 
 # 加载 tokenizer 和 model（使用本地文件）
-tokenizer = AutoTokenizer.from_pretrained(
-    MODEL_PATH,
-    trust_remote_code=True,
-    local_files_only=True
-)
-
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_PATH,
-    trust_remote_code=True,
-    local_files_only=True
-)
+model, tokenizer, device = load_lm(MODEL_PATH, trust_remote_code=True)
 
-model.eval()
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
-
-@torch.no_grad()
-def compute_perplexity(filepath, max_length=128):
+def compute_perplexity(filepath, max_length=128, batch_size=16, max_tokens=None, stride=64):
 
     total_loss = 0.0
     total_tokens = 0
 
     with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            # 编码并截断
-            inputs = tokenizer(line, return_tensors="pt", truncation=True, max_length=max_length)
-            input_ids = inputs["input_ids"].to(device)
-
-            # 忽略过短的内容
-            if input_ids.size(1) < 2:
-                continue
-
-            outputs = model(input_ids, labels=input_ids)
-            loss = outputs.loss
-
-            total_loss += loss.item() * input_ids.size(1)
-            total_tokens += input_ids.size(1)
-
-    if total_tokens == 0:
-        return float("inf")
-    return math.exp(total_loss / total_tokens)
+        lines = (line.strip() for line in f if line.strip())
+        # 按长度分批打分，过短（不足 2 个 token）的行不计入；
+        # 超过 max_length 的行按步长 stride 的滑动窗口打分整行（stride=None 时截断）
+        for _, nll, n in score_lines(model, tokenizer, lines, device, max_length, batch_size, max_tokens,
+                                     stride=stride):
+            total_loss += nll
+            total_tokens += n
+
+    return perplexity(total_loss, total_tokens)
 
 if __name__ == "__main__":
     ppl = compute_perplexity(TEXT_PATH)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+单遍融合清洗：一次读取同时应用 filter_text_advanced.py 与 data/clean_pretrain.py 的规则
+（见 utils/text_rules.py），输入按换行对齐切成字节分片交给进程池，按分片顺序写出，
+最后打印并可选保存每条规则的拒绝计数。
+
+示例：
+  python data/clean_text.py -i data/final_dedup.txt -o data/cleaned.txt --stats clean_stats.json
+  python data/clean_text.py -i in.txt -o out.txt --rules pretrain
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from multiprocessing import cpu_count
+
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.shards import map_shards, range_lines
+from utils.text_rules import RULESETS, TextCleaner, rule_names
+
+# 子进程内的清洗器（由 init_worker 初始化）
+CLEANER = None
+
+
+def init_worker(rulesets, min_tok, max_tok):
+    global CLEANER
+    CLEANER = TextCleaner(rulesets, min_tok, max_tok)
+
+
+def clean_worker(path, start, end):
+    """清洗一个分片，返回 (保留文本, 本分片的规则计数)"""
+    CLEANER.stats = Counter()
+    kept = list(CLEANER.clean_lines(range_lines(path, start, end)))
+    text = "\n".join(kept) + "\n" if kept else ""
+    return text, CLEANER.stats
+
+
+def clean_file(input_path, output_path, rulesets=RULESETS, min_tok=5, max_tok=200,
+               workers=cpu_count(), shard_mb=16):
+    """返回 Counter：各规则拒绝的行数，以及 kept / empty"""
+    TextCleaner(rulesets, min_tok, max_tok)  # 先在主进程校验参数，避免 initializer 出错导致进程池卡死
+    stats = Counter()
+    with open(output_path, "w", encoding="utf-8") as fout, \
+         tqdm(total=os.path.getsize(input_path), desc="清洗", unit="B", unit_scale=True) as pbar:
+        for (start, end), (text, counts) in map_shards(clean_worker, input_path, shard_mb << 20, workers,
+                                                       init_worker, (rulesets, min_tok, max_tok)):
+            fout.write(text)
+            stats.update(counts)
+            pbar.update(end - start)
+    return stats
+
+
+def report(stats, rulesets):
+    total = sum(stats.values())
+    print(f"共 {total} 行，保留 {stats['kept']} 行，空行 {stats['empty']} 行")
+    for name in rule_names(rulesets):
+        n = stats[name]
+        print(f"  {name:14s} {n:>10d}  {n / total:6.2%}" if total else f"  {name:14s} {n:>10d}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="融合 advanced / pretrain 规则的单遍文本清洗")
+    p.add_argument("-i", "--input", required=True, help="输入文本")
+    p.add_argument("-o", "--output", required=True, help="输出文本")
+    p.add_argument("-r", "--rules", default=",".join(RULESETS),
+                   help="启用的规则集，逗号分隔：advanced,pretrain（默认全部）")
+    p.add_argument("--min_tok", type=int, default=5, help="pretrain 规则的最少词数")
+    p.add_argument("--max_tok", type=int, default=200, help="pretrain 规则的最多词数")
+    p.add_argument("-w", "--workers", type=int, default=cpu_count(), help="并行进程数")
+    p.add_argument("-s", "--shard_mb", type=int, default=16, help="每个分片的大小（MB）")
+    p.add_argument("--stats", help="把各规则拒绝计数写入该 JSON 文件")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rulesets = tuple(r for r in args.rules.split(",") if r)
+    stats = clean_file(args.input, args.output, rulesets, args.min_tok, args.max_tok,
+                       args.workers, args.shard_mb)
+    report(stats, rulesets)
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump({"rulesets": list(rulesets), "counts": dict(stats)}, f, ensure_ascii=False, indent=2)
+    print(f"✅ 清洗完成 → {args.output}")
@@ -1,10 +1,33 @@
 #!/usr/bin/env python3
 import argparse
+import os
 import sys
+import mmap
 import multiprocessing as mp
+from collections import deque
+from contextlib import nullcontext
+import numpy as np
 from datasketch import MinHash, MinHashLSH
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.lsh_index import band_keys, lsh_bands
+from utils.lsh_shard import LocalLSH, ShardedLSH
+from utils.sig_cache import SignatureCache, iter_offset_lines
+from utils.minhash import MinHashEngine, to_lean_minhash
+
+# 每个批量任务处理的行数
+BATCH_LINES = 500
+
+# 从签名缓存建 LSH 时每次求分带哈希的行数
+CACHE_BLOCK = 1 << 16
+
+# 子进程内的签名参数（由 init_engine 初始化）；ENGINE 为 None 表示 datasketch 引擎
+ENGINE = None
+NUM_PERM = None
+K_SHINGLE = None
+BANDS = None
+
 def get_minhash(text: str, num_perm: int, k_shingle: int = 5) -> MinHash:
     shingles = (text[i:i + k_shingle] for i in range(len(text) - k_shingle + 1))
     m = MinHash(num_perm=num_perm)
@@ -16,6 +39,169 @@ def worker(args):
     idx, text, num_perm, k_shingle = args
     return idx, text, get_minhash(text, num_perm, k_shingle)
 
+def init_engine(engine, num_perm, k_shingle, bands=None):
+    global ENGINE, NUM_PERM, K_SHINGLE, BANDS
+    ENGINE = MinHashEngine(num_perm=num_perm, k_shingle=k_shingle) if engine == "numpy" else None
+    NUM_PERM, K_SHINGLE, BANDS = num_perm, k_shingle, bands
+
+def batch_worker(args):
+    """一次计算一批行的签名：numpy 引擎回传签名矩阵，datasketch 引擎回传 MinHash 列表"""
+    start, batch = args
+    if ENGINE is None:
+        return start, [get_minhash(text, NUM_PERM, K_SHINGLE) for text in batch]
+    return start, ENGINE.signatures(batch)
+
+def band_worker(args):
+    """分片模式：直接回传 (n, b) 分带哈希，比整条签名小 r 倍"""
+    start, sigs = batch_worker(args)
+    if ENGINE is None:
+        sigs = np.vstack([m.hashvalues for m in sigs])
+    return start, band_keys(sigs, *BANDS)
+
+def as_minhashes(sigs, engine):
+    if engine == "numpy":
+        return [to_lean_minhash(hv) for hv in sigs]
+    return sigs
+
+def signed_lines(lines, args):
+    """按输入顺序产出 (idx, text, minhash)"""
+    if args.engine == "datasketch":
+        job_args = [(i, line, args.num_perm, args.shingle_size) for i, line in enumerate(lines)]
+        with mp.Pool(args.processes) as pool:
+            yield from tqdm(pool.imap(worker, job_args, chunksize=500),
+                            total=len(job_args), desc="生成 MinHash", mininterval=60)
+        return
+
+    batches = [(i, lines[i:i + BATCH_LINES]) for i in range(0, len(lines), BATCH_LINES)]
+    with mp.Pool(args.processes, initializer=init_engine,
+                 initargs=(args.engine, args.num_perm, args.shingle_size)) as pool:
+        for start, sigs in tqdm(pool.imap(batch_worker, batches),
+                                total=len(batches), desc="生成 MinHash", mininterval=60):
+            for j, m in enumerate(as_minhashes(sigs, args.engine)):
+                yield start + j, lines[start + j], m
+
+def iter_input(path):
+    """逐行读取非空输入，不在内存中保留整个文件"""
+    with (nullcontext(sys.stdin) if path == "-" else open(path, "r", encoding="utf-8")) as f:
+        for line in f:
+            t = line.strip()
+            if t:
+                yield t
+
+def iter_batches(lines, size):
+    batch, start = [], 0
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield start, batch
+            start += len(batch)
+            batch = []
+    if batch:
+        yield start, batch
+
+def stream_batches(lines, args, fn, bands=None):
+    """
+    流式并行：最多 window 行的批次在途（pool.imap 会把输入一次性读空，所以这里
+    用 apply_async + 定长队列自己限流），按输入顺序产出 (start, batch, fn 的结果)。
+    """
+    max_inflight = max(1, args.window // BATCH_LINES)
+    pending = deque()
+    with mp.Pool(args.processes, initializer=init_engine,
+                 initargs=(args.engine, args.num_perm, args.shingle_size, bands)) as pool:
+        for start, batch in iter_batches(lines, BATCH_LINES):
+            pending.append((batch, pool.apply_async(fn, ((start, batch),))))
+            while len(pending) >= max_inflight:
+                batch, res = pending.popleft()
+                yield (batch, *res.get())
+        while pending:
+            batch, res = pending.popleft()
+            yield (batch, *res.get())
+
+def stream_signed(lines, args):
+    """流式签名，按输入顺序产出 (idx, text, minhash)"""
+    for batch, start, sigs in stream_batches(lines, args, batch_worker):
+        for j, (text, m) in enumerate(zip(batch, as_minhashes(sigs, args.engine))):
+            yield start + j, text, m
+
+def stream_dedup(args):
+    """边签名边查询/插入 LSH，并立即写出；内存 ≈ 窗口 + LSH 索引"""
+    lsh = MinHashLSH(threshold=args.threshold, num_perm=args.num_perm)
+    n_in = n_out = 0
+    with open(args.output, "w", encoding="utf-8") as fout:
+        for idx, text, m in tqdm(stream_signed(iter_input(args.input), args),
+                                 desc="流式去重", unit=" 行", mininterval=60):
+            n_in += 1
+            if not lsh.query(m):
+                lsh.insert(str(idx), m)
+                fout.write(text + "\n")
+                n_out += 1
+    print(f"✅ 去重完成：{n_in} → {n_out} 行")
+
+def sharded_dedup(args):
+    """
+    分片模式：签名进程池直接产出分带哈希，LSH 的 band 分给 args.shards 个常驻进程，
+    主进程只做按序合并；结果与顺序 query/insert 相同（先到先得），读写同流式模式。
+    """
+    bands = lsh_bands(args.threshold, args.num_perm)
+    n_in = n_out = 0
+    with ShardedLSH(bands[0], args.shards) as lsh, \
+         open(args.output, "w", encoding="utf-8") as fout:
+        pbar = tqdm(desc="分片去重", unit=" 行", mininterval=60)
+        for batch, start, keys in stream_batches(iter_input(args.input), args, band_worker, bands):
+            keep = lsh.insert_unique(keys)
+            for text, k in zip(batch, keep):
+                if k:
+                    fout.write(text + "\n")
+            n_in += len(batch)
+            n_out += int(keep.sum())
+            pbar.update(len(batch))
+        pbar.close()
+    print(f"✅ 去重完成：{n_in} → {n_out} 行")
+
+def build_sig_cache(args, cache):
+    """流式签名整个输入，连同每行的字节区间写入签名缓存"""
+    offsets = deque()
+
+    def texts():
+        for start, end, text in iter_offset_lines(args.input):
+            offsets.append((start, end))
+            yield text
+
+    with cache.writer() as w:
+        for batch, _, sigs in tqdm(stream_batches(texts(), args, batch_worker),
+                                   desc="生成签名缓存", unit=" 批", mininterval=60):
+            if args.engine == "datasketch":
+                sigs = np.vstack([m.hashvalues for m in sigs])
+            w.append(sigs, [offsets.popleft() for _ in batch])
+    print(f"签名缓存已写入 {cache.dir}（{w.n} 行）")
+
+def cached_dedup(args):
+    """
+    签名缓存模式：缓存缺失或语料已改动时先构建一次，之后 memmap 打开，
+    按本次阈值的 (b, r) 分块求分带哈希、先到先得去重，再按行偏移回读输入写出保留行。
+    """
+    cache = SignatureCache(args.sig_cache, args.input, args.num_perm, args.shingle_size, args.engine)
+    loaded = cache.load()
+    if loaded is None:
+        build_sig_cache(args, cache)
+        loaded = cache.load()
+    else:
+        print(f"使用签名缓存 {cache.dir}")
+    sigs, offsets = loaded
+
+    b, r = lsh_bands(args.threshold, args.num_perm)
+    keep = np.zeros(len(sigs), dtype=bool)
+    with (ShardedLSH(b, args.shards) if args.shards > 0 else LocalLSH(b)) as lsh:
+        for s in tqdm(range(0, len(sigs), CACHE_BLOCK), desc="去重中", mininterval=60):
+            keep[s:s + CACHE_BLOCK] = lsh.insert_unique(band_keys(sigs[s:s + CACHE_BLOCK], b, r))
+
+    with open(args.input, "rb") as fin, open(args.output, "w", encoding="utf-8") as fout:
+        if len(sigs):
+            with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start, end in offsets[keep].tolist():
+                    fout.write(mm[start:end].decode("utf-8").strip() + "\n")
+    print(f"✅ 去重完成：{len(sigs)} → {int(keep.sum())} 行")
+
 def main():
     parser = argparse.ArgumentParser(description="Fast MinHash-LSH deduplication")
     parser.add_argument("-i", "--input", required=True,
@@ -30,8 +216,32 @@ def main():
                         help="Number of parallel processes")
     parser.add_argument("-k", "--shingle_size", type=int, default=5,
                         help="Shingle size (in characters)")
+    parser.add_argument("-e", "--engine", choices=["numpy", "datasketch"], default="numpy",
+                        help="签名引擎：numpy 批量向量化（默认）或 datasketch 逐 shingle update")
+    parser.add_argument("-s", "--stream", action="store_true",
+                        help="流式模式：不整体读入，按滑动窗口并行签名并立即写出")
+    parser.add_argument("-w", "--window", type=int, default=50000,
+                        help="流式模式下最多在途的行数（建议 ≥ processes × 500）")
+    parser.add_argument("-S", "--shards", type=int, default=0,
+                        help="LSH 分片进程数；>0 时按 band 分片并行查询/插入（采用流式读写）")
+    parser.add_argument("-c", "--sig_cache",
+                        help="签名缓存目录：首次运行时保存签名，之后换阈值重跑直接复用")
     args = parser.parse_args()
 
+    if args.sig_cache:
+        if args.input == "-":
+            parser.error("--sig_cache 需要文件输入，不支持 stdin")
+        cached_dedup(args)
+        return
+
+    if args.shards > 0:
+        sharded_dedup(args)
+        return
+
+    if args.stream:
+        stream_dedup(args)
+        return
+
     # 1. 读取所有输入
     if args.input == "-":
         lines = [line.strip() for line in sys.stdin if line.strip()]
@@ -42,10 +252,7 @@ def main():
     print(f"读取样本总数: {len(lines)} 行")
 
     # 2. 并行生成 MinHash
-    job_args = [(i, line, args.num_perm, args.shingle_size) for i, line in enumerate(lines)]
-    with mp.Pool(args.processes) as pool:
-        results = list(tqdm(pool.imap(worker, job_args, chunksize=500),
-                            total=len(job_args), desc="生成 MinHash", mininterval=60))
+    results = list(signed_lines(lines, args))
 
     # 3. 插入到 LSH 并去重
     lsh = MinHashLSH(threshold=args.threshold, num_perm=args.num_perm)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+基于后缀数组的精确子串去重：删除跨文档重复出现、长度 ≥ L 字节的片段
+（cookie 提示、页脚等整行去重删不掉的模板文字）。
+
+做法：
+1. 按换行对齐把输入切成若干字节分片，分片之间并行、内存只与分片大小有关；
+2. 每个分片把字节转成整数序列，每个换行替换成唯一的分隔值，因此重复片段不会跨文档；
+   用前缀倍增（后缀数组构造的 prefix doubling）求出所有长度为 L 的窗口的排名等价类，
+   出现 ≥ 2 次的窗口所覆盖的字节即为重复片段；
+3. 跨分片：第一遍各分片把内部找到的重复片段全部落盘（分片内去重，总量不超过分片大小），
+   只把每个片段的 64 位摘要和长度交回主进程；主进程按摘要合并，同一片段只留一份
+   （记最早的分片），按出现的分片数从多到少选入词典，直到 --dict_mb 上限，并报告丢弃的候选数；
+   第二遍把其他分片的词典条目拼到本分片前面一起计算，这样只要某段模板在任一分片内重复过，
+   它在所有分片中的出现都能被删除；
+4. 删除区间向内对齐到 UTF-8 字符边界（不切开多字节字符），再单次流式重写：
+   按分片顺序写出剩余文本，删空的行丢弃。
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from multiprocessing import cpu_count
+
+import numpy as np
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.shards import map_shards, read_range, shard_ranges
+
+# 子进程内共享的参数（由 init_worker 初始化）
+LENGTH = None
+KEEP_FIRST = None
+DICTIONARY = None
+SPILL_DIR = None
+
+
+def init_worker(length, keep_first, dictionary=None, spill_dir=None):
+    global LENGTH, KEEP_FIRST, DICTIONARY, SPILL_DIR
+    LENGTH, KEEP_FIRST, DICTIONARY, SPILL_DIR = length, keep_first, dictionary or [], spill_dir
+
+
+def segment_digest(seg: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(seg, digest_size=8).digest(), "little")
+
+
+def spill_path(spill_dir, start):
+    return os.path.join(spill_dir, f"cand-{start:016d}.bin")
+
+
+def read_spill(path):
+    """产出落盘的候选片段（每条为 4 字节长度 + 内容）"""
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(4)
+            if not head:
+                return
+            yield f.read(int.from_bytes(head, "little"))
+
+
+def to_codes(chunks, next_sep):
+    """
+    字节串列表 → int64 序列：字节取 0..255，每个换行（以及每个 chunk 末尾）
+    换成从 next_sep 开始递增的唯一分隔值。返回 (codes, 下一个可用分隔值)。
+    """
+    parts = []
+    for data in chunks:
+        c = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+        nl = np.flatnonzero(c == 0x0A)
+        c[nl] = next_sep + np.arange(len(nl))
+        next_sep += len(nl)
+        parts.append(c)
+        if not data.endswith(b"\n"):
+            parts.append(np.array([next_sep], dtype=np.int64))
+            next_sep += 1
+    if not parts:
+        return np.empty(0, dtype=np.int64), next_sep
+    return np.concatenate(parts), next_sep
+
+
+def _pair_rank(rank, shift):
+    """(rank[i], rank[i + shift]) 二元组的稠密排名；越界记为 0，小于任何真实排名"""
+    n = len(rank)
+    nxt = np.zeros(n, dtype=np.int64)
+    nxt[:n - shift] = rank[shift:] + 1
+    _, new = np.unique(rank * (n + 1) + nxt, return_inverse=True)
+    return new.astype(np.int64).ravel()
+
+
+def window_classes(codes, length):
+    """
+    每个位置起长度为 length 的窗口的等价类编号（相等窗口编号相同）。
+    前缀倍增只做到 k ≥ length/2，再用两个重叠的 k 长前缀拼出 length 长窗口，
+    即截断在深度 length 的后缀数组排名。
+    """
+    _, rank = np.unique(codes, return_inverse=True)
+    rank = rank.astype(np.int64).ravel()
+    k = 1
+    while 2 * k < length:
+        rank = _pair_rank(rank, k)
+        k *= 2
+    return _pair_rank(rank, length - k)
+
+
+def duplicate_mask(codes, length, keep_first, offset=0):
+    """
+    codes[offset:] 中属于重复片段的字节掩码。
+    keep_first=True 时每类窗口最早的一次出现不算重复（codes[:offset] 视为更早的文本）。
+    """
+    n = len(codes)
+    mask = np.zeros(n - offset, dtype=bool)
+    if n < length:
+        return mask
+    win = window_classes(codes, length)
+    valid = np.arange(n) <= n - length
+    counts = np.bincount(win[valid], minlength=win.max() + 1)
+    starts = valid & (counts[win] >= 2)
+    if keep_first:
+        first = np.full(len(counts), n, dtype=np.int64)
+        idx = np.flatnonzero(valid)
+        np.minimum.at(first, win[idx], idx)
+        starts &= np.arange(n) != first[win]
+    starts = np.flatnonzero(starts)
+    cover = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(cover, starts, 1)
+    np.add.at(cover, starts + length, -1)
+    return np.cumsum(cover[:n])[offset:] > 0
+
+
+def intervals(mask):
+    """布尔掩码 → 连续 True 区间 [(start, end), ...]"""
+    edges = np.flatnonzero(np.diff(np.r_[0, mask.view(np.int8), 0]))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def snap_to_chars(data: bytes, mask):
+    """
+    把字节掩码向内收到 UTF-8 字符边界：一个字符只有全部字节都被标记时才删除，
+    这样删除区间不会切开多字节字符（续字节形如 0b10xxxxxx）。
+    """
+    if not len(data):
+        return mask
+    arr = np.frombuffer(data, dtype=np.uint8)
+    lead = (arr & 0xC0) != 0x80
+    lead[0] = True
+    starts = np.flatnonzero(lead)
+    whole = np.minimum.reduceat(mask.view(np.uint8), starts).astype(bool)
+    return whole[np.cumsum(lead) - 1]
+
+
+def collect_worker(path, start, end):
+    """第一遍：本分片内重复片段去重后写入 SPILL_DIR，返回它们的 (摘要数组, 长度数组)"""
+    data = read_range(path, start, end)
+    codes, _ = to_codes([data], 256)
+    mask = duplicate_mask(codes, LENGTH, keep_first=False)
+    segments = {data[s:e] for s, e in intervals(mask[:len(data)])}
+    digests, lengths = [], []
+    with open(spill_path(SPILL_DIR, start), "wb") as f:
+        for seg in segments:
+            f.write(len(seg).to_bytes(4, "little"))
+            f.write(seg)
+            digests.append(segment_digest(seg))
+            lengths.append(len(seg))
+    return np.array(digests, dtype=np.uint64), np.array(lengths, dtype=np.int64)
+
+
+def build_dictionary(candidates, spill_dir, max_bytes):
+    """
+    candidates: [(分片起点, 摘要数组, 长度数组), ...]。
+    同一片段合并为一条（来源记为最早的分片），按出现的分片数从多到少、同数时短的优先，
+    选到总字节数达 max_bytes 为止。返回 (词典 [(分片起点, 片段), ...], 统计)。
+    """
+    digests = np.concatenate([d for _, d, _ in candidates])
+    lengths = np.concatenate([n for _, _, n in candidates])
+    sids = np.concatenate([np.full(len(d), sid, dtype=np.int64) for sid, d, _ in candidates])
+    stats = {"candidates": len(digests)}
+    if not len(digests):
+        return [], dict(stats, unique=0, kept=0, kept_bytes=0, dropped=0, dropped_bytes=0)
+    # 按 (摘要, 分片) 排序后每个摘要的第一条即最早的分片
+    order = np.lexsort((sids, digests))
+    digests, lengths, sids = digests[order], lengths[order], sids[order]
+    uniq, first, n_shards = np.unique(digests, return_index=True, return_counts=True)
+    lengths, sids = lengths[first], sids[first]
+    rank = np.lexsort((lengths, -n_shards))
+    within = np.cumsum(lengths[rank]) <= max_bytes
+    chosen = {int(d): int(s) for d, s in zip(uniq[rank][within], sids[rank][within])}
+    stats.update(unique=len(uniq), kept=len(chosen), kept_bytes=int(lengths[rank][within].sum()),
+                 dropped=int((~within).sum()), dropped_bytes=int(lengths[rank][~within].sum()))
+
+    dictionary = []
+    for sid in sorted(set(chosen.values())):
+        for seg in read_spill(spill_path(spill_dir, sid)):
+            if chosen.get(segment_digest(seg)) == sid:
+                dictionary.append((sid, seg))
+    return dictionary, stats
+
+
+def rewrite_worker(path, start, end):
+    """第二遍：删除本分片中的重复片段，返回 (重写后的字节, 删除字节数, 输入行数, 输出行数)"""
+    data = read_range(path, start, end)
+    # 跨分片词典（以分片起始偏移标识来源）：remove-all 模式用所有其他分片的条目，
+    # keep-first 模式只用更早分片的
+    prefix = [seg for sid, seg in DICTIONARY
+              if sid != start and (not KEEP_FIRST or sid < start)]
+    dict_codes, next_sep = to_codes(prefix, 256)
+    shard_codes, _ = to_codes([data], next_sep)
+    codes = np.concatenate([dict_codes, shard_codes])
+    mask = duplicate_mask(codes, LENGTH, KEEP_FIRST, offset=len(dict_codes))[:len(data)]
+    mask = snap_to_chars(data, mask)
+
+    kept = np.frombuffer(data, dtype=np.uint8)[~mask].tobytes()
+    # 换行从不属于重复片段，因此行结构保持不变；片段被删光的行丢弃。
+    # 删除区间已对齐字符边界，严格解码：一旦再出现错位会直接报错，而不是悄悄丢字
+    lines = [ln.strip() for ln in kept.decode("utf-8").split("\n")]
+    if data.endswith(b"\n"):
+        lines.pop()
+    out = [ln for ln in lines if ln]
+    text = "\n".join(out) + "\n" if out else ""
+    return text, int(mask.sum()), len(lines), len(out)
+
+
+def dedup_substrings(input_path, output_path, length, shard_mb, workers,
+                     keep_first=False, cross_shard=True, dict_mb=16):
+    shard_bytes = int(shard_mb * (1 << 20))
+    n_shards = len(shard_ranges(input_path, shard_bytes))
+    print(f"输入 {os.path.getsize(input_path)} 字节，切分为 {n_shards} 个分片")
+
+    dictionary = []
+    if cross_shard and n_shards > 1:
+        spill_dir = tempfile.mkdtemp(prefix="substr_cand_", dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            candidates = []
+            for (start, _), (digests, lengths) in tqdm(
+                    map_shards(collect_worker, input_path, shard_bytes, workers, init_worker,
+                               (length, keep_first, None, spill_dir)),
+                    total=n_shards, desc="收集重复片段"):
+                candidates.append((start, digests, lengths))
+            dictionary, st = build_dictionary(candidates, spill_dir, int(dict_mb * (1 << 20)))
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        print(f"跨分片词典：候选 {st['candidates']} 条（去重后 {st['unique']} 条），"
+              f"选入 {st['kept']} 条 {st['kept_bytes']} 字节")
+        if st["dropped"]:
+            print(f"⚠️ 超出 --dict_mb 上限，丢弃 {st['dropped']} 条候选（{st['dropped_bytes']} 字节），"
+                  f"这些片段只在各自分片内部去重")
+
+    removed = n_in = n_out = 0
+    with open(output_path, "w", encoding="utf-8") as fout:
+        for _, (text, r, a, b) in tqdm(map_shards(rewrite_worker, input_path, shard_bytes, workers, init_worker,
+                                                  (length, keep_first, dictionary)),
+                                       total=n_shards, desc="删除重复子串"):
+            fout.write(text)
+            removed, n_in, n_out = removed + r, n_in + a, n_out + b
+    print(f"✅ 子串去重完成：删除 {removed} 字节，行数 {n_in} → {n_out}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="后缀数组精确子串去重（删除跨文档重复片段）")
+    p.add_argument("-i", "--input", required=True, help="输入文本，每行一篇文档")
+    p.add_argument("-o", "--output", required=True, help="输出文本")
+    p.add_argument("-l", "--length", type=int, default=100,
+                   help="重复片段的最小长度（字节），默认 100")
+    p.add_argument("-s", "--shard_mb", type=float, default=16,
+                   help="每个分片的大小（MB），内存约为其 40 倍，默认 16")
+    p.add_argument("-w", "--workers", type=int, default=cpu_count(), help="并行进程数")
+    p.add_argument("--keep_first", action="store_true",
+                   help="保留每个重复片段最早的一次出现（默认全部删除，适合模板文字）")
+    p.add_argument("--no_cross_shard", action="store_true",
+                   help="只在分片内部查找重复，跳过收集跨分片词典的第一遍")
+    p.add_argument("--dict_mb", type=float, default=16,
+                   help="跨分片词典总大小上限（MB，同一片段只计一次，按出现的分片数优先选入），默认 16；"
+                        "每个分片计算时都会带上整个词典，内存约为（分片 + 词典）的 40 倍")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    dedup_substrings(args.input, args.output, args.length, args.shard_mb, args.workers,
+                     keep_first=args.keep_first, cross_shard=not args.no_cross_shard,
+                     dict_mb=args.dict_mb)
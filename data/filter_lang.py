@@ -1,101 +1,157 @@
 #!/usr/bin/env python3
 import argparse
-import fasttext
+import json
 import os
-from multiprocessing import Pool, cpu_count
+import sys
+from contextlib import ExitStack
+from multiprocessing import cpu_count
+
+import fasttext
+import numpy as np
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.script_ratio import LANG_SCRIPTS, script_ratios
+from utils.shards import map_shards, range_lines
+
+# 子进程内的模型与参数（由 init_model 初始化）
+clf = None
+ROUTES = None          # {语言: 最低置信度}
+script_thresh = None
+
 def parse_args():
-    p = argparse.ArgumentParser(description="并行化快速英语行过滤（FastText + 多进程）")
+    p = argparse.ArgumentParser(description="并行化快速语言过滤 / 多语言分流（FastText + 多进程）")
     p.add_argument("--input", "-i", required=True,
                    help="输入文件，每行一句待过滤文本")
     p.add_argument("--output", "-o", default="data/lang_en.txt",
-                   help="输出文件，只保留英语行")
+                   help="输出文件（白名单只有一种语言时使用）")
+    p.add_argument("--output_dir", "-d",
+                   help="分流模式：每种白名单语言写入 <output_dir>/<lang>.txt")
+    p.add_argument("--langs", "-l",
+                   help="语言白名单，逗号分隔，如 en,zh；默认取 --config 的 lang_whitelist，否则为 en")
+    p.add_argument("--config", "-c",
+                   help="流水线配置（如 configs/en_only.json），读取其中的 lang_whitelist")
+    p.add_argument("--min_prob", type=float, default=0.0,
+                   help="默认的 FastText 最低置信度，默认 0（只看 top-1 标签）")
+    p.add_argument("--thresholds",
+                   help="按语言的最低置信度，如 en=0.6,zh=0.4，覆盖 --min_prob")
     p.add_argument("--model", "-m",
                    default="lid.176.ftz",
                    help="FastText 语言识别模型文件路径")
     p.add_argument("--workers", "-w", type=int, default=cpu_count(),
                    help="并发进程数，默认使用全部 CPU 核")
-    p.add_argument("--ascii_thresh", type=float, default=0.8,
-                   help="ASCII 字符比例阈值，先做预过滤，默认 0.8")
+    p.add_argument("--script_thresh", "--ascii_thresh", type=float, default=0.8,
+                   help="文字占比阈值（en 为 ASCII 占比，zh 为汉字+标点占比等），先做预过滤，默认 0.8")
+    p.add_argument("--chunk_kb", type=int, default=1024,
+                   help="每个任务的输入大小（KB，按行对齐），默认 1024")
+    p.add_argument("--inflight", type=int, default=0,
+                   help="同时在途的任务数，默认 workers × 2")
     return p.parse_args()
 
-def looks_english_ascii(line, thresh):
-    """快速预过滤：ASCII 字符比例不足即直接丢弃"""
-    if not line:
-        return False
-    cnt = sum(1 for c in line if ord(c) < 128)
-    return (cnt / len(line)) >= thresh
+def build_routes(args):
+    """{语言: 最低置信度}，保持白名单顺序"""
+    if args.langs:
+        langs = [x.strip() for x in args.langs.split(",") if x.strip()]
+    elif args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            langs = json.load(f).get("lang_whitelist") or ["en"]
+    else:
+        langs = ["en"]
+    routes = {lang: args.min_prob for lang in langs}
+    for item in (args.thresholds or "").split(","):
+        if item.strip():
+            lang, _, prob = item.partition("=")
+            if lang.strip() not in routes:
+                sys.exit(f"--thresholds 中的 {lang.strip()} 不在语言白名单 {langs} 中")
+            routes[lang.strip()] = float(prob)
+    return routes
 
-def init_model(model_path):
-    global clf
+def init_model(model_path, routes, thresh):
+    global clf, ROUTES, script_thresh
     clf = fasttext.load_model(model_path)
+    ROUTES, script_thresh = routes, thresh
 
-def detect_en(line):
+def routed_lines(lines):
     """
-    单行判定：先 ASCII 预过滤，再 FastText 判断
-    返回该行或者 None
+    批量分流：先按各白名单语言的文字占比预过滤（任一语言达标即保留），
+    剩余行一次 predict（每行只预测一次），按预测语言的置信度阈值与文字占比决定去向。
+    按输入顺序产出 (语言, 行)，未命中任何白名单语言的行不产出
     """
-    line = line.strip()
-    if not looks_english_ascii(line, ascii_thresh):
-        return None
-
-    # FastText 预测
-    label, prob = clf.predict(line.replace("\n", " "), k=1)[0][0], clf.predict(line, k=1)[1][0]
-    if label == "__label__en":
-        return line
-    return None
+    lines = [line for line in (l.strip() for l in lines) if line]
+    scripts = sorted({LANG_SCRIPTS[lang] for lang in ROUTES if lang in LANG_SCRIPTS})
+    ok = script_ratios(lines, scripts) >= script_thresh
+    if all(lang in LANG_SCRIPTS for lang in ROUTES):
+        cands = np.flatnonzero(ok.any(axis=1))
+    else:
+        # 白名单里有未登记文字系统的语言，不能预过滤
+        cands = np.arange(len(lines))
+    if len(cands) == 0:
+        return
+    labels, probs = clf.predict([lines[i] for i in cands], k=1)
+    for i, lab, prob in zip(cands.tolist(), labels, probs):
+        lang = lab[0][len("__label__"):]
+        if lang not in ROUTES or prob[0] < ROUTES[lang]:
+            continue
+        script = LANG_SCRIPTS.get(lang)
+        if script is not None and not ok[i, scripts.index(script)]:
+            continue
+        yield lang, lines[i]
 
-def worker(lines):
-    """给多进程 Pool 用的简单包装"""
-    out = []
-    for line in lines:
-        res = detect_en(line)
-        if res:
-            out.append(res)
+def route_lines(lines):
+    """返回 {语言: [行, ...]}"""
+    out = {lang: [] for lang in ROUTES}
+    for lang, line in routed_lines(lines):
+        out[lang].append(line)
     return out
 
-def chunked_iterable(iterable, chunk_size):
-    """把可迭代对象切块，返回一堆小列表"""
-    it = iter(iterable)
-    while True:
-        chunk = []
-        try:
-            for _ in range(chunk_size):
-                chunk.append(next(it))
-        except StopIteration:
-            if chunk:
-                yield chunk
-            break
-        yield chunk
+def filter_lines(lines):
+    """只保留白名单语言的行，保持输入顺序（流水线里各语言写入同一输出时使用）"""
+    return [line for _, line in routed_lines(lines)]
+
+def worker(path, start, end):
+    """处理文件中按行对齐的 [start, end) 字节区间，返回 {语言: [行, ...]}"""
+    return route_lines(range_lines(path, start, end))
+
+def route_file(input_path, outputs, model_path, routes, workers, thresh,
+               chunk_bytes=1 << 20, max_inflight=0):
+    """
+    outputs: {语言: 输出路径}。最多 max_inflight 块同时在途（默认 workers × 2），
+    按分片顺序写出；返回 {语言: 写出的行数}
+    """
+    counts = {lang: 0 for lang in routes}
+    with ExitStack() as stack:
+        files = {}
+        for lang, path in outputs.items():
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            files[lang] = stack.enter_context(open(path, "w", encoding="utf-8"))
+        pbar = stack.enter_context(tqdm(total=os.path.getsize(input_path), desc="Routing languages",
+                                        unit="B", unit_scale=True))
+        # 预载模型到每个子进程；子进程按字节区间自行从 mmap 读取
+        for (start, end), result in map_shards(worker, input_path, chunk_bytes, workers, init_model,
+                                               (model_path, routes, thresh), max_inflight):
+            for lang, lines in result.items():
+                files[lang].writelines(line + "\n" for line in lines)
+                counts[lang] += len(lines)
+            pbar.update(end - start)
+    return counts
 
 if __name__ == "__main__":
     args = parse_args()
-    ascii_thresh = args.ascii_thresh
 
     if not os.path.exists(args.model):
         print(f"FastText 模型 {args.model} 不存在，请先下载：")
         print("  wget https://dl.fbaipublicfiles.com/fasttext/supervised-models/lid.176.ftz")
         exit(1)
 
-    # 预载模型到每个子进程
-    pool = Pool(processes=args.workers, initializer=init_model, initargs=(args.model,))
-
-    with open(args.input, "r", encoding="utf-8", errors="ignore") as fin, \
-         open(args.output, "w", encoding="utf-8") as fout:
-
-        # 把大文件分片，每片 2000 行发给一个 worker
-        total = sum(1 for _ in open(args.input, encoding="utf-8", errors="ignore"))
-        pbar = tqdm(total=total, desc="Filtering English", unit=" lines")
-
-        for chunk in chunked_iterable(fin, chunk_size=2000):
-            # apply_async 比 imap 更灵活，但这里用 map 保序也 OK
-            results = pool.apply(worker, (chunk,))
-            for line in results:
-                fout.write(line + "\n")
-            pbar.update(len(chunk))
+    routes = build_routes(args)
+    if args.output_dir:
+        outputs = {lang: os.path.join(args.output_dir, f"{lang}.txt") for lang in routes}
+    elif len(routes) == 1:
+        outputs = {lang: args.output for lang in routes}
+    else:
+        sys.exit("白名单有多种语言时请用 --output_dir 指定分流输出目录")
 
-        pbar.close()
-    pool.close()
-    pool.join()
-    print(f"Done! 英文行已写入 {args.output}")
+    counts = route_file(args.input, outputs, args.model, routes, args.workers, args.script_thresh,
+                        args.chunk_kb << 10, args.inflight)
+    for lang, n in counts.items():
+        print(f"Done! {n} 行 {lang} 已写入 {outputs[lang]}")
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+声明式流式流水线：按配置（如 configs/en_only.json）的 "pipeline" 列表依次执行各阶段，
+全程只读一遍输入、写一遍输出，阶段之间不落中间文件。
+
+- 无状态阶段（split / filter / clean / minify）逐批独立处理，相邻的若干个合并成一个
+  进程池任务，一批行在同一个子进程里连续走完这些阶段；
+- dedup 依赖先到先得的全局状态：子进程只算 MinHash 分带哈希，主进程按输入顺序
+  查询 / 插入 LSH，再把保留的行交给下一段；
+- 每一段都是有界的按序 apply_async 队列（utils.shards.imap_bounded），各段按需拉取，
+  同一时刻每段最多 inflight 批在途，内存与输入大小无关；
+- 输出达到 target_size 后立即停止，剩余输入不再读取；
+- 指定 --cache 时，每个阶段每批的输出按「输入摘要 + 参数 + 代码版本」存入
+  utils.stage_cache，重跑时子进程从最深的命中阶段接着算，没变的阶段不再重算；
+  分片边界由 --chunk_kb 决定，改变它会使第一段的缓存全部失效。
+
+可选的 "params" 覆盖各阶段默认参数，例如：
+  "params": {"dedup": {"threshold": 0.7}, "split": {"model_path": "models/yi-1.5-9b"}}
+
+示例：
+  python data/pipeline.py -c configs/en_only.json -i data/all_raw.txt -o data/pretrain_en.txt
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter, deque
+from contextlib import nullcontext
+from multiprocessing import Pool, cpu_count
+
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.lsh_index import band_keys, lsh_bands
+from utils.lsh_shard import LocalLSH
+from utils.shards import imap_bounded, range_lines, read_range, shard_ranges
+from utils.stage_cache import StageCache, digest, path_stat, stage_fingerprint
+
+# 各阶段的默认参数，与对应单独脚本的命令行默认值一致
+DEFAULT_PARAMS = {
+    "dedup": {"threshold": 0.8, "num_perm": 128, "shingle_size": 5},
+    "split": {"model_path": "models/yi-1.5-9b", "max_tokens": 512},
+    "filter": {"model": "lid.176.ftz", "min_prob": 0.0, "script_thresh": 0.8},
+    "clean": {"rules": ["advanced", "pretrain"], "min_tok": 5, "max_tok": 200},
+    "minify": {},
+}
+# 各阶段的代码版本取这些源文件的内容摘要：阶段执行到的全部仓库内模块（含其导入的模块）
+STAGE_CODE = {
+    "dedup": ["data/pipeline.py", "utils/minhash.py", "utils/lsh_index.py", "utils/lsh_shard.py",
+              "utils/fingerprint.py"],
+    "split": ["data/split_sentences.py", "utils/shards.py"],
+    "filter": ["data/filter_lang.py", "utils/script_ratio.py", "utils/shards.py"],
+    "clean": ["data/clean_text.py", "utils/text_rules.py", "utils/shards.py"],
+    "minify": ["data/pipeline.py"],
+}
+# 参数中指向模型文件的键，其大小与 mtime 计入阶段指纹
+STAGE_MODEL = {"split": "model_path", "filter": "model"}
+# 需要全局状态、在主进程按输入顺序决定去留的阶段
+GATE_STAGES = ("dedup",)
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+# 子进程内各段的阶段函数（由 init_worker 初始化）：[[(阶段名, fn(lines) -> lines), ...], ...]
+SEGMENTS = None
+# 子进程内 dedup 的签名参数：(MinHashEngine, b, r)
+SIGNER = None
+# 子进程内的阶段缓存与各阶段指纹（未启用缓存时为 None）
+CACHE = None
+FINGERPRINTS = None
+
+
+def parse_size(text):
+    """'5GB' / '500M' / '1.5 GiB' / 1024 → 字节数（1K = 1024）；None 或空表示不限"""
+    if text is None or text == "":
+        return None
+    if isinstance(text, (int, float)):
+        return int(text)
+    m = re.fullmatch(r"\s*([0-9.]+)\s*([KMGT]?)(?:I?B)?\s*", text.upper())
+    if not m:
+        raise ValueError(f"无法解析的大小：{text!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2)])
+
+
+def plan(stages):
+    """
+    把阶段列表切成若干段：每段是一串无状态阶段，可选地以一个 GATE_STAGES 阶段结尾。
+    返回 [(无状态阶段名列表, gate 阶段名或 None), ...]
+    """
+    unknown = [s for s in stages if s not in DEFAULT_PARAMS]
+    if unknown:
+        raise ValueError(f"未知的流水线阶段：{unknown}，可选 {list(DEFAULT_PARAMS)}")
+    segments, maps = [], []
+    for name in stages:
+        if name in GATE_STAGES:
+            segments.append((maps, name))
+            maps = []
+        else:
+            maps.append(name)
+    if maps or not segments:
+        segments.append((maps, None))
+    return segments
+
+
+def stage_params(config):
+    """默认参数叠加配置中的 params；filter 的语言白名单取 lang_whitelist"""
+    params = {name: dict(p, **config.get("params", {}).get(name, {}))
+              for name, p in DEFAULT_PARAMS.items()}
+    params["filter"].setdefault("langs", config.get("lang_whitelist") or ["en"])
+    return params
+
+
+def minify_lines(lines):
+    """把行内连续空白压成一个空格，丢弃压缩后为空的行"""
+    return [line for line in (" ".join(l.split()) for l in lines) if line]
+
+
+def make_stage(name, params):
+    """构造无状态阶段 fn(lines) -> lines；依赖较重的模块只在用到时导入"""
+    p = params[name]
+    if name == "split":
+        from data import split_sentences
+        split_sentences.init_worker(p["model_path"], p["max_tokens"], with_counts=False)
+        return lambda lines: split_sentences.split_block(lines)[0]
+    if name == "filter":
+        from data import filter_lang
+        filter_lang.init_model(p["model"], {lang: p["min_prob"] for lang in p["langs"]},
+                               p["script_thresh"])
+        return filter_lang.filter_lines
+    if name == "clean":
+        from data import clean_text
+        clean_text.init_worker(p["rules"], p["min_tok"], p["max_tok"])
+        cleaner = clean_text.CLEANER
+        return lambda lines: list(cleaner.clean_lines(lines))
+    if name == "minify":
+        return minify_lines
+    raise ValueError(f"{name} 不是无状态阶段")
+
+
+def init_worker(segments, params, cache_dir=None):
+    global SEGMENTS, SIGNER, CACHE, FINGERPRINTS
+    SEGMENTS = [[(name, make_stage(name, params)) for name in maps] for maps, _ in segments]
+    if any(gate == "dedup" for _, gate in segments):
+        from utils.minhash import MinHashEngine
+        p = params["dedup"]
+        SIGNER = (MinHashEngine(num_perm=p["num_perm"], k_shingle=p["shingle_size"]),
+                  *lsh_bands(p["threshold"], p["num_perm"]))
+    if cache_dir:
+        CACHE = StageCache(cache_dir)
+        FINGERPRINTS = {
+            name: stage_fingerprint(name, params[name], STAGE_CODE[name],
+                                    path_stat(params[name][STAGE_MODEL[name]]) if name in STAGE_MODEL else None)
+            for maps, gate in segments for name in maps + ([gate] if gate else [])}
+
+
+def segment_worker(seg, gate, item):
+    """
+    执行第 seg 段：第 0 段的 item 是输入的字节区间 (path, start, end)，之后各段是上一段保留的行。
+    返回 (行, gate 所需的数据, 各阶段的输出行数与缓存命中 / 未命中的阶段数)
+    """
+    stages = SEGMENTS[seg] + ([(gate, None)] if gate else [])
+    lines, counts, payload, done = None, Counter(), None, 0
+    if CACHE is not None:
+        key = digest(read_range(*item) if seg == 0 else "\n".join(item))
+        keys = []
+        for name, _ in stages:
+            key = digest(key, FINGERPRINTS[name])
+            keys.append(key)
+        # 从最深的阶段往回找，命中即从下一阶段接着算
+        for i in range(len(keys) - 1, -1, -1):
+            hit = CACHE.get(keys[i])
+            if hit is not None:
+                lines, counts, payload = hit
+                done = i + 1
+                break
+    if lines is None:
+        if seg == 0:
+            lines = [line for line in (l.strip() for l in range_lines(*item)) if line]
+            counts["input"] += len(lines)
+        else:
+            lines = item
+    for i in range(done, len(stages)):
+        name, fn = stages[i]
+        if fn is not None:
+            lines = fn(lines) if lines else lines
+            counts[name] += len(lines)
+        elif name == "dedup" and lines:
+            engine, b, r = SIGNER
+            payload = band_keys(engine.signatures(lines), b, r)
+        if CACHE is not None:
+            CACHE.put(keys[i], (lines, counts, payload))
+    counts = Counter(counts)
+    if CACHE is not None:
+        counts["cache_hit"] += done
+        counts["cache_miss"] += len(stages) - done
+    return lines, payload, counts
+
+
+def apply_gate(results, gate, lsh, stats):
+    """主进程侧：按顺序消费一段的结果，过 gate 后产出交给下一段的行"""
+    for size, (lines, payload, counts) in results:
+        stats.update(counts)
+        if gate == "dedup" and lines:
+            keep = lsh.insert_unique(payload)
+            lines = [line for line, k in zip(lines, keep) if k]
+            stats["dedup"] += len(lines)
+        yield size, lines
+
+
+def run_pipeline(config, input_path, output_path, workers=cpu_count(), chunk_bytes=1 << 20,
+                 max_inflight=0, target_bytes=None, cache_dir=None, cache_bytes=None):
+    """
+    按 config["pipeline"] 处理 input_path 写入 output_path。
+    cache_dir: 阶段缓存目录，None 表示不用缓存；cache_bytes: 缓存大小上限，运行前后各按 LRU 淘汰一次。
+    返回 (各阶段输出行数 Counter, 写出的字节数)
+    """
+    segments = plan(config["pipeline"])
+    params = stage_params(config)
+    # 先在主进程构造一次各阶段，参数或模型路径有误时直接报错，避免 initializer 出错导致进程池卡死
+    init_worker(segments, params, cache_dir)
+    cache = StageCache(cache_dir, cache_bytes) if cache_dir else None
+    if cache is not None:
+        cache.prune()
+    p = params["dedup"]
+    lsh = LocalLSH(lsh_bands(p["threshold"], p["num_perm"])[0]) if SIGNER else None
+    max_inflight = max_inflight or workers * 2
+    stats = Counter()
+    written = 0
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with (Pool(workers, initializer=init_worker, initargs=(segments, params, cache_dir))
+          if workers > 1 else nullcontext()) as pool, \
+         open(output_path, "wb") as fout, \
+         tqdm(total=os.path.getsize(input_path), desc="流水线", unit="B", unit_scale=True) as pbar:
+
+        def run_segment(seg, gate, upstream):
+            """upstream: (输入字节数, item)；产出 (输入字节数, segment_worker 的结果)"""
+            if pool is None:
+                for size, item in upstream:
+                    yield size, segment_worker(seg, gate, item)
+                return
+            sizes = deque()
+
+            def items():
+                for size, item in upstream:
+                    sizes.append(size)
+                    yield seg, gate, item
+
+            for result in imap_bounded(pool, segment_worker, items(), max_inflight):
+                yield sizes.popleft(), result
+
+        stream = ((end - start, (input_path, start, end))
+                  for start, end in shard_ranges(input_path, chunk_bytes))
+        for seg, (_, gate) in enumerate(segments):
+            stream = apply_gate(run_segment(seg, gate, stream), gate, lsh, stats)
+
+        for size, lines in stream:
+            for line in lines:
+                data = (line + "\n").encode("utf-8")
+                fout.write(data)
+                written += len(data)
+                stats["output"] += 1
+                if target_bytes and written >= target_bytes:
+                    break
+            pbar.update(size)
+            if target_bytes and written >= target_bytes:
+                print(f"已达到目标大小 {target_bytes} 字节，提前结束")
+                break
+    if cache is not None:
+        removed, freed = cache.prune()
+        if removed:
+            print(f"阶段缓存淘汰 {removed} 个条目，释放 {freed} 字节")
+    return stats, written
+
+
+def report(stats, stages):
+    print(f"输入 {stats['input']} 行")
+    for name in stages:
+        print(f"  {name:8s} → {stats[name]:>10d} 行")
+    print(f"写出 {stats['output']} 行")
+    if stats["cache_hit"] or stats["cache_miss"]:
+        print(f"阶段缓存：命中 {stats['cache_hit']} 次，重算 {stats['cache_miss']} 次")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="按配置串联 dedup / split / filter / clean / minify 的单遍流式流水线")
+    p.add_argument("-c", "--config", default="configs/en_only.json", help="流水线配置 JSON")
+    p.add_argument("-i", "--input", required=True, help="输入文本（每行一条）")
+    p.add_argument("-o", "--output", required=True, help="输出文本")
+    p.add_argument("-w", "--workers", type=int, default=cpu_count(), help="并行进程数，默认全核")
+    p.add_argument("--chunk_kb", type=int, default=1024, help="每批输入的大小（KB，按行对齐），默认 1024")
+    p.add_argument("--inflight", type=int, default=0, help="每段同时在途的批数，默认 workers × 2")
+    p.add_argument("--target_size", help="输出达到该大小即停止，如 5GB；默认取配置的 target_size")
+    p.add_argument("--cache", help="阶段缓存目录；重跑时未变化的阶段直接复用缓存的输出")
+    p.add_argument("--cache_size", default="20GB", help="阶段缓存的大小上限（按最近使用淘汰），默认 20GB")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    target = parse_size(args.target_size or config.get("target_size"))
+    stats, written = run_pipeline(config, args.input, args.output, args.workers,
+                                  args.chunk_kb << 10, args.inflight, target,
+                                  args.cache, parse_size(args.cache_size))
+    report(stats, config["pipeline"])
+    print(f"✅ 流水线完成：{written} 字节 → {args.output}")
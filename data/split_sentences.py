@@ -1,44 +1,104 @@
 #!/usr/bin/env python3
 import argparse
 import os
-from multiprocessing import Pool, cpu_count
+import sys
+from contextlib import nullcontext
+from multiprocessing import cpu_count
+import numpy as np
 from nltk.tokenize import sent_tokenize
 from transformers import AutoTokenizer
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.shards import map_shards, range_lines
+
+# Sentences token-counted per tokenizer batch call
+BATCH_SENTENCES = 4096
+
 # Global state for worker processes
 TOKENIZER = None
 MAX_TOKENS = None
+WITH_COUNTS = None
+# Upper bound on the normalized bytes covered by one vocab token; None disables length shortcuts
+MAX_TOKEN_BYTES = None
+NORMALIZE = None
 
-def init_worker(model_path, max_tokens):
-    """Worker initializer: load tokenizer and set max_tokens."""
-    global TOKENIZER, MAX_TOKENS
+def init_worker(model_path, max_tokens, with_counts=True):
+    """Worker initializer: load tokenizer, set max_tokens and derive the length bounds."""
+    global TOKENIZER, MAX_TOKENS, WITH_COUNTS, MAX_TOKEN_BYTES, NORMALIZE
     TOKENIZER = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
     MAX_TOKENS = max_tokens
+    WITH_COUNTS = with_counts
+    backend = getattr(TOKENIZER, "backend_tokenizer", None)
+    if backend is not None:
+        # Raw vocab strings are never shorter in UTF-8 than the bytes they cover
+        # (byte-level BPE maps each byte to one char, sentencepiece keeps "▁" in the normalized text)
+        MAX_TOKEN_BYTES = max(len(tok.encode("utf-8")) for tok in backend.get_vocab())
+        NORMALIZE = backend.normalizer.normalize_str if backend.normalizer is not None else None
+
+def token_bounds(sent):
+    """
+    Certain (lower, upper) bounds on the token count of sent. Every token covers at least one
+    byte of the normalized text (plus at most one added prefix space) and at most MAX_TOKEN_BYTES.
+    """
+    n = len((NORMALIZE(sent) if NORMALIZE else sent).encode("utf-8"))
+    return -(-n // MAX_TOKEN_BYTES), n + 1
+
+def split_block(lines):
+    """
+    Split a block of lines into sentences and keep those with at most MAX_TOKENS tokens.
+    Sentences whose byte length already decides the result skip tokenization (certainly too
+    long always; certainly short only when counts are not needed); the rest are counted
+    with one batched tokenizer call. Returns (fragments, token counts or None).
+    """
+    sents = [sent for line in lines for sent in sent_tokenize(line.strip())]
+    counts = [None] * len(sents)
+    keep = [False] * len(sents)
+    todo = []
+    for i, sent in enumerate(sents):
+        if MAX_TOKEN_BYTES:
+            lower, upper = token_bounds(sent)
+            if lower > MAX_TOKENS:
+                continue
+            if upper <= MAX_TOKENS and not WITH_COUNTS:
+                keep[i] = True
+                continue
+        todo.append(i)
+    for b in range(0, len(todo), BATCH_SENTENCES):
+        idx = todo[b:b + BATCH_SENTENCES]
+        enc = TOKENIZER([sents[i] for i in idx], add_special_tokens=False,
+                        return_attention_mask=False)["input_ids"]
+        for i, ids in zip(idx, enc):
+            counts[i] = len(ids)
+            keep[i] = len(ids) <= MAX_TOKENS
+    fragments = [s for s, k in zip(sents, keep) if k]
+    if not WITH_COUNTS:
+        return fragments, None
+    return fragments, [c for c, k in zip(counts, keep) if k]
+
+def split_worker(path, start, end):
+    """Process one newline-aligned byte range; return its fragments as text plus uint32 token counts."""
+    fragments, counts = split_block(range_lines(path, start, end))
+    text = "".join(frag + "\n" for frag in fragments)
+    return text, None if counts is None else np.asarray(counts, dtype="<u4")
 
-def process_line(line):
+def split_and_filter(input_path, output_path, max_tokens, model_path, workers, shard_mb=4,
+                     counts_path=None):
     """
-    Split a line into sentences, filter by token length,
-    return list of valid fragments.
+    Main function: parallel split & filter over byte-range shards, written in input order.
+    counts_path: if given, the token count of every output line is written there as
+    little-endian uint32 (line i ↔ entry i), e.g. for length-based packing without re-tokenizing.
     """
-    fragments = []
-    for sent in sent_tokenize(line.strip()):
-        token_ids = TOKENIZER.encode(sent, add_special_tokens=False)
-        if len(token_ids) <= MAX_TOKENS:
-            fragments.append(sent)
-    return fragments
-
-def split_and_filter(input_path, output_path, max_tokens, model_path, workers):
-    """Main function: parallel split & filter."""
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    total_lines = sum(1 for _ in open(input_path, 'r', encoding='utf-8', errors='ignore'))
-    with open(input_path, 'r', encoding='utf-8', errors='ignore') as fin, \
-         open(output_path, 'w', encoding='utf-8') as fout, \
-         Pool(processes=workers, initializer=init_worker, initargs=(model_path, max_tokens)) as pool:
-
-        for fragments in tqdm(pool.imap(process_line, fin, chunksize=1000), total=total_lines, desc="Splitting"):
-            for frag in fragments:
-                fout.write(frag + "\n")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as fout, \
+         (open(counts_path, 'wb') if counts_path else nullcontext()) as fcount, \
+         tqdm(total=os.path.getsize(input_path), desc="Splitting", unit="B", unit_scale=True) as pbar:
+        for (start, end), (text, counts) in map_shards(split_worker, input_path, shard_mb << 20, workers,
+                                                       init_worker, (model_path, max_tokens, bool(counts_path))):
+            fout.write(text)
+            if counts is not None:
+                fcount.write(counts.tobytes())
+            pbar.update(end - start)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="多进程分句与切片脚本")
@@ -47,6 +107,10 @@ def parse_args():
     parser.add_argument("-m", "--max_tokens", type=int, default=512, help="最大 token 数，默认 512")
     parser.add_argument("-p", "--model_path", default="models/yi-1.5-9b", help="模型目录，用于 tokenizer")
     parser.add_argument("-w", "--workers", type=int, default=cpu_count(), help="并行进程数，默认全核")
+    parser.add_argument("-s", "--shard_mb", type=int, default=4, help="每个分片的大小（MB），默认 4")
+    parser.add_argument("-c", "--counts", help="token 数旁路文件（每行一个 little-endian uint32），默认 <output>.ntok")
+    parser.add_argument("--no_counts", action="store_true",
+                        help="不写 token 数；此时长度必然不超限的句子也跳过分词")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -56,5 +120,7 @@ if __name__ == "__main__":
         output_path=args.output,
         max_tokens=args.max_tokens,
         model_path=args.model_path,
-        workers=args.workers
+        workers=args.workers,
+        shard_mb=args.shard_mb,
+        counts_path=None if args.no_counts else (args.counts or args.output + ".ntok")
     )
@@ -4,9 +4,18 @@ import os
 import sys
 import json
 import pickle
+import shutil
+
+import numpy as np
 from datasketch import MinHash, MinHashLSH
 from tqdm import tqdm
 
+from utils.lsh_index import DiskLSHIndex, write_json_atomic
+from utils.minhash import MinHashEngine, to_lean_minhash
+
+# Lines signed and checked against the index per batch
+BATCH_LINES = 1000
+
 
 def get_minhash(text: str, num_perm: int, k_shingle: int = 5) -> MinHash:
     m = MinHash(num_perm=num_perm)
@@ -15,26 +24,85 @@ def get_minhash(text: str, num_perm: int, k_shingle: int = 5) -> MinHash:
     return m
 
 
-def incremental_dedup(input_dir, output_path, threshold, num_perm, shingle_size, resume):
+def iter_signed_batches(lines, signer, num_perm, shingle_size):
+    """
+    Yield (batch, sigs) for non-empty lines in input order, where batch is a
+    list of (j, text). sigs is a (len(batch), num_perm) array for the numpy
+    engine and a list of MinHash for the datasketch engine.
+    """
+    batch = []
+    for j, line in enumerate(lines):
+        text = line.rstrip('\n')
+        if text:
+            batch.append((j, text))
+        if len(batch) >= BATCH_LINES:
+            yield batch, _sign(batch, signer, num_perm, shingle_size)
+            batch = []
+    if batch:
+        yield batch, _sign(batch, signer, num_perm, shingle_size)
+
+
+def _sign(batch, signer, num_perm, shingle_size):
+    if signer is None:
+        return [get_minhash(text, num_perm, shingle_size) for _, text in batch]
+    return signer.signatures(text for _, text in batch)
+
+
+def as_minhashes(sigs, signer):
+    if signer is None:
+        return sigs
+    return [to_lean_minhash(hv, signer.seed) for hv in sigs]
+
+
+def as_matrix(sigs):
+    if isinstance(sigs, np.ndarray):
+        return sigs
+    return np.vstack([m.hashvalues for m in sigs]).astype(np.uint64)
+
+
+def incremental_dedup(input_dir, output_path, threshold, num_perm, shingle_size, resume,
+                      engine='numpy', index='disk'):
     # Checkpoint paths
     meta_path = output_path + '.ckpt.json'
     lsh_path = output_path + '.ckpt.lsh'
+    index_dir = output_path + '.ckpt.idx'
 
     # Load or init
     files = sorted(f for f in os.listdir(input_dir) if f.endswith('.dedup'))
     total_files = len(files)
-    if resume and os.path.exists(meta_path) and os.path.exists(lsh_path):
+    meta = None
+    if resume and os.path.exists(meta_path):
         with open(meta_path, 'r') as f:
             meta = json.load(f)
+        # Checkpoints written before these options existed: datasketch signatures in a pickled LSH
+        ckpt_engine = meta.get('engine', 'datasketch')
+        ckpt_index = meta.get('index', 'pickle')
+        if (ckpt_engine, ckpt_index) != (engine, index):
+            print(f"⚠️ Checkpoint was built with engine={ckpt_engine}, index={ckpt_index}; using those instead.")
+            engine, index = ckpt_engine, ckpt_index
+        if index == 'pickle' and not os.path.exists(lsh_path):
+            meta = None
+
+    if meta is not None:
         last_idx = meta['last_idx']
-        with open(lsh_path, 'rb') as f:
-            lsh = pickle.load(f)
+        if index == 'disk':
+            lsh = DiskLSHIndex.open(index_dir, meta['lsh'])
+        else:
+            with open(lsh_path, 'rb') as f:
+                lsh = pickle.load(f)
+        # Drop output written after the last checkpoint so the chunk is not emitted twice
+        if 'out_bytes' in meta and os.path.exists(output_path):
+            os.truncate(output_path, meta['out_bytes'])
         out_mode = 'a'
         print(f"🔄 Resuming from chunk {last_idx + 1}/{total_files}, existing LSH loaded.")
     else:
         last_idx = 0
-        lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+        if index == 'disk':
+            lsh = DiskLSHIndex(index_dir, threshold=threshold, num_perm=num_perm)
+        else:
+            lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
         out_mode = 'w'
+    signer = MinHashEngine(num_perm=num_perm, k_shingle=shingle_size) if engine == 'numpy' else None
 
     with open(output_path, out_mode, encoding='utf-8') as outf:
         for idx, fname in enumerate(files, start=1):
@@ -45,27 +113,35 @@ def incremental_dedup(input_dir, output_path, threshold, num_perm, shingle_size,
 
             # Stream each line, dedupe and write immediately
             with open(full, 'r', encoding='utf-8') as infile:
-                for j, line in enumerate(tqdm(infile,
-                                              desc=f"Chunk {idx}/{total_files}",
-                                              total=os.path.getsize(full),
-                                              unit='B', unit_scale=True,
-                                              mininterval=60, maxinterval=60, miniters=1)):
-                    text = line.rstrip('\n')
-                    if not text:
+                lines = tqdm(infile,
+                             desc=f"Chunk {idx}/{total_files}",
+                             total=os.path.getsize(full),
+                             unit='B', unit_scale=True,
+                             mininterval=60, maxinterval=60, miniters=1)
+                for batch, sigs in iter_signed_batches(lines, signer, num_perm, shingle_size):
+                    if index == 'disk':
+                        keep = lsh.insert_unique(as_matrix(sigs))
+                        for (j, text), k in zip(batch, keep):
+                            if k:
+                                outf.write(text + '\n')
                         continue
-                    m = get_minhash(text, num_perm, shingle_size)
-                    if not lsh.query(m):
-                        key = f"{idx}-{j}"
-                        lsh.insert(key, m)
-                        outf.write(text + '\n')
+                    for (j, text), m in zip(batch, as_minhashes(sigs, signer)):
+                        if not lsh.query(m):
+                            key = f"{idx}-{j}"
+                            lsh.insert(key, m)
+                            outf.write(text + '\n')
             outf.flush()
 
-            # Save checkpoint
-            meta = {'last_idx': idx, 'total_files': total_files}
-            with open(meta_path, 'w', encoding='utf-8') as f:
-                json.dump(meta, f)
-            with open(lsh_path, 'wb') as f:
-                pickle.dump(lsh, f)
+            # Save checkpoint: the disk index only appends this chunk's segment
+            meta = {'last_idx': idx, 'total_files': total_files, 'engine': engine, 'index': index,
+                    'out_bytes': os.fstat(outf.fileno()).st_size}
+            if index == 'disk':
+                lsh.flush()
+                meta['lsh'] = lsh.state()
+            else:
+                with open(lsh_path, 'wb') as f:
+                    pickle.dump(lsh, f)
+            write_json_atomic(meta_path, meta)
             print(f"✅ Finished chunk {idx}, checkpoint updated.")
 
     # Cleanup checkpoint
@@ -74,6 +150,7 @@ def incremental_dedup(input_dir, output_path, threshold, num_perm, shingle_size,
         os.remove(lsh_path)
     except OSError:
         pass
+    shutil.rmtree(index_dir, ignore_errors=True)
     print(f"\n🌟 All done: output written to {output_path}")
 
 
@@ -84,6 +161,10 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--threshold', type=float, default=0.8)
     parser.add_argument('-n', '--num_perm', type=int, default=128)
     parser.add_argument('-k', '--shingle_size', type=int, default=5)
+    parser.add_argument('-e', '--engine', choices=['numpy', 'datasketch'], default='numpy',
+                        help='Signature engine: vectorized numpy batches or per-shingle datasketch updates')
+    parser.add_argument('--index', choices=['disk', 'pickle'], default='disk',
+                        help='LSH checkpoint format: append-only on-disk segments or a pickled MinHashLSH')
     parser.add_argument('--resume', action='store_true', help='Resume from last checkpoint')
     args = parser.parse_args()
     incremental_dedup(
@@ -92,5 +173,7 @@ if __name__ == '__main__':
         threshold=args.threshold,
         num_perm=args.num_perm,
         shingle_size=args.shingle_size,
-        resume=args.resume
+        resume=args.resume,
+        engine=args.engine,
+        index=args.index
     )
\ No newline at end of file
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+URL 抓取对比：原 download_texts.py 的做法（一次为全部 URL 创建 future、每次 requests.get
+新建连接、失败立即重试）vs. utils.crawler（每线程 Session、有界在途窗口、每主机限流、指数退避）。
+
+在本机起一个 HTTP 服务（HTTP/1.1 keep-alive），每个请求固定延迟 --latency_ms，
+按 --fail_rate 的概率返回 503；统计耗时、吞吐、服务端接受的 TCP 连接数、请求总数和失败数。
+
+示例：
+  python scripts/bench_crawl.py --urls 2000 --workers 16
+  python scripts/bench_crawl.py --urls 5000 --workers 32 --latency_ms 5 --fail_rate 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.crawler import Crawler, crawl
+
+PAGE = ("<html><head><title>t</title></head><body>"
+        + "".join(f"<p>paragraph {i} with some words in it</p>" for i in range(50))
+        + "</body></html>").encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和正文分两次 send；不关 Nagle 时 keep-alive 连接上每个请求都会多等一次延迟 ACK
+    disable_nagle_algorithm = True
+    latency = 0.0
+    fail_rate = 0.0
+    lock = threading.Lock()
+    connections = 0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with Handler.lock:
+            Handler.connections += 1
+
+    def do_GET(self):
+        with Handler.lock:
+            Handler.requests += 1
+        time.sleep(Handler.latency)
+        status, body = (503, b"busy") if random.random() < Handler.fail_rate else (200, PAGE)
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def baseline(urls, workers, retries):
+    """原 process_urls / download_one（不含 HTML 清洗）"""
+    def download_one(url, timeout=10):
+        for attempt in range(1, retries + 1):
+            try:
+                r = requests.get(url, timeout=timeout)
+                r.raise_for_status()
+                return r.content
+            except Exception:
+                if attempt == retries:
+                    return b""
+        return b""
+
+    with ThreadPoolExecutor(max_workers=workers) as exe:
+        futures = {exe.submit(download_one, u): u for u in urls}
+        return sum(not fut.result() for fut in as_completed(futures))
+
+
+def pooled(urls, workers, retries):
+    # 与 baseline 一致：retries 为总请求次数
+    crawler = Crawler(per_host=workers, retries=max(retries - 1, 0), backoff=0.05, pool_size=workers)
+    return sum(res.error is not None for _, res in crawl(crawler.fetch, iter(urls), workers))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="URL 抓取吞吐对比（本机 HTTP 服务）")
+    p.add_argument("--urls", type=int, default=2000, help="URL 数，默认 2000")
+    p.add_argument("--workers", "-w", type=int, default=16, help="线程数，默认 16")
+    p.add_argument("--retries", "-r", type=int, default=3, help="每个 URL 最多请求次数（含首次），默认 3")
+    p.add_argument("--latency_ms", type=float, default=2.0, help="服务端每个请求的延迟（毫秒），默认 2")
+    p.add_argument("--fail_rate", type=float, default=0.02, help="服务端返回 503 的概率，默认 0.02")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    Handler.latency = args.latency_ms / 1000
+    Handler.fail_rate = args.fail_rate
+    srv = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    urls = [f"{base}/page/{i}" for i in range(args.urls)]
+
+    print(f"{args.urls} 个 URL，{args.workers} 线程，延迟 {args.latency_ms} ms，503 概率 {args.fail_rate}")
+    print(f"{'实现':<10}{'耗时(s)':>10}{'URL/s':>10}{'TCP 连接':>10}{'请求数':>10}{'失败':>8}")
+    for name, fn in (("baseline", baseline), ("crawler", pooled)):
+        random.seed(0)
+        with Handler.lock:
+            Handler.connections = Handler.requests = 0
+        t0 = time.perf_counter()
+        failed = fn(urls, args.workers, args.retries)
+        dt = time.perf_counter() - t0
+        print(f"{name:<10}{dt:>10.2f}{args.urls / dt:>10.0f}{Handler.connections:>10}{Handler.requests:>10}{failed:>8}")
+    srv.shutdown()
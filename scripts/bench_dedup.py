@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+去重质量与吞吐基准。
+
+1. 生成合成语料：随机词表拼成的基础文档 + 按 --dup_rate 比例生成的近重复副本
+   （对某篇已有文档做 --edits 次字符级增/删/改），每行所属簇即为 ground truth；
+2. 以子进程分别运行各去重实现（data/dedup.py 各模式、incremental_stream_dedup.py
+   各索引格式），记录耗时、行/秒、峰值 RSS（os.wait4，单进程最大值）以及
+   运行过程中 checkpoint（签名缓存模式为缓存目录）占用的峰值磁盘空间；
+   签名缓存分 cold（首次运行，含构建缓存）与 warm（缓存已存在，只换阈值重跑的情形）两项；
+3. 以“删除的行”为正例计算 precision / recall / F1，结果写成 JSON。
+
+示例：
+  python scripts/bench_dedup.py --lines 50000 --dup_rate 0.3 --edits 5 -o bench_dedup.json
+  python scripts/bench_dedup.py --impls dedup-numpy,incremental-disk -t 0.7 -n 64
+新实现只需在 IMPLS 中登记一个构造命令行的函数。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ─── 合成语料 ───
+
+def make_vocab(rng, size=20000):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))) for _ in range(size)]
+
+
+def mutate(rng, text, edits):
+    chars = list(text)
+    for _ in range(edits):
+        op = rng.random()
+        pos = rng.randrange(len(chars))
+        if op < 1 / 3:
+            chars[pos] = rng.choice(string.ascii_lowercase)
+        elif op < 2 / 3:
+            chars.insert(pos, rng.choice(string.ascii_lowercase))
+        elif len(chars) > 1:
+            del chars[pos]
+    return "".join(chars).strip() or text
+
+
+# 连续这么多次抽到已有的行即认为无法再生成新行（如编辑次数太少、变体已用尽）
+MAX_REDRAWS = 10000
+
+
+def generate_corpus(n_lines, dup_rate, edits, words, seed=0):
+    """
+    返回 (lines, cluster_ids)；每行互不相同，同簇的行互为近重复。
+    dup_rate 须在 [0, 1) 内，dup_rate > 0 时 edits 须 ≥ 1（否则副本与原文相同，永远抽不出新行）。
+    """
+    if not 0 <= dup_rate < 1:
+        raise ValueError(f"dup_rate must be in [0, 1), got {dup_rate}")
+    if dup_rate > 0 and edits < 1:
+        raise ValueError(f"edits must be >= 1 when dup_rate > 0, got {edits}")
+    rng = random.Random(seed)
+    vocab = make_vocab(rng)
+    # Zipf 风格的词频，让不相关文档也共享常见词，更接近真实语料
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    lines, clusters, bases, seen = [], [], [], set()
+    redraws = 0
+    while len(lines) < n_lines:
+        if bases and rng.random() < dup_rate:
+            cid = rng.randrange(len(bases))
+            text = mutate(rng, bases[cid], edits)
+        else:
+            cid = len(bases)
+            text = " ".join(rng.choices(vocab, weights=weights, k=words))
+        if text in seen:
+            redraws += 1
+            if redraws >= MAX_REDRAWS:
+                raise RuntimeError(f"连续 {MAX_REDRAWS} 次抽到重复的行，已生成 {len(lines)} 行；"
+                                   f"请调大 --edits / --words 或调小 --dup_rate")
+            continue
+        redraws = 0
+        if cid == len(bases):
+            bases.append(text)
+        seen.add(text)
+        lines.append(text)
+        clusters.append(cid)
+    return lines, clusters
+
+
+def write_corpus(work_dir, lines, chunks):
+    flat = os.path.join(work_dir, "corpus.txt")
+    with open(flat, "w", encoding="utf-8") as f:
+        f.writelines(t + "\n" for t in lines)
+    chunk_dir = os.path.join(work_dir, "chunks")
+    os.makedirs(chunk_dir, exist_ok=True)
+    step = (len(lines) + chunks - 1) // chunks
+    for k in range(chunks):
+        with open(os.path.join(chunk_dir, f"part{k:04d}.dedup"), "w", encoding="utf-8") as f:
+            f.writelines(t + "\n" for t in lines[k * step:(k + 1) * step])
+    return flat, chunk_dir
+
+
+# ─── 被测实现：返回 (命令行, checkpoint 路径列表) ───
+
+def _dedup(extra):
+    def build(a, flat, chunk_dir, out):
+        cmd = [sys.executable, os.path.join(ROOT, "data", "dedup.py"), "-i", flat, "-o", out,
+               "-t", str(a.threshold), "-n", str(a.num_perm), "-k", str(a.shingle_size),
+               "-p", str(a.processes)] + extra(a)
+        return cmd, []
+    return build
+
+
+def _sig_cache(warm):
+    """签名缓存模式：cold 先清空缓存目录（计时包含构建），warm 计时前先确保缓存已建好"""
+    def build(a, flat, chunk_dir, out):
+        cache_dir = os.path.join(os.path.dirname(out), "sig_cache")
+        cmd, _ = _dedup(lambda a: ["-c", cache_dir])(a, flat, chunk_dir, out)
+        if not warm:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        elif not os.path.isdir(cache_dir):
+            subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           env={**os.environ, "PYTHONPATH": ROOT}, check=True)
+        return cmd, [cache_dir]
+    return build
+
+
+def _incremental(extra):
+    def build(a, flat, chunk_dir, out):
+        cmd = [sys.executable, os.path.join(ROOT, "incremental_stream_dedup.py"), "-i", chunk_dir, "-o", out,
+               "-t", str(a.threshold), "-n", str(a.num_perm), "-k", str(a.shingle_size)] + extra
+        return cmd, [out + ".ckpt.json", out + ".ckpt.lsh", out + ".ckpt.idx"]
+    return build
+
+
+IMPLS = {
+    "dedup-datasketch": _dedup(lambda a: ["-e", "datasketch"]),
+    "dedup-numpy": _dedup(lambda a: ["-e", "numpy"]),
+    "dedup-stream": _dedup(lambda a: ["-s"]),
+    "dedup-sharded": _dedup(lambda a: ["-S", str(a.processes)]),
+    "dedup-sig-cache-cold": _sig_cache(warm=False),
+    "dedup-sig-cache-warm": _sig_cache(warm=True),
+    "incremental-pickle-datasketch": _incremental(["-e", "datasketch", "--index", "pickle"]),
+    "incremental-pickle": _incremental(["--index", "pickle"]),
+    "incremental-disk": _incremental(["--index", "disk"]),
+}
+
+
+def path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, f))
+            except OSError:
+                pass
+    return total
+
+
+def run(cmd, ckpt_paths, poll=0.05):
+    """运行子进程，返回 (秒, 返回码, 峰值 RSS 字节, checkpoint 峰值字节)"""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env={**os.environ, "PYTHONPATH": ROOT})
+    peak_ckpt = 0
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            break
+        peak_ckpt = max(peak_ckpt, sum(path_size(p) for p in ckpt_paths))
+        time.sleep(poll)
+    elapsed = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 上 ru_maxrss 单位为 KB，且已包含已回收子进程（进程池 worker）的最大值
+    return elapsed, proc.returncode, usage.ru_maxrss * 1024, peak_ckpt
+
+
+def score(lines, clusters, out_path):
+    """正例 = 非簇首行（应被删除）；预测正例 = 输出中缺失的行"""
+    with open(out_path, "r", encoding="utf-8") as f:
+        kept = {ln.rstrip("\n") for ln in f}
+    first_seen = set()
+    tp = fp = fn = 0
+    for text, cid in zip(lines, clusters):
+        is_dup = cid in first_seen
+        first_seen.add(cid)
+        removed = text not in kept
+        tp += removed and is_dup
+        fp += removed and not is_dup
+        fn += is_dup and not removed
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"kept": len(kept), "tp": tp, "fp": fp, "fn": fn,
+            "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="去重实现的质量与吞吐基准")
+    p.add_argument("--lines", type=int, default=20000, help="语料行数")
+    p.add_argument("--dup_rate", type=float, default=0.3, help="近重复行占比，须小于 1")
+    p.add_argument("--edits", type=int, default=3, help="每个近重复副本的字符编辑次数，dup_rate > 0 时须 ≥ 1")
+    p.add_argument("--words", type=int, default=50, help="每篇基础文档的词数")
+    p.add_argument("--chunks", type=int, default=4, help="incremental 模式的输入分块数")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-t", "--threshold", type=float, default=0.8)
+    p.add_argument("-n", "--num_perm", type=int, default=128)
+    p.add_argument("-k", "--shingle_size", type=int, default=5)
+    p.add_argument("-p", "--processes", type=int, default=os.cpu_count())
+    p.add_argument("--impls", default=",".join(IMPLS),
+                   help="逗号分隔的实现名，可选：" + ", ".join(IMPLS))
+    p.add_argument("--work_dir", help="语料与输出目录，默认临时目录")
+    p.add_argument("-o", "--output", help="JSON 结果路径，缺省打印到 stdout")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    impls = [s for s in args.impls.split(",") if s]
+    unknown = [s for s in impls if s not in IMPLS]
+    if unknown:
+        sys.exit(f"未知实现：{', '.join(unknown)}")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_dedup_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        lines, clusters = generate_corpus(args.lines, args.dup_rate, args.edits, args.words, args.seed)
+    except ValueError as e:
+        sys.exit(f"参数错误：{e}")
+    flat, chunk_dir = write_corpus(work_dir, lines, args.chunks)
+    report = {
+        "corpus": {"lines": len(lines), "bytes": os.path.getsize(flat),
+                   "true_duplicates": len(lines) - len(set(clusters)),
+                   "dup_rate": args.dup_rate, "edits": args.edits, "words": args.words,
+                   "seed": args.seed},
+        "params": {"threshold": args.threshold, "num_perm": args.num_perm,
+                   "shingle_size": args.shingle_size, "processes": args.processes},
+        "results": [],
+    }
+    for name in impls:
+        out = os.path.join(work_dir, f"out.{name}.txt")
+        cmd, ckpt = IMPLS[name](args, flat, chunk_dir, out)
+        seconds, code, rss, ckpt_bytes = run(cmd, ckpt)
+        row = {"impl": name, "returncode": code, "seconds": round(seconds, 3),
+               "lines_per_s": round(len(lines) / seconds, 1),
+               "peak_rss_mb": round(rss / 2 ** 20, 1),
+               "peak_checkpoint_bytes": ckpt_bytes if ckpt else None}
+        if code == 0:
+            row.update(score(lines, clusters, out))
+        report["results"].append(row)
+        print(f"{name:32s} rc={code} {row['lines_per_s']:>10} 行/s  RSS {row['peak_rss_mb']} MB"
+              + (f"  P={row['precision']} R={row['recall']}" if code == 0 else ""), file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+HTML → 文本抽取吞吐对比：utils.clean_html（lxml target 流式回调）vs. 原先的两个
+BeautifulSoup 实现（utils/clean_html.py 的 html.parser 版、download_texts.py 的 lxml 版），
+并统计与各参考实现输出完全一致的页面占比。
+
+页面来源（按优先级）：--warc 中的 response 记录、--pages 目录下的 *.htm(l) 文件、合成页面。
+
+示例：
+  python scripts/bench_html.py --warc data/cc_warc/sample.warc.gz --pages_max 2000
+  python scripts/bench_html.py --pages saved_pages/
+  python scripts/bench_html.py                      # 合成页面
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import time
+import warnings
+
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+
+warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.clean_html import clean_html
+
+
+def bs4_html_parser(raw):
+    """原 utils/clean_html.py 的实现"""
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8", errors="ignore")
+    soup = BeautifulSoup(raw, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = soup.get_text(separator="\n")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def bs4_lxml(html):
+    """原 scripts/data/download_texts.py 的实现"""
+    if isinstance(html, (bytes, bytearray)):
+        html = html.decode("utf-8", errors="ignore")
+    try:
+        soup = BeautifulSoup(html, "lxml")
+    except Exception:
+        return ""
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    text = soup.get_text(separator="\n")
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return " ".join(lines)
+
+
+IMPLS = {
+    "lxml-target": clean_html,
+    "bs4-html.parser": bs4_html_parser,
+    "bs4-lxml": bs4_lxml,
+}
+
+
+def warc_pages(path, limit):
+    from warcio.archiveiterator import ArchiveIterator
+    opener = gzip.open if path.endswith((".gz", ".gzip")) else open
+    pages = []
+    with opener(path, "rb") as stream:
+        for record in ArchiveIterator(stream):
+            if record.rec_type == "response":
+                pages.append(record.content_stream().read())
+                if len(pages) >= limit:
+                    break
+    return pages
+
+
+def dir_pages(path, limit):
+    names = sorted(n for n in os.listdir(path) if n.endswith((".html", ".htm")))[:limit]
+    pages = []
+    for name in names:
+        with open(os.path.join(path, name), "rb") as f:
+            pages.append(f.read())
+    return pages
+
+
+def synthetic_pages(n, seed=0):
+    rng = random.Random(seed)
+    words = ["data", "model", "crawl", "token", "page", "text", "news", "sport", "price", "weather",
+             "数据", "模型", "新闻", "天气", "café", "naïve"]
+
+    def para():
+        return " ".join(rng.choices(words, k=rng.randint(5, 60)))
+
+    pages = []
+    for _ in range(n):
+        body = []
+        for _ in range(rng.randint(10, 80)):
+            kind = rng.random()
+            if kind < 0.5:
+                body.append(f"<p>{para()} <a href='/x'>{para()}</a> {para()}</p>")
+            elif kind < 0.7:
+                body.append(f"<div class='nav'><ul>" + "".join(f"<li>{para()}</li>" for _ in range(5)) + "</ul></div>")
+            elif kind < 0.85:
+                body.append(f"<script>var x = {rng.random()}; function f() {{ return '{para()}'; }}</script>")
+            elif kind < 0.95:
+                body.append(f"<style>.c{rng.randint(0, 99)} {{ color: red; }}</style>")
+            else:
+                body.append(f"<noscript>{para()}</noscript>")
+        page = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>" + para() + "</title></head><body>"
+                + "\n".join(body) + "</body></html>")
+        pages.append(page.encode("utf-8"))
+    return pages
+
+
+def bench(fn, pages, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(p) for p in pages]
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def main():
+    p = argparse.ArgumentParser(description="HTML 文本抽取实现的吞吐与一致性对比")
+    p.add_argument("--warc", help="WARC 文件（.warc / .warc.gz），取其中的 response 记录")
+    p.add_argument("--pages", help="保存的页面目录（*.html / *.htm）")
+    p.add_argument("--pages_max", type=int, default=1000, help="最多使用的页面数")
+    p.add_argument("--repeat", type=int, default=3, help="每个实现重复次数，取最快一次")
+    p.add_argument("--impls", default=",".join(IMPLS), help=f"参与对比的实现，可选 {','.join(IMPLS)}")
+    p.add_argument("-o", "--output", help="JSON 结果路径，缺省打印到 stdout")
+    args = p.parse_args()
+
+    if args.warc:
+        pages = warc_pages(args.warc, args.pages_max)
+    elif args.pages:
+        pages = dir_pages(args.pages, args.pages_max)
+    else:
+        pages = synthetic_pages(args.pages_max)
+    n_bytes = sum(map(len, pages))
+    print(f"样本：{len(pages)} 个页面，{n_bytes / 1e6:.1f} MB", file=sys.stderr)
+
+    outputs, rows = {}, []
+    for name in args.impls.split(","):
+        dt, outputs[name] = bench(IMPLS[name], pages, args.repeat)
+        rows.append({"impl": name, "seconds": round(dt, 4),
+                     "pages_per_s": round(len(pages) / dt, 1), "mb_per_s": round(n_bytes / dt / 1e6, 2)})
+        print(f"{name:16s} {rows[-1]['pages_per_s']:>10} 页/s  {rows[-1]['mb_per_s']:>8} MB/s", file=sys.stderr)
+
+    base = rows[0]
+    for row in rows:
+        row["time_vs_first"] = round(row["seconds"] / base["seconds"], 2)
+    # 与各参考实现输出完全一致的页面占比
+    first = rows[0]["impl"]
+    agreement = {name: round(sum(a == b for a, b in zip(outputs[first], out)) / max(1, len(pages)), 4)
+                 for name, out in outputs.items() if name != first}
+    report = {"pages": len(pages), "bytes": n_bytes, "results": rows, f"exact_match_vs_{first}": agreement}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
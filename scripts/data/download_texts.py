@@ -1,128 +1,309 @@
 #!/usr/bin/env python3
 import argparse
-import hashlib
-import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from warcio.archiveiterator import ArchiveIterator
 import gzip
+import json
 import os
-import warnings
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+import queue
+import sys
+import threading
+from contextlib import nullcontext
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.clean_html import clean_html
+from utils.crawler import Crawler, crawl
+from utils.fetch_cache import FetchCache
+from utils.fingerprint import ExactDeduper
+from utils.lsh_index import write_json_atomic
+from utils.shards import imap_bounded
+from utils.warc_index import WarcIndex, iter_range_records
+from utils.wet import iter_wet_file
+
+# 积攒多少条文本后做一次批量指纹去重
+DEDUP_BATCH = 256
+
+WARC_SUFFIXES = ('.warc', '.warc.gz', '.warc.gzip', '.wet', '.wet.gz', '.wet.gzip')
 
 def parse_args():
     parser = argparse.ArgumentParser(description="批量下载并清洗文本（支持 URL 列表或 WARC 文件）")
     parser.add_argument("--input", "-i", required=True,
-                        help="输入路径：URL 列表文件（每行一个 URL）或 WARC 文件（.warc 或 .warc.gz）")
+                        help="输入路径：URL 列表文件（每行一个 URL）或 WARC / WET 文件（.warc[.gz] / .wet[.gz]）")
     parser.add_argument("--output", "-o", default="data/raw.txt",
                         help="输出文本文件路径，默认 data/raw.txt")
     parser.add_argument("--workers", "-w", type=int, default=4,
                         help="并发下载线程数（仅对 URL 列表生效），默认 4")
+    parser.add_argument("--per_host", type=int, default=2,
+                        help="URL 模式每个主机同时请求数上限，默认 2")
+    parser.add_argument("--host_rate", type=float, default=0.0,
+                        help="URL 模式每个主机每秒请求数上限，默认 0（不限）")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="URL 模式单次请求超时（秒），默认 10")
+    parser.add_argument("--backoff", type=float, default=0.5,
+                        help="URL 模式重试的初始退避秒数（每次翻倍，带随机抖动），默认 0.5")
+    parser.add_argument("--cache", help="URL 模式的抓取缓存目录（原始响应、ETag / Last-Modified 与抽取文本）；"
+                                        "重跑时命中的 URL 不再下载和清洗")
+    parser.add_argument("--cache_mb", type=int, default=4096,
+                        help="抓取缓存的大小上限（MB，按最近使用淘汰），默认 4096")
+    parser.add_argument("--cache_ttl", type=float, default=7 * 24,
+                        help="缓存条目的新鲜期（小时），过期后用条件请求重新验证，默认 168")
+    parser.add_argument("--procs", "-p", type=int, default=cpu_count(),
+                        help="WARC 文本抽取进程数，默认全核；1 表示在主进程内顺序处理")
+    parser.add_argument("--batch", type=int, default=64,
+                        help="WARC 模式每个抽取任务的记录数，默认 64")
+    parser.add_argument("--inflight", type=int, default=0,
+                        help="同时在途的任务数：WARC 模式默认 procs × 2，URL 模式默认 workers × 4")
+    parser.add_argument("--index", action="store_true",
+                        help="（.gz）用记录级 member 偏移索引（<输入>.idx.npz，缺失时自动建立），"
+                             "各进程直接解压互不重叠的记录区间")
+    parser.add_argument("--resume", action="store_true",
+                        help="（.gz，隐含 --index）按 <输出>.ckpt 从中断处的记录继续，输出截断到检查点位置")
     parser.add_argument("--retries", "-r", type=int, default=3,
-                        help="每个 URL 最大重试次数（仅对 URL 列表生效），默认 3")
+                        help="每个 URL 最多请求次数，含首次（仅对 URL 列表生效），默认 3")
+    parser.add_argument("--mem_mb", type=int, default=1024,
+                        help="去重指纹可用内存（MB），超出后落盘归并，默认 1024")
+    parser.add_argument("--fp_bits", type=int, choices=[64, 128], default=64,
+                        help="去重指纹位数，默认 64")
     return parser.parse_args()
 
 def iter_warc_records(warc_path):
     """
-    迭代 WARC 文件里的每个 response 记录，Yield 原始 HTML bytes。
+    迭代 WARC / WET 文件里的记录，yield (记录类型, 原始 payload bytes, Content-Type)：
+    WARC 取 response 记录（HTML，Content-Type 来自 HTTP 头），WET 取 conversion 记录（纯文本，
+    用 utils.wet 按 Content-Length 直接切分）。
     """
+    if '.wet' in os.path.basename(warc_path):
+        for rec in iter_wet_file(warc_path):
+            yield 'conversion', rec.payload, None
+        return
     open_mode = 'rb'
     opener = gzip.open if warc_path.endswith(('.gz', '.gzip')) else open
     with opener(warc_path, open_mode) as stream:
-        for record in ArchiveIterator(stream):
-            if record.rec_type == 'response':
-                html = record.content_stream().read()
-                yield html
-
-def clean_html(html) -> str:
-    if isinstance(html, (bytes, bytearray)):
-        html = html.decode("utf-8", errors="ignore")
-    try:
-        soup = BeautifulSoup(html, "lxml")  # 使用 lxml 解析器
-    except Exception:
-        return ""
-    for tag in soup(["script", "style"]):
-        tag.decompose()
-    text = soup.get_text(separator="\n")
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    return " ".join(lines)
+        yield from record_payloads(ArchiveIterator(stream))
+
+def record_payloads(records):
+    for record in records:
+        if record.rec_type == 'response':
+            ctype = record.http_headers.get_header('Content-Type') if record.http_headers else None
+            yield 'response', record.content_stream().read(), ctype
+        elif record.rec_type == 'conversion':
+            yield 'conversion', record.content_stream().read(), None
+
+def extract_text(kind, payload, content_type=None) -> str:
+    if kind == 'conversion':
+        return " ".join(payload.decode("utf-8", errors="ignore").split())
+    return clean_html(payload, content_type)
+
+def extract_batch(records):
+    """进程池任务：一批记录 → 对应的文本列表（顺序不变）"""
+    return [extract_text(*rec) for rec in records]
+
+def extract_range(path, start, end):
+    """进程池任务：解压文件 [start, end) 字节区间内的记录并抽取文本"""
+    return extract_batch(list(record_payloads(iter_range_records(path, start, end))))
 
+def prefetch(iterable, maxsize):
+    """在后台线程里迭代 iterable，经容量为 maxsize 的队列交给调用方；异常原样抛给调用方"""
+    q = queue.Queue(maxsize)
+    done = object()
 
-def read_urls(path: str) -> list[str]:
+    def run():
+        try:
+            for item in iterable:
+                q.put(item)
+        except BaseException as e:
+            q.put(e)
+        q.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+def record_batches(warc_path, size):
+    batch = []
+    for rec in iter_warc_records(warc_path):
+        batch.append(rec)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_urls(path: str):
     """
-    从文本文件读取 URL 列表（每行一个 URL），返回去重后的列表。
+    逐行读取 URL 列表文件（每行一个 URL），按首次出现的顺序产出去重后的 URL。
     """
+    seen = set()
     with open(path, "r", encoding="utf-8") as f:
-        raw = [ln.strip() for ln in f if ln.strip()]
-    seen = set(); uniq = []
-    for u in raw:
-        if u not in seen:
-            seen.add(u); uniq.append(u)
-    return uniq
-
-def download_one(url: str, retries: int = 3, timeout: int = 10) -> str:
+        for ln in f:
+            u = ln.strip()
+            if u and u not in seen:
+                seen.add(u)
+                yield u
+
+def download_one(crawler: Crawler, url: str, cache: FetchCache = None) -> str:
     """
-    下载单个 URL 并清洗 HTML，失败时重试 retries 次。
-    返回纯文本或空字符串。
+    下载单个 URL 并清洗 HTML（重试与退避由 crawler 负责；给出 cache 时经缓存抓取）。
+    返回纯文本，失败时返回空字符串。
     """
-    for attempt in range(1, retries + 1):
-        try:
-            r = requests.get(url, timeout=timeout)
-            r.raise_for_status()
-            return clean_html(r.text)
-        except Exception:
-            if attempt == retries:
-                return ""
-    return ""
+    if cache is not None:
+        return cache.fetch_text(crawler, url, clean_html)
+    res = crawler.fetch(url)
+    if res.error is not None:
+        return ""
+    return clean_html(res.content, res.headers.get("Content-Type"))
 
 def ensure_parent_dir(path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+def write_unique(texts, fout, dedup: ExactDeduper):
+    """按到达顺序精确去重并写出非空文本"""
+    batch = []
+    for txt in texts:
+        if not txt:
+            continue
+        batch.append(txt)
+        if len(batch) >= DEDUP_BATCH:
+            fout.writelines(t + "\n" for t in dedup.feed(batch))
+            batch = []
+    fout.writelines(t + "\n" for t in dedup.feed(batch))
+    fout.writelines(t + "\n" for t in dedup.finish())
+
+def process_urls(input_path: str, output_path: str, workers: int, crawler: Crawler,
+                 dedup: ExactDeduper, max_inflight: int = 0, cache: FetchCache = None):
+    """
+    URL 按需从文件读出，最多 max_inflight 个在途；每个线程复用自己的 Session，
+    每个主机的并发与速率由 crawler 限制。按完成顺序去重写出。
+    cache 不为空时先查抓取缓存，运行前后各按 LRU 淘汰一次。
+    """
+    ensure_parent_dir(output_path)
+    if cache is not None:
+        cache.prune()
+    n_failed = 0
+    with open(output_path, "w", encoding="utf-8") as fout:
+        def texts():
+            nonlocal n_failed
+            for _, txt in tqdm(crawl(lambda u: download_one(crawler, u, cache), iter_urls(input_path),
+                                     workers, max_inflight), desc="Downloading", unit=" url"):
+                n_failed += not txt
+                yield txt
+
+        write_unique(texts(), fout, dedup)
+    print(f"完成，已写入 {dedup.n_out} 条记录到 {output_path}（{n_failed} 个 URL 失败或无正文）")
+    if cache is not None:
+        cache.prune()
+        st = cache.stats
+        print(f"抓取缓存：命中 {st['hit']}，条件请求验证通过 {st['revalidated']}，"
+              f"重新抽取 {st['reextracted']}，下载 {st['miss']}")
 
-def process_urls(input_path: str, output_path: str, workers: int, retries: int):
-    urls = read_urls(input_path)
-    print(f"读取到 {len(urls)} 个 URL")
+def process_warc(input_path: str, output_path: str, dedup: ExactDeduper,
+                 procs: int = 1, batch: int = 64, max_inflight: int = 0):
+    """
+    读取线程解压并切分记录，按批放入有界队列；进程池抽取文本，最多 max_inflight 批在途；
+    主进程按记录顺序去重并写出，输出与顺序处理完全相同。内存只与在途批数有关。
+    """
+    print(f"读取 WARC 文件：{input_path}")
     ensure_parent_dir(output_path)
-    seen_hashes = set()
+    max_inflight = max_inflight or procs * 2
+    batches = prefetch(record_batches(input_path, batch), max_inflight)
     with open(output_path, "w", encoding="utf-8") as fout, \
-         ThreadPoolExecutor(max_workers=workers) as exe:
-        futures = {exe.submit(download_one, u, retries): u for u in urls}
-        for fut in tqdm(as_completed(futures), total=len(futures), desc="Downloading"):
-            txt = fut.result()
-            if not txt:
-                continue
-            h = hashlib.md5(txt.encode("utf-8")).hexdigest()
-            if h in seen_hashes:
-                continue
-            seen_hashes.add(h)
-            fout.write(txt + "\n")
-    print(f"完成，已写入 {len(seen_hashes)} 条记录到 {output_path}")
-
-def process_warc(input_path: str, output_path: str):
-    print(f"读取 WARC 文件：{input_path}")
+         (Pool(procs) if procs > 1 else nullcontext()) as pool, \
+         tqdm(desc="WARC → 文本", unit=" 记录") as pbar:
+        if pool is None:
+            results = map(extract_batch, batches)
+        else:
+            results = imap_bounded(pool, extract_batch, ((b,) for b in batches), max_inflight)
+
+        def texts():
+            for out in results:
+                pbar.update(len(out))
+                yield from out
+
+        write_unique(texts(), fout, dedup)
+    print(f"WARC 清洗完成，写入 {dedup.n_out} 条记录到 {output_path}")
+
+def load_checkpoint(ckpt_path, input_path):
+    """检查点属于同一输入文件时返回 {"records": 已完成记录数, "bytes": 已写出字节数}，否则返回 None"""
+    try:
+        with open(ckpt_path, "r", encoding="utf-8") as f:
+            ckpt = json.load(f)
+    except FileNotFoundError:
+        return None
+    st = os.stat(input_path)
+    if ckpt.get("input") != [os.path.abspath(input_path), st.st_size]:
+        return None
+    return ckpt
+
+def process_warc_indexed(input_path: str, output_path: str, dedup: ExactDeduper,
+                         procs: int = 1, batch: int = 64, max_inflight: int = 0, resume: bool = False):
+    """
+    按记录级索引把输入切成互不重叠的记录区间，子进程各自从 mmap 读取并解压，
+    主进程按区间顺序去重写出；每写完一个区间在 <输出>.ckpt 记下已完成的记录数与输出字节数。
+    resume 时把输出截断到检查点位置、用已写出的文本重建去重状态，再从下一条记录继续。
+    去重转入外存模式后输出要到 finish() 才落盘，此后不再更新检查点，续跑会从最后一个检查点重做。
+    """
+    idx = WarcIndex.open(input_path)
+    if idx.meta["truncated"]:
+        print(f"⚠️ {input_path} 末尾的 gzip member 不完整，只处理前 {len(idx)} 条记录")
     ensure_parent_dir(output_path)
-    seen_hashes = set()
-    with open(output_path, "w", encoding="utf-8") as fout:
-        for raw_html in tqdm(iter_warc_records(input_path), desc="WARC → 文本"):
-            txt = clean_html(raw_html)
-            if not txt:
-                continue
-            h = hashlib.md5(txt.encode("utf-8")).hexdigest()
-            if h in seen_hashes:
-                continue
-            seen_hashes.add(h)
-            fout.write(txt + "\n")
-    print(f"WARC 清洗完成，写入 {len(seen_hashes)} 条记录到 {output_path}")
+    ckpt_path = output_path + ".ckpt"
+    ckpt = load_checkpoint(ckpt_path, input_path) if resume else None
+    first = 0
+    if ckpt is not None and os.path.exists(output_path):
+        first = ckpt["records"]
+        with open(output_path, "r+b") as f:
+            f.truncate(ckpt["bytes"])
+        # 分批重建去重状态：每批之后都会检查内存预算，必要时转入外存模式
+        with open(output_path, "r", encoding="utf-8") as f:
+            lines = (line.rstrip("\n") for line in f)
+            for chunk in iter(lambda: list(islice(lines, DEDUP_BATCH)), []):
+                dedup.seed(chunk)
+        print(f"从第 {first} 条记录续跑（已有 {dedup.n_out} 条输出）")
+    ckpt_input = [os.path.abspath(input_path), os.stat(input_path).st_size]
+
+    ranges = idx.batches(batch, first)
+    max_inflight = max_inflight or procs * 2
+    tasks = ((input_path, *idx.byte_range(i, j)) for i, j in ranges)
+    with open(output_path, "ab" if first else "wb") as fout, \
+         (Pool(procs) if procs > 1 else nullcontext()) as pool, \
+         tqdm(total=len(idx), initial=first, desc="WARC → 文本", unit=" 记录") as pbar:
+        results = (imap_bounded(pool, extract_range, tasks, max_inflight) if pool is not None
+                   else (extract_range(*t) for t in tasks))
+        for (i, j), texts in zip(ranges, results):
+            out = dedup.feed(t for t in texts if t)
+            fout.write("".join(t + "\n" for t in out).encode("utf-8"))
+            if not dedup.external:
+                fout.flush()
+                write_json_atomic(ckpt_path, {"input": ckpt_input, "records": j, "bytes": fout.tell()})
+            pbar.update(j - i)
+        fout.write("".join(t + "\n" for t in dedup.finish()).encode("utf-8"))
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    print(f"WARC 清洗完成，写入 {dedup.n_out} 条记录到 {output_path}")
 
 def main():
     args = parse_args()
     inp = args.input
     outp = args.output
-    if inp.endswith(('.warc', '.warc.gz', '.warc.gzip')):
-        process_warc(inp, outp)
+    dedup = ExactDeduper(memory_budget=args.mem_mb << 20, bits=args.fp_bits,
+                         tmp_dir=os.path.dirname(outp) or None)
+    if inp.endswith(WARC_SUFFIXES) and inp.endswith(('.gz', '.gzip')) and (args.index or args.resume):
+        process_warc_indexed(inp, outp, dedup, args.procs, args.batch, args.inflight, args.resume)
+    elif inp.endswith(WARC_SUFFIXES):
+        process_warc(inp, outp, dedup, args.procs, args.batch, args.inflight)
     else:
-        process_urls(inp, outp, args.workers, args.retries)
+        # --retries 沿用原来的含义（总请求次数），Crawler 的 retries 为首次之后的重试次数
+        crawler = Crawler(per_host=args.per_host, host_rate=args.host_rate, retries=max(args.retries - 1, 0),
+                          timeout=args.timeout, backoff=args.backoff, pool_size=max(args.workers, 10))
+        cache = FetchCache(args.cache, args.cache_mb << 20, args.cache_ttl * 3600) if args.cache else None
+        process_urls(inp, outp, args.workers, crawler, dedup, args.inflight, cache)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+为 WARC / WET .gz 建立记录级 member 偏移索引（<文件>.idx.npz，见 utils/warc_index.py）。
+
+示例：
+  python scripts/data/index_warc.py wet_files/*.warc.wet.gz
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.warc_index import TYPES, WarcIndex, index_path
+
+
+def main():
+    p = argparse.ArgumentParser(description="为 WARC / WET .gz 建立记录级 member 偏移索引")
+    p.add_argument("paths", nargs="+", help="WARC / WET .gz 文件")
+    p.add_argument("-f", "--force", action="store_true", help="即使已有有效索引也重建")
+    args = p.parse_args()
+    for path in args.paths:
+        idx = None if args.force else WarcIndex.load(path)
+        status = "已是最新"
+        if idx is None:
+            idx = WarcIndex.build(path)
+            status = "已建立" + ("（文件末尾 member 不完整，已忽略）" if idx.meta["truncated"] else "")
+        counts = np.bincount(idx.types, minlength=len(TYPES))
+        summary = ", ".join(f"{t}={n}" for t, n in zip(TYPES, counts.tolist()) if n)
+        print(f"{index_path(path)} {status}：{len(idx)} 条记录（{summary}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,63 @@
 #!/usr/bin/env python3
+import argparse
 import os
+import sys
+from multiprocessing import cpu_count
 
-def merge_files(primary_path: str, cc_path: str, out_path: str):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.fingerprint import ExactDeduper, fingerprints
+from utils.shards import map_shards, range_lines
+
+# 子进程内的指纹位数（由 init_worker 初始化）
+BITS = None
+
+def init_worker(bits):
+    global BITS
+    BITS = bits
+
+def fingerprint_worker(path, start, end):
+    """
+    读取一个分片的非空行并计算指纹；行以 "\\n" 拼接回传，比 pickle 行列表更省。
+    range_lines 与文本模式 open（newline=None）一样把 \\r\\n、\\r 都当作换行，
+    再经 strip，指纹里不会带 \\r，与原先逐行读取的去重结果一致。
+    """
+    texts = [t for t in (line.strip() for line in range_lines(path, start, end, errors="strict")) if t]
+    return "\n".join(texts), fingerprints(texts, BITS)
+
+def merge_files(primary_path: str, cc_path: str, out_path: str,
+                memory_budget: int = 1 << 30, bits: int = 64,
+                workers: int = cpu_count(), shard_mb: int = 16):
     """
     合并 primary 和 cc 两份纯文本文件，去重后写入 out_path。
+    两份文件都按字节分片交给子进程读取、计算指纹，主进程按顺序去重写出。
+    去重只保存 64/128 位指纹；超过 memory_budget 字节后转为外存归并，输出顺序不变。
     """
-    seen = set()
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    dedup = ExactDeduper(memory_budget=memory_budget, bits=bits,
+                         tmp_dir=os.path.dirname(out_path) or None)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
     with open(out_path, "w", encoding="utf-8") as fout:
         for path in (primary_path, cc_path):
-            with open(path, "r", encoding="utf-8") as fin:
-                for line in fin:
-                    t = line.strip()
-                    if not t or t in seen:
-                        continue
-                    seen.add(t)
-                    fout.write(t + "\n")
-    print(f"合并完成，共 {len(seen)} 条记录写入 {out_path}")
+            for _, (text, fps) in map_shards(fingerprint_worker, path, int(shard_mb * (1 << 20)), workers,
+                                             init_worker, (bits,)):
+                texts = text.split("\n") if text else []
+                fout.writelines(x + "\n" for x in dedup.feed(texts, fps))
+        fout.writelines(x + "\n" for x in dedup.finish())
+    print(f"合并完成，共 {dedup.n_out} 条记录写入 {out_path}")
 
 if __name__ == "__main__":
     # 默认文件路径，可根据需要调整
-    primary = "data/raw.txt"
-    cc      = "data/cc.txt"
-    out     = "data/all_raw.txt"
-    merge_files(primary, cc, out)
+    parser = argparse.ArgumentParser(description="合并两份纯文本并精确去重")
+    parser.add_argument("--primary", default="data/raw.txt")
+    parser.add_argument("--cc", default="data/cc.txt")
+    parser.add_argument("--output", "-o", default="data/all_raw.txt")
+    parser.add_argument("--mem_mb", type=int, default=1024,
+                        help="指纹去重可用内存（MB），超出后落盘归并，默认 1024")
+    parser.add_argument("--fp_bits", type=int, choices=[64, 128], default=64,
+                        help="指纹位数，默认 64")
+    parser.add_argument("--workers", "-w", type=int, default=cpu_count(),
+                        help="读取与计算指纹的进程数，默认全核")
+    parser.add_argument("--shard_mb", type=int, default=16,
+                        help="每个分片的大小（MB），默认 16")
+    args = parser.parse_args()
+    merge_files(args.primary, args.cc, args.output, args.mem_mb << 20, args.fp_bits,
+                args.workers, args.shard_mb)
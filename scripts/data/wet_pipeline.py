@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+WET 流水线编排：下载 → 解析 → 语言过滤 → 写分片，多个文件并发进行。
+
+- 下载由 utils.async_download 在后台并发进行（断点续传、大小 / 摘要校验）；
+- 每下载完一个文件就交给进程池：utils.wet 按 Content-Length 解析，按 WET 头里的
+  WARC-Identified-Content-Language（首选语言）过滤，正文写成 <out_dir>/<文件名>.txt 分片
+  （先写临时文件再 rename）；
+- 结果记入 <out_dir>/manifest.jsonl（每个文件的状态、分片路径、记录数、字节数或错误），
+  不再把所有结果 cat 成一个大文件；重跑时跳过已成功且分片仍在的文件，只重试失败或缺失的。
+
+示例：
+  python scripts/data/wet_pipeline.py --config configs/en_only.json -c 16 -w 8
+  python scripts/data/wet_pipeline.py --paths wet.paths --wet_dir wet_files --out_dir data/wet_shards -l en
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing import Pool, cpu_count
+
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.async_download import DownloadJob, download_files
+from utils.wet import iter_wet_file
+
+BASE_URL = "https://data.commoncrawl.org/"
+MANIFEST_NAME = "manifest.jsonl"
+
+# lang_whitelist 用 ISO 639-1，WET 头（CLD2）用 ISO 639-3
+ISO639_3 = {
+    "en": "eng", "zh": "zho", "ja": "jpn", "ko": "kor", "de": "deu", "fr": "fra", "es": "spa",
+    "it": "ita", "pt": "por", "ru": "rus", "ar": "ara", "nl": "nld", "pl": "pol", "tr": "tur",
+    "vi": "vie", "id": "ind", "sv": "swe", "cs": "ces", "uk": "ukr", "fa": "fas", "hi": "hin",
+}
+
+
+def shard_name(path: str) -> str:
+    name = path.split("/")[-1]
+    for suffix in (".warc.wet.gz", ".wet.gz", ".gz"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)] + ".txt"
+    return name + ".txt"
+
+
+def process_wet(gz_path, shard_path, langs):
+    """
+    进程池任务：解析一个 WET 文件，保留首选语言在 langs 中的记录（langs 为空则全保留），
+    写出分片；返回 (记录数, 保留数, 分片字节数)
+    """
+    n = kept = 0
+    tmp = shard_path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            for rec in iter_wet_file(gz_path):
+                n += 1
+                if langs and rec.lang.split(",")[0] not in langs:
+                    continue
+                if not rec.payload.strip():
+                    continue
+                f.write(rec.payload)
+                if not rec.payload.endswith(b"\n"):
+                    f.write(b"\n")
+                kept += 1
+            size = f.tell()
+    except BaseException:
+        # 解析中途失败：不留下写了一半的临时分片
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    os.replace(tmp, shard_path)
+    return n, kept, size
+
+
+class Manifest:
+    """追加写的 JSONL 清单，同一路径以最后一条为准；打开时压缩为每个路径一条"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 崩溃时写了一半的最后一行
+                    self.entries[entry["path"]] = entry
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in self.entries.values())
+        os.replace(tmp, path)
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def done(self, path, out_dir):
+        """已成功且分片仍在（大小相符）"""
+        e = self.entries.get(path)
+        if not e or e["status"] != "done":
+            return False
+        shard = os.path.join(out_dir, e["shard"])
+        return os.path.exists(shard) and os.path.getsize(shard) == e["bytes"]
+
+    def record(self, path, **fields):
+        entry = {"path": path, **fields, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with self._lock:
+            self.entries[path] = entry
+            self._f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def run(paths, base_url, wet_dir, out_dir, langs, concurrency, workers, retries, keep_wet=True,
+        max_pending=0, **fetch_kw):
+    """
+    返回 (成功数, 失败数)；已在清单中成功的文件不计入。
+    max_pending: 已下载、尚未解析完的文件数上限（默认 workers × 2），下载不会远远跑在解析前面占满磁盘。
+    """
+    os.makedirs(wet_dir, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(out_dir, MANIFEST_NAME))
+    todo = [p for p in paths if not manifest.done(p, out_dir)]
+    print(f"共 {len(paths)} 个文件，已完成 {len(paths) - len(todo)} 个，本次处理 {len(todo)} 个")
+    jobs = {os.path.join(wet_dir, p.split("/")[-1]): p for p in todo}
+    counts = {"done": 0, "failed": 0}
+    pbar = tqdm(total=len(todo), desc="WET 文件", unit="file")
+    lock = threading.Lock()
+    gate = threading.Semaphore(max_pending or workers * 2)
+
+    def finish(path, status, **fields):
+        # 下载失败在主线程记录，解析结果在进程池的回调线程里记录；记录后释放下载名额
+        manifest.record(path, status=status, **fields)
+        with lock:
+            counts[status] += 1
+            pbar.update(1)
+        gate.release()
+
+    with Pool(workers) as pool:
+        pending = []
+        for res in download_files([DownloadJob(base_url + p, local) for local, p in jobs.items()],
+                                  concurrency, gate=gate, retries=retries, **fetch_kw):
+            path = jobs[res.path]
+            if res.status == "failed":
+                finish(path, "failed", stage="download", error=res.error)
+                continue
+            shard = shard_name(path)
+
+            def on_done(out, path=path, shard=shard, local=res.path):
+                n, kept, size = out
+                if not keep_wet and os.path.exists(local):
+                    os.remove(local)
+                finish(path, "done", shard=shard, records=n, kept=kept, bytes=size)
+
+            def on_error(e, path=path, local=res.path):
+                # 解压 / 解析失败多半是文件损坏：删掉，重跑时重新下载
+                if os.path.exists(local):
+                    os.remove(local)
+                finish(path, "failed", stage="parse", error=f"{type(e).__name__}: {e}")
+
+            pending.append(pool.apply_async(process_wet, (res.path, os.path.join(out_dir, shard), langs),
+                                            callback=on_done, error_callback=on_error))
+        for r in pending:
+            r.wait()
+    pbar.close()
+    manifest.close()
+    return counts["done"], counts["failed"]
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="并发的 WET 下载 → 解析 → 语言过滤 → 分片流水线")
+    p.add_argument("--config", help="流水线配置（如 configs/en_only.json），提供 wet_paths / cache_dir / "
+                                    "mined_dir / lang_whitelist 的默认值")
+    p.add_argument("--paths", help="wet.paths 列表，默认 wet.paths")
+    p.add_argument("--base_url", default=BASE_URL)
+    p.add_argument("--wet_dir", help="WET 文件下载目录，默认 wet_files")
+    p.add_argument("--out_dir", help="分片与 manifest.jsonl 输出目录，默认 data/wet_shards")
+    p.add_argument("--langs", "-l", help="语言白名单（ISO 639-1 或 639-3，逗号分隔）；默认取配置，均无则不过滤")
+    p.add_argument("--concurrency", "-c", type=int, default=8, help="同时下载的文件数，默认 8")
+    p.add_argument("--workers", "-w", type=int, default=cpu_count(), help="解析进程数，默认全核")
+    p.add_argument("--max_pending", type=int, default=0,
+                   help="已下载、尚未解析完的文件数上限，默认 workers × 2")
+    p.add_argument("--retries", "-r", type=int, default=5, help="每个文件的下载重试次数，默认 5")
+    p.add_argument("--delete_wet", action="store_true", help="分片写出后删除下载的 WET 文件")
+    return p.parse_args(argv)
+
+
+def main(argv=None, **fetch_kw):
+    """命令行入口；返回失败的文件数"""
+    args = parse_args(argv)
+    config = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    paths_file = args.paths or config.get("wet_paths") or "wet.paths"
+    langs = args.langs.split(",") if args.langs else config.get("lang_whitelist") or []
+    with open(paths_file, "r", encoding="utf-8") as f:
+        paths = [line.strip() for line in f if line.strip()]
+    n_ok, n_fail = run(paths, args.base_url,
+                       args.wet_dir or config.get("cache_dir") or "wet_files",
+                       args.out_dir or config.get("mined_dir") or "data/wet_shards",
+                       {ISO639_3.get(l.strip(), l.strip()) for l in langs if l.strip()},
+                       args.concurrency, args.workers, args.retries, not args.delete_wet,
+                       args.max_pending, **fetch_kw)
+    print(f"🎉 完成：成功 {n_ok} 个，失败 {n_fail} 个（重跑本命令只会重试失败的文件）")
+    return n_fail
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -2,62 +2,34 @@
 # File: scripts/eval_ppl.py
 
 import argparse
-import math
+import os
+import sys
 from pathlib import Path
 
-import torch
 from tqdm import tqdm
-from transformers import AutoModelForCausalLM, AutoTokenizer
 
-def batchify(lines, batch_size):
-    batch = []
-    for ln in lines:
-        batch.append(ln)
-        if len(batch) >= batch_size:
-            yield batch
-            batch = []
-    if batch:
-        yield batch
-
-def compute_ppl(input_path, model_dir, batch_size, max_length):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.perplexity import load_lm, perplexity, score_lines
 
+def compute_ppl(input_path, model_dir, batch_size, max_length, max_tokens=None, stride=None, kv_cache=False):
     # 本地加载
-    tokenizer = AutoTokenizer.from_pretrained(str(model_dir), local_files_only=True)
-    model = AutoModelForCausalLM.from_pretrained(str(model_dir), local_files_only=True)
-    model.to(device).eval()
+    model, tokenizer, device = load_lm(str(model_dir))
 
     total_loss = 0.0
     total_tokens = 0
 
     with open(input_path, "r", encoding="utf-8") as f:
         lines = (ln.strip() for ln in f if ln.strip())
-
-        for batch in tqdm(batchify(lines, batch_size), desc="Evaluating PPL"):
-            enc = tokenizer(batch,
-                            return_tensors="pt",
-                            padding="longest",
-                            truncation=True,
-                            max_length=max_length)
-            input_ids = enc.input_ids.to(device)
-            attn_mask = enc.attention_mask.to(device)
-
-            with torch.no_grad():
-                outputs = model(input_ids,
-                                attention_mask=attn_mask,
-                                labels=input_ids)
-                # outputs.loss 是批内平均 NLL
-                loss = outputs.loss.item()
-
-            # 计算实际非 pad 的 token 数
-            pad_id = tokenizer.pad_token_id or tokenizer.eos_token_id
-            real_tokens = (input_ids != pad_id).sum().item()
-
-            total_loss += loss * real_tokens
-            total_tokens += real_tokens
-
-    avg_nll = total_loss / total_tokens
-    ppl = math.exp(avg_nll)
+        # 窗口内按长度排序分批；每行的 NLL 只统计真实 token，按 token 数精确加权；
+        # 给出 stride 时超长的行按滑动窗口打分整行，不再只看前 max_length 个 token
+        scores = score_lines(model, tokenizer, lines, device, max_length, batch_size, max_tokens,
+                             stride=stride, kv_cache=kv_cache)
+        for _, nll, n in tqdm(scores, desc="Evaluating PPL", unit=" 行"):
+            total_loss += nll
+            total_tokens += n
+
+    ppl = perplexity(total_loss, total_tokens)
+    avg_nll = total_loss / total_tokens if total_tokens else float("inf")
     print("\n>>> 总 token 数:", total_tokens)
     print(f">>> 平均 NLL: {avg_nll:.4f}")
     print(f">>> Perplexity: {ppl:.2f}")
@@ -70,12 +42,22 @@ if __name__ == "__main__":
                         help="本地模型目录")
     parser.add_argument("-b", "--batch_size", type=int, default=8,
                         help="批大小，显存／RAM 受限可调小")
+    parser.add_argument("-t", "--max_tokens", type=int, default=None,
+                        help="按 token 预算分批：每批「条数 × 最长长度」不超过该值（给出时忽略 --batch_size）")
     parser.add_argument("-l", "--max_length", type=int, default=512,
-                        help="最大 token 长度，超长截断")
+                        help="最大 token 长度（滑动窗口模式下为窗口长度）")
+    parser.add_argument("-s", "--stride", type=int, default=None,
+                        help="滑动窗口步长，默认 max_length // 2；超长的行按窗口打分整行，"
+                             "每个 token 至少带 max_length - stride 个上文；0 表示超长截断")
+    parser.add_argument("--kv_cache", action="store_true",
+                        help="滑动窗口复用裁剪后的 past_key_values（仅 RoPE 模型）：更快但为近似值，"
+                             "与默认的逐窗口精确重算结果不可直接比较")
     args = parser.parse_args()
 
     model_dir = Path(args.model)
     if not model_dir.exists():
         parser.error(f"模型目录不存在：{model_dir}")
 
-    compute_ppl(args.input, model_dir, args.batch_size, args.max_length)
+    stride = args.max_length // 2 if args.stride is None else args.stride or None
+    compute_ppl(args.input, model_dir, args.batch_size, args.max_length, args.max_tokens,
+                stride, args.kv_cache)
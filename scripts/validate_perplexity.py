@@ -1,38 +1,30 @@
 #!/usr/bin/env python3
-import math
 import csv
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import evaluate
-import torch
+import os
+import random
+import sys
 
-# 1. 加载模型与 tokenizer（你也可换成 GPT-2 等更轻量模型）
-MODEL = "models/yi-1.5-9b"
-tokenizer = AutoTokenizer.from_pretrained(MODEL, local_files_only=True)
-model     = AutoModelForCausalLM.from_pretrained(MODEL, local_files_only=True).cuda().eval()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.perplexity import load_lm, perplexity, score_lines
 
-# 2. 加载 Hugging Face Evaluate 的 perplexity metric
-ppl_metric = evaluate.load("perplexity", module_type="metric")
+# 1. 加载模型与 tokenizer（你也可换成 GPT-2 等更轻量模型；无 GPU 时在 CPU 上运行）
+MODEL = "models/yi-1.5-9b"
+model, tokenizer, device = load_lm(MODEL)
 
-# 3. 读取样本（随机抽样 1k）
-import random
+# 2. 读取样本（随机抽样 1k）
 with open("data/pretrain.txt", encoding="utf-8") as f:
     lines = [l.strip() for l in f if l.strip()]
-sample = random.sample(lines, k=1000)
+sample = random.sample(lines, k=min(1000, len(lines)))
 
-# 4. 计算 perplexity
+# 3. 计算每句的 perplexity（按长度分批前向，逐句统计 NLL；超过 512 token 的按步长 256 的滑动窗口打分整句）
 results = []
-for sent in sample:
-    # 4.1 tokenizer
-    enc = tokenizer(sent, return_tensors="pt").to("cuda")
-    # 4.2 forward + loss
-    with torch.no_grad():
-        out = model(**enc, labels=enc["input_ids"])
-    loss = out.loss.item()
-    ppl  = math.exp(loss)
-    results.append((sent, ppl))
+for sent, nll, n in score_lines(model, tokenizer, sample, device, max_length=512, batch_size=8, stride=256):
+    if n:
+        results.append((sent, perplexity(nll, n)))
 
-# 5. 排序输出最流畅&最可疑
+# 4. 排序输出最流畅&最可疑
 results.sort(key=lambda x: x[1])
+os.makedirs("debug", exist_ok=True)
 with open("debug/ppl_hf.tsv", "w", encoding="utf-8") as f:
     writer = csv.writer(f, delimiter="\t")
     writer.writerow(["sentence", "ppl"])
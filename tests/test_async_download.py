@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.async_download import DownloadJob, download_files, parse_digest
+
+FILES = {f"/f{i}.gz": gzip.compress(os.urandom(50_000 + i * 1000)) for i in range(6)}
+# 不合规的响应：原样写出后断开
+MALFORMED = {
+    "/garbage.gz": b"garbage\r\n\r\n",
+    "/badstatus.gz": b"HTTP/1.1 OK\r\nContent-Length: 0\r\n\r\n",
+    "/empty.gz": b"",
+    "/hugehead.gz": b"HTTP/1.1 200 OK\r\nX-Big: " + b"a" * 100_000 + b"\r\n\r\n",
+}
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    # 每个 flaky 路径第一次请求只发出一半数据就断开
+    dropped = set()
+    ranges = []
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path
+        RangeHandler.requests.append(path)
+        if path in MALFORMED:
+            self.wfile.write(MALFORMED[path])
+            self.close_connection = True
+            return
+        if path == "/moved.gz":
+            self.send_response(302)
+            self.send_header("Location", "/f0.gz")
+            self.end_headers()
+            return
+        flaky = path.startswith("/flaky")
+        data = FILES.get(path.replace("/flaky", "/f", 1) if flaky else path)
+        if data is None:
+            self.send_error(404)
+            return
+        start = 0
+        rng = self.headers.get("Range")
+        if rng:
+            start = int(rng.split("=")[1].split("-")[0])
+            RangeHandler.ranges.append((path, start))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if flaky and path not in RangeHandler.dropped:
+            RangeHandler.dropped.add(path)
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture()
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+
+
+def test_download_resume_and_verify(server, tmp_path):
+    jobs = [DownloadJob(f"{server}/f{i}.gz", str(tmp_path / f"f{i}.gz"), len(FILES[f"/f{i}.gz"]),
+                        parse_digest(hashlib.sha256(FILES[f"/f{i}.gz"]).hexdigest())) for i in range(3)]
+    jobs.append(DownloadJob(f"{server}/flaky3.gz", str(tmp_path / "f3.gz")))
+    jobs.append(DownloadJob(f"{server}/moved.gz", str(tmp_path / "moved.gz")))
+    jobs.append(DownloadJob(f"{server}/missing.gz", str(tmp_path / "missing.gz")))
+    # 已有一半的 .part：应当用 Range 续传
+    (tmp_path / "f4.gz.part").write_bytes(FILES["/f4.gz"][:20_000])
+    jobs.append(DownloadJob(f"{server}/f4.gz", str(tmp_path / "f4.gz"), len(FILES["/f4.gz"])))
+    # 期望摘要不符：校验失败，不留下目标文件
+    jobs.append(DownloadJob(f"{server}/f5.gz", str(tmp_path / "f5.gz"), None, ("md5", "0" * 32)))
+
+    results = {r.path: r for r in download_files(jobs, concurrency=3, retries=2, timeout=5, backoff=0.01)}
+    assert len(results) == len(jobs)
+    for i in range(5):
+        r = results[str(tmp_path / f"f{i}.gz")]
+        assert r.status == "done", r.error
+        assert (tmp_path / f"f{i}.gz").read_bytes() == FILES[f"/f{i}.gz"]
+    assert (tmp_path / "moved.gz").read_bytes() == FILES["/f0.gz"]
+    assert results[str(tmp_path / "missing.gz")].status == "failed"
+    assert "404" in results[str(tmp_path / "missing.gz")].error
+    assert results[str(tmp_path / "f5.gz")].status == "failed" and not (tmp_path / "f5.gz").exists()
+    assert ("/f4.gz", 20_000) in RangeHandler.ranges
+    assert any(p == "/flaky3.gz" and s > 0 for p, s in RangeHandler.ranges)
+
+    # 重跑：已完成且校验通过的文件不再下载
+    again = list(download_files(jobs[:3], concurrency=2, timeout=5))
+    assert all(r.status == "exists" for r in again)
+
+
+def test_malformed_responses_fail_only_their_job(server, tmp_path):
+    jobs = [DownloadJob(f"{server}{p}", str(tmp_path / p.strip("/"))) for p in MALFORMED]
+    jobs.append(DownloadJob(f"{server}/f0.gz", str(tmp_path / "f0.gz")))
+    results = {r.path: r for r in download_files(jobs, concurrency=4, retries=1, timeout=5, backoff=0.01)}
+    assert len(results) == len(jobs)
+    for p in MALFORMED:
+        r = results[str(tmp_path / p.strip("/"))]
+        assert r.status == "failed" and r.error, p
+    assert "MalformedResponse" in results[str(tmp_path / "garbage.gz")].error
+    assert "LimitOverrunError" in results[str(tmp_path / "hugehead.gz")].error
+    assert results[str(tmp_path / "f0.gz")].status == "done"
+
+
+def test_gate_bounds_unconsumed_files(server, tmp_path):
+    gate = threading.Semaphore(2)
+    jobs = [DownloadJob(f"{server}/f{i}.gz", str(tmp_path / f"g{i}.gz")) for i in range(5)]
+    it = download_files(jobs, concurrency=5, gate=gate, timeout=5)
+    next(it)
+    time.sleep(0.3)
+    # 名额用完：结果未处理前不会开始下载更多文件
+    assert len(list(tmp_path.glob("g*.gz"))) == 2
+    gate.release()
+    rest = []
+    for r in it:
+        rest.append(r)
+        gate.release()
+    assert len(rest) == 4 and all(r.status == "done" for r in rest)
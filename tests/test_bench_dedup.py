@@ -0,0 +1,31 @@
+import importlib.util
+import os
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    "bench_dedup", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts", "bench_dedup.py"))
+bench_dedup = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_dedup)
+
+
+def test_generate_corpus_distinct_lines():
+    lines, clusters = bench_dedup.generate_corpus(500, 0.5, 2, 10)
+    assert len(lines) == len(set(lines)) == len(clusters) == 500
+    assert len(set(clusters)) < 400
+
+
+@pytest.mark.parametrize("dup_rate,edits", [(1.0, 3), (1.5, 3), (-0.1, 3), (0.3, 0)])
+def test_generate_corpus_rejects_unsatisfiable_args(dup_rate, edits):
+    with pytest.raises(ValueError):
+        bench_dedup.generate_corpus(10, dup_rate, edits, 5)
+
+
+def test_generate_corpus_stops_when_variants_run_out(monkeypatch):
+    monkeypatch.setattr(bench_dedup, "MAX_REDRAWS", 50)
+    # 词表只有一个词时基础文档全都相同，只能靠单字符编辑出新行，很快用尽
+    monkeypatch.setattr(bench_dedup, "make_vocab", lambda rng: ["ab"])
+    with pytest.raises(RuntimeError):
+        bench_dedup.generate_corpus(10000, 0.5, 1, 1)
+    assert bench_dedup.generate_corpus(0, 0.0, 0, 5) == ([], [])
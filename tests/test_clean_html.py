@@ -0,0 +1,39 @@
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from utils.clean_html import clean_html, sniff_encoding
+
+
+def _bs4_reference(raw):
+    soup = BeautifulSoup(raw, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    return re.sub(r"\s+", " ", soup.get_text(separator="\n")).strip()
+
+
+@pytest.mark.parametrize("html", [
+    "<html><body><script>alert(1)</script><p>Hello   world</p></body></html>",
+    "<p>a &amp; b<b>bold</b>tail</p><noscript>no <b>x</b></noscript><style>p{}</style>end",
+    "<html><head><title>T</title></head><body><table><tr><td>1</td><td>2</td></tr></table></body></html>",
+    "<!-- comment --><div>x<br>y\n\t z</div>",
+    "plain text",
+])
+def test_matches_bs4_reference(html):
+    assert clean_html(html) == _bs4_reference(html)
+
+
+def test_truncated_and_empty():
+    assert clean_html("") == ""
+    assert clean_html("<p>kept</p><script>var x = 1;") == "kept"
+
+
+def test_bytes_charset_sniffing():
+    assert clean_html('<meta charset="gbk"><p>中文 测试</p>'.encode("gbk")) == "中文 测试"
+    assert clean_html("<p>中文</p>".encode("gb18030"), "text/html; charset=GB18030") == "中文"
+    assert clean_html("<p>café</p>".encode("cp1252")) == "café"
+    assert clean_html("<p>café</p>".encode("utf-8")) == "café"
+    assert sniff_encoding(b'<meta charset="ISO-8859-1">') == ("cp1252", True)
+    assert sniff_encoding(b"\xef\xbb\xbf<p>x</p>") == ("utf-8-sig", True)
+    assert sniff_encoding(b"<p>x</p>") == ("utf-8", False)
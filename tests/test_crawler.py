@@ -0,0 +1,127 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.crawler import Crawler, HostLimiter, crawl
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    lock = threading.Lock()
+    connections = 0
+    active = 0
+    max_active = 0
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with PageHandler.lock:
+            PageHandler.connections += 1
+
+    def do_GET(self):
+        with PageHandler.lock:
+            PageHandler.hits[self.path] = PageHandler.hits.get(self.path, 0) + 1
+            n = PageHandler.hits[self.path]
+            PageHandler.active += 1
+            PageHandler.max_active = max(PageHandler.max_active, PageHandler.active)
+        try:
+            time.sleep(0.01)
+            # /busy* 前两次返回 503，/gone* 总是 404
+            if self.path.startswith("/busy") and n <= 2:
+                status, body = 503, b"busy"
+            elif self.path.startswith("/gone"):
+                status, body = 404, b"gone"
+            else:
+                status, body = 200, f"<p>page {self.path}</p>".encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with PageHandler.lock:
+                PageHandler.active -= 1
+
+
+@pytest.fixture()
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_crawl_reuses_connections_and_limits_host(server):
+    crawler = Crawler(per_host=2, retries=3, timeout=5, backoff=0.01)
+    urls = [f"{server}/p{i}" for i in range(40)] + [f"{server}/busy1", f"{server}/gone1"]
+    results = dict(crawl(crawler.fetch, urls, workers=6))
+    assert len(results) == len(urls)
+    for i in range(40):
+        r = results[f"{server}/p{i}"]
+        assert r.error is None and r.content == f"<p>page /p{i}</p>".encode()
+    assert results[f"{server}/busy1"].status == 200
+    assert PageHandler.hits["/busy1"] == 3
+    gone = results[f"{server}/gone1"]
+    assert gone.status == 404 and gone.error and PageHandler.hits["/gone1"] == 1
+    assert PageHandler.max_active <= 2
+    # 每个线程一个 Session，连接数不超过线程数
+    assert PageHandler.connections <= 6
+
+
+def test_crawl_pulls_lazily():
+    pulled = []
+
+    def urls():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    gate = threading.Event()
+    it = crawl(lambda u: gate.wait() and u, urls(), workers=2, max_inflight=5)
+    threading.Timer(0.1, gate.set).start()
+    first = next(it)
+    assert len(pulled) <= 6
+    assert sorted([first[1]] + [r for _, r in it]) == list(range(100))
+
+
+def test_host_rate_limit():
+    limiter = HostLimiter(max_conns=4, rate=50)
+    t0 = time.monotonic()
+    for _ in range(6):
+        with limiter.slot("a"):
+            pass
+    with limiter.slot("b"):
+        pass
+    assert time.monotonic() - t0 >= 5 / 50 - 0.01
+
+
+def test_host_limiter_forgets_idle_hosts(monkeypatch):
+    monkeypatch.setattr("utils.crawler.SWEEP_MIN_HOSTS", 64)
+    limiter = HostLimiter(max_conns=2)
+    for i in range(1000):
+        with limiter.slot(f"h{i}"):
+            assert len(limiter) == 1
+    assert len(limiter) == 0
+
+    # 限速间隔未过的主机暂时保留，之后在主机数翻倍时清理
+    limiter = HostLimiter(max_conns=2, rate=1000)
+    for i in range(1000):
+        with limiter.slot(f"h{i}"):
+            pass
+        if i % 50 == 0:
+            time.sleep(0.002)
+    assert len(limiter) <= 2 * 64
+    # 仍在使用的主机不会被清理
+    with limiter.slot("busy"):
+        time.sleep(0.002)
+        for i in range(500):
+            with limiter.slot(f"x{i}"):
+                pass
+        assert "busy" in limiter._hosts
@@ -0,0 +1,64 @@
+import random
+import string
+import sys
+
+import pytest
+
+import data.dedup as dedup
+
+
+def _corpus(path, n=600):
+    """约三分之一的行是前面某行改动一个字符的近重复"""
+    rng = random.Random(0)
+    lines = []
+    for i in range(n):
+        if lines and i % 3 == 2:
+            src = list(rng.choice(lines))
+            src[rng.randrange(len(src))] = rng.choice(string.ascii_lowercase)
+            lines.append("".join(src))
+        else:
+            lines.append(" ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 8)))
+                                  for _ in range(30)))
+    path.write_text("\n".join(lines) + "\n\n", encoding="utf-8")
+
+
+def _run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["dedup.py", *argv])
+    dedup.main()
+
+
+@pytest.mark.parametrize("engine", ["numpy", "datasketch"])
+def test_stream_matches_in_memory(tmp_path, monkeypatch, engine):
+    src = tmp_path / "in.txt"
+    _corpus(src)
+    common = ["-i", str(src), "-p", "2", "-n", "64", "-e", engine]
+    _run(monkeypatch, *common, "-o", str(tmp_path / "mem.txt"))
+
+    # 窗口远小于输入：每次最多 2 个批次在途，产出第一批结果时输入只读了 2 个批次
+    monkeypatch.setattr(dedup, "BATCH_LINES", 50)
+    read_ahead = []
+    stream_batches = dedup.stream_batches
+
+    def tracking(lines, args, fn, bands=None):
+        n_read = 0
+
+        def counted():
+            nonlocal n_read
+            for line in lines:
+                n_read += 1
+                yield line
+
+        for i, item in enumerate(stream_batches(counted(), args, fn, bands)):
+            if i == 0:
+                read_ahead.append(n_read)
+            yield item
+
+    monkeypatch.setattr(dedup, "stream_batches", tracking)
+    _run(monkeypatch, *common, "-o", str(tmp_path / "stream.txt"), "--stream", "-w", "100")
+    _run(monkeypatch, *common, "-o", str(tmp_path / "sharded.txt"), "-w", "100", "-S", "2")
+    assert read_ahead == [100, 100]
+
+    expected = (tmp_path / "mem.txt").read_bytes()
+    assert 200 < len(expected.splitlines()) < 600
+    assert (tmp_path / "stream.txt").read_bytes() == expected
+    assert (tmp_path / "sharded.txt").read_bytes() == expected
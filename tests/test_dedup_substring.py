@@ -0,0 +1,96 @@
+import random
+import string
+
+import numpy as np
+import pytest
+
+from data.dedup_substring import dedup_substrings, snap_to_chars
+from utils.shards import shard_ranges
+
+BANNER = "We use cookies to improve your experience on this site. By continuing you accept our cookie policy."
+SHARD_BYTES = 1500
+MIDDLE = 60
+
+
+def _word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def _corpus(tmp_path):
+    """每行一篇文档；模板在第 0 个分片出现两次（分片内重复），在中间和最后一个分片各出现一次"""
+    rng = random.Random(0)
+    lines = [" ".join(_word(rng) for _ in range(8)) for _ in range(120)]
+    for i in (3, 10):
+        lines[i] = f"{lines[i]} {BANNER}"
+    lines[MIDDLE] = f"{BANNER} {lines[MIDDLE]}"
+    lines[-2] = BANNER
+    path = tmp_path / "in.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    ranges = shard_ranges(str(path), SHARD_BYTES)
+    assert len(ranges) >= 4
+    # 只有第 0 分片内部重复，其余分片里的出现只能靠跨分片词典删除
+    data = path.read_bytes()
+    assert [data[s:e].count(BANNER.encode()) for s, e in ranges] == [2, 0, 1, 0, 1]
+    return path, lines
+
+
+def _run(tmp_path, workers=1, **kw):
+    path, lines = _corpus(tmp_path)
+    out = tmp_path / f"out-{workers}-{sorted(kw.items())}.txt"
+    dedup_substrings(str(path), str(out), 50, SHARD_BYTES / (1 << 20), workers, **kw)
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith("substr_cand_")]
+    return lines, out.read_text(encoding="utf-8").split("\n")[:-1]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_banner_removed_within_and_across_shards(tmp_path, workers):
+    lines, out = _run(tmp_path, workers)
+    assert not any(BANNER[:50] in ln for ln in out)
+    expected = [ln.replace(BANNER, "").strip() for ln in lines[:-2] + lines[-1:]]
+    assert out == expected
+    # 没有重复的行逐字节保留
+    untouched = [ln for ln in lines if BANNER not in ln]
+    assert [ln for ln in out if ln in untouched] == untouched
+
+
+def test_keep_first_keeps_earliest_occurrence_only(tmp_path):
+    lines, out = _run(tmp_path, keep_first=True)
+    assert sum(ln.count(BANNER) for ln in out) == 1
+    assert out[3] == lines[3]
+    assert out[10] == lines[10].replace(BANNER, "").strip()
+    assert len(out) == len(lines) - 1
+
+
+def test_no_cross_shard_only_dedups_inside_shards(tmp_path):
+    lines, out = _run(tmp_path, cross_shard=False)
+    assert out[3] == lines[3].replace(BANNER, "").strip()
+    assert out[MIDDLE] == lines[MIDDLE] and out[-2] == BANNER
+
+
+def test_dict_budget_reports_dropped_candidates(tmp_path, capsys):
+    lines, out = _run(tmp_path, dict_mb=10 / (1 << 20))
+    assert "丢弃 1 条候选" in capsys.readouterr().out
+    # 词典放不下：跨分片的那两次出现保留
+    assert sum(ln.count(BANNER) for ln in out) == 2
+
+
+def test_snap_to_chars_never_splits_multibyte_chars():
+    data = "a中文b".encode("utf-8")  # a | E4 B8 AD | E6 96 87 | b
+    mask = np.zeros(len(data), dtype=bool)
+    mask[2:6] = True  # 从“中”的第 2 个字节到“文”的第 2 个字节
+    assert snap_to_chars(data, mask).tolist() == [False] * len(data)
+    mask[1:6] = True  # “中”整个被标记，“文”只标记了一部分
+    assert snap_to_chars(data, mask).tolist() == [False, True, True, True] + [False] * 4
+
+
+def test_cjk_spans_keep_neighbouring_chars_intact(tmp_path):
+    # “中”与“丰”前两个字节相同（E4 B8），字节级的重复片段会伸进它们中间
+    banner = "本网站使用缓存文件来改善您的浏览体验，继续访问即表示您同意我们的隐私政策。"
+    lines = [f"甲{banner}中国", f"乙{banner}丰收", "没有重复的一行文字"]
+    path = tmp_path / "in.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    data = path.read_bytes()
+    assert data.count(banner.encode() + "中".encode()[:2]) == 2 and "丰".encode()[:2] == "中".encode()[:2]
+    out = tmp_path / "out.txt"
+    dedup_substrings(str(path), str(out), 30, 1, 1)
+    assert out.read_text(encoding="utf-8").splitlines() == ["甲中国", "乙丰收", "没有重复的一行文字"]
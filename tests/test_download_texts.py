@@ -0,0 +1,90 @@
+import importlib.util
+import io
+import os
+import sys
+
+import pytest
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+from utils.fingerprint import ExactDeduper
+
+_spec = importlib.util.spec_from_file_location(
+    "download_texts", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   "scripts", "data", "download_texts.py"))
+download_texts = importlib.util.module_from_spec(_spec)
+# 进程池按模块名 pickle 任务函数
+sys.modules["download_texts"] = download_texts
+_spec.loader.exec_module(download_texts)
+
+
+def _write_warc(path, n, distinct):
+    """第 i 条记录的正文取决于 i % distinct，后面的记录重复前面的"""
+    with open(path, "wb") as f:
+        w = WARCWriter(f, gzip=True)
+        for i in range(n):
+            body = f"<html><body><p>page {i % distinct} " + "word " * (i % distinct % 17) + "</p></body></html>"
+            headers = StatusAndHeaders("200 OK", [("Content-Type", "text/html")], protocol="HTTP/1.0")
+            w.write_record(w.create_warc_record(f"http://example.com/{i}", "response",
+                                                payload=io.BytesIO(body.encode()), http_headers=headers))
+
+
+def test_resume_reseeds_in_batches_beyond_memory_budget(tmp_path, monkeypatch):
+    warc = str(tmp_path / "a.warc.gz")
+    _write_warc(warc, 300, 200)
+    out = str(tmp_path / "out.txt")
+
+    ckpts = []
+    write_json = download_texts.write_json_atomic
+    monkeypatch.setattr(download_texts, "write_json_atomic", lambda p, obj: (ckpts.append(obj), write_json(p, obj)))
+    download_texts.process_warc_indexed(warc, out, ExactDeduper(), batch=10)
+    with open(out, encoding="utf-8") as f:
+        full = f.read()
+    assert len(full.splitlines()) == 200
+
+    # 模拟在第 150 条记录处中断：输出多出一截未记入检查点的内容
+    ckpt = next(c for c in ckpts if c["records"] == 150)
+    download_texts.write_json_atomic(out + ".ckpt", ckpt)
+    with open(out, "r+b") as f:
+        f.truncate(ckpt["bytes"])
+        f.seek(0, os.SEEK_END)
+        f.write(b"partial line\n")
+
+    # 预算远小于已有输出的指纹：重建过程中转入外存模式，已有输出不能再产出一遍
+    monkeypatch.setattr(download_texts, "DEDUP_BATCH", 16)
+    dedup = ExactDeduper(memory_budget=512, tmp_dir=str(tmp_path))
+    sizes = []
+    feed = dedup.feed
+    dedup.feed = lambda texts, fps=None: (sizes.append(len(texts := list(texts))), feed(texts, fps))[1]
+    download_texts.process_warc_indexed(warc, out, dedup, batch=10, resume=True)
+    assert max(sizes) <= 16 and dedup.n_out == 200
+    with open(out, encoding="utf-8") as f:
+        assert f.read() == full
+    assert not os.path.exists(out + ".ckpt")
+
+
+def test_exact_deduper_seed_requires_fresh_state(tmp_path):
+    dedup = ExactDeduper(memory_budget=64, tmp_dir=str(tmp_path))
+    dedup.seed([f"old {i}" for i in range(20)])
+    assert dedup.external and dedup.n_out == 20
+    dedup.feed(["old 3", "new 1", "old 19", "new 2"])
+    with pytest.raises(RuntimeError):
+        dedup.seed(["late"])
+    assert list(dedup.finish()) == ["new 1", "new 2"]
+    assert dedup.n_out == 22
+
+
+@pytest.mark.parametrize("process", ["process_warc", "process_warc_indexed"])
+def test_process_pool_matches_single_process(tmp_path, process):
+    warc = str(tmp_path / "a.warc.gz")
+    _write_warc(warc, 400, 250)
+    fn = getattr(download_texts, process)
+    outputs = []
+    for procs, inflight in [(1, 0), (3, 0), (3, 1), (2, 9)]:
+        out = str(tmp_path / f"out-{procs}-{inflight}.txt")
+        fn(warc, out, ExactDeduper(), procs=procs, batch=7, max_inflight=inflight)
+        with open(out, encoding="utf-8") as f:
+            outputs.append(f.read())
+    lines = outputs[0].splitlines()
+    assert [line.split()[:2] for line in lines] == [["page", str(i)] for i in range(250)]
+    assert all(o == outputs[0] for o in outputs[1:])
@@ -0,0 +1,90 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.crawler import Crawler
+from utils.fetch_cache import FetchCache
+
+
+class EtagHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    version = {"/a": 1, "/b": 1}
+    log = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path not in self.version:
+            self.send_error(404)
+            return
+        etag = f'"{self.path}-{self.version[self.path]}"'
+        conditional = self.headers.get("If-None-Match")
+        EtagHandler.log.append((self.path, conditional))
+        if conditional == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f"<p>{self.path} v{self.version[self.path]}</p>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture()
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), EtagHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_fetch_cache_hit_revalidate_and_refetch(server, tmp_path):
+    crawler = Crawler(retries=0, timeout=5)
+    calls = []
+
+    def extract(body, ctype):
+        calls.append(body)
+        return body.decode()
+
+    cache = FetchCache(str(tmp_path), ttl=3600)
+    assert cache.fetch_text(crawler, f"{server}/a", extract) == "<p>/a v1</p>"
+    assert cache.fetch_text(crawler, f"{server}/missing", extract) == ""
+    # 新鲜命中：不发请求，也不再抽取
+    n_req = len(EtagHandler.log)
+    assert cache.fetch_text(crawler, f"{server}/a", extract) == "<p>/a v1</p>"
+    assert len(EtagHandler.log) == n_req and len(calls) == 1
+
+    # 过期：条件请求，304 沿用缓存文本
+    stale = FetchCache(str(tmp_path), ttl=0)
+    assert stale.fetch_text(crawler, f"{server}/a", extract) == "<p>/a v1</p>"
+    assert EtagHandler.log[-1] == ("/a", '"/a-1"') and len(calls) == 1
+    # 内容变化：200，重新抽取并覆盖缓存
+    EtagHandler.version["/a"] = 2
+    assert stale.fetch_text(crawler, f"{server}/a", extract) == "<p>/a v2</p>"
+    assert len(calls) == 2
+    assert stale.stats == {"hit": 0, "revalidated": 1, "reextracted": 0, "miss": 1}
+
+    # 抽取代码变化：用缓存的原始响应重新抽取，不发请求
+    changed = FetchCache(str(tmp_path), ttl=3600)
+    changed.extractor = "other"
+    n_req = len(EtagHandler.log)
+    assert changed.fetch_text(crawler, f"{server}/a", lambda b, c: "re:" + b.decode()) == "re:<p>/a v2</p>"
+    assert len(EtagHandler.log) == n_req and changed.stats["reextracted"] == 1
+
+
+def test_fetch_cache_size_bound(server, tmp_path):
+    crawler = Crawler(retries=0, timeout=5)
+    cache = FetchCache(str(tmp_path), max_bytes=1)
+    for path in ("/a", "/b"):
+        cache.fetch_text(crawler, server + path, lambda b, c: b.decode())
+    cache.prune()
+    assert cache.store.size() <= 1
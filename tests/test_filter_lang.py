@@ -0,0 +1,83 @@
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fasttext")
+
+import data.filter_lang as filter_lang
+from utils.script_ratio import LANG_SCRIPTS, script_ratios
+
+
+class FakeModel:
+    """按内容给标签：含汉字为 zh，以 "fr " 开头为 fr，其余为 en；含 "low" 的行置信度 0.3"""
+
+    batches = []
+
+    @staticmethod
+    def label(line):
+        if any("一" <= c <= "鿿" for c in line):
+            lang = "zh"
+        elif line.startswith("fr "):
+            lang = "fr"
+        else:
+            lang = "en"
+        return lang, 0.3 if "low" in line else 0.9
+
+    def predict(self, texts, k=1):
+        assert isinstance(texts, list) and k == 1
+        self.batches.append(len(texts))
+        out = [self.label(t) for t in texts]
+        return [(f"__label__{lang}",) for lang, _ in out], [np.array([p]) for _, p in out]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(filter_lang.fasttext, "load_model", lambda path: FakeModel())
+    rng = random.Random(0)
+    pool = ["hello world {}", "fr bonjour le monde {}", "中文句子第{}行。", "low quality {}",
+            "mostly 中文中文中文中文中文 {}", "  ", "ünïcödé ñ {}"]
+    lines = [rng.choice(pool).format(i) for i in range(3000)]
+    path = tmp_path / "in.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path, lines
+
+
+def _expected(lines, routes, thresh):
+    out = {lang: [] for lang in routes}
+    for line in (l.strip() for l in lines):
+        if not line:
+            continue
+        lang, prob = FakeModel.label(line)
+        if lang in routes and prob >= routes[lang] and \
+                script_ratios([line], [LANG_SCRIPTS[lang]])[0, 0] >= thresh:
+            out[lang].append(line)
+    return out
+
+
+def test_route_file_keeps_order_for_any_worker_count(tmp_path, corpus):
+    path, lines = corpus
+    routes = {"en": 0.5, "zh": 0.0}
+    expected = _expected(lines, routes, 0.8)
+    assert all(len(v) > 100 for v in expected.values())
+
+    for workers, inflight in [(1, 0), (2, 1), (3, 0), (3, 7)]:
+        outputs = {lang: str(tmp_path / f"w{workers}-{inflight}" / f"{lang}.txt") for lang in routes}
+        counts = filter_lang.route_file(str(path), outputs, "fake.ftz", routes, workers, 0.8,
+                                        chunk_bytes=4096, max_inflight=inflight)
+        for lang, out in outputs.items():
+            with open(out, encoding="utf-8") as f:
+                assert f.read().splitlines() == expected[lang]
+            assert counts[lang] == len(expected[lang])
+
+
+def test_filter_lines_predicts_once_per_batch(corpus):
+    _, lines = corpus
+    FakeModel.batches.clear()
+    filter_lang.init_model("fake.ftz", {"en": 0.5, "zh": 0.0}, 0.8)
+    got = filter_lang.filter_lines(lines[:500])
+    expected = _expected(lines[:500], {"en": 0.5, "zh": 0.0}, 0.8)
+    assert sorted(got) == sorted(expected["en"] + expected["zh"])
+    assert got == [l.strip() for l in lines[:500] if l.strip() in set(got)]
+    # 一次批量 predict，且文字占比不达标的行不送去预测
+    assert len(FakeModel.batches) == 1 and FakeModel.batches[0] < 500
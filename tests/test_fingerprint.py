@@ -0,0 +1,26 @@
+import random
+
+import pytest
+
+import utils.fingerprint as fingerprint
+from utils.fingerprint import ExactDeduper
+
+
+@pytest.mark.parametrize("bits", [64, 128])
+@pytest.mark.parametrize("budget", [1 << 30, 2000])
+def test_exact_dedup_keeps_first_occurrence_order(monkeypatch, tmp_path, bits, budget):
+    # 小块归并，确保多个 run 和多轮归并都被覆盖
+    monkeypatch.setattr(fingerprint, "MERGE_BLOCK", 64)
+    rng = random.Random(0)
+    data = [f"line {rng.randrange(2000)}" for _ in range(10000)]
+
+    dedup = ExactDeduper(memory_budget=budget, bits=bits, tmp_dir=str(tmp_path))
+    out = []
+    for i in range(0, len(data), 100):
+        out += dedup.feed(data[i:i + 100])
+    out += list(dedup.finish())
+
+    assert out == list(dict.fromkeys(data))
+    assert dedup.n_out == len(out)
+    assert not dedup.external
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from utils.lsh_index import DiskLSHIndex
+from utils.minhash import MinHashEngine
+
+
+def _sigs(texts, num_perm=64):
+    return MinHashEngine(num_perm=num_perm).signatures(texts)
+
+
+def test_first_occurrence_wins_within_and_across_batches(tmp_path):
+    index = DiskLSHIndex(str(tmp_path), threshold=0.8, num_perm=64)
+    base = "the quick brown fox jumps over the lazy dog " * 3
+    keep = index.insert_unique(_sigs([base, "something else entirely", base + "!"]))
+    assert keep.tolist() == [True, True, False]
+    index.flush()
+    keep = index.insert_unique(_sigs([base + "?", "a brand new line of text here"]))
+    assert keep.tolist() == [False, True]
+
+
+def test_reopen_from_state_and_compact(tmp_path):
+    texts = [f"document number {i} with some shared filler text" * 2 for i in range(6)]
+    index = DiskLSHIndex(str(tmp_path), threshold=0.9, num_perm=64, max_segments=2)
+    for t in texts:
+        index.insert_unique(_sigs([t]))
+        index.flush()
+    state = index.state()
+    assert len(state["segments"]) <= 2
+
+    reopened = DiskLSHIndex.open(str(tmp_path), state)
+    assert len(reopened) == len(index)
+    assert reopened.query_batch(_sigs(texts)).all()
+    # 合并前的旧段在重新打开时被回收
+    assert sorted(os.listdir(tmp_path)) == sorted(state["segments"])
+    assert not reopened.query_batch(_sigs(["unrelated " * 10])).any()
+    assert isinstance(reopened._arrays[0], np.memmap)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from utils.lsh_shard import LocalLSH, ShardedLSH
+
+
+def _sequential(batches):
+    """逐行 query/insert 的参考实现"""
+    seen = [set() for _ in range(batches[0].shape[1])]
+    out = []
+    for keys in batches:
+        for row in keys.tolist():
+            dup = any(k in s for k, s in zip(row, seen))
+            out.append(not dup)
+            if not dup:
+                for k, s in zip(row, seen):
+                    s.add(k)
+    return out
+
+
+def test_sharded_matches_sequential_first_occurrence():
+    rng = np.random.RandomState(0)
+    # 很小的取值范围，制造大量批内、跨批和跨 band 的碰撞
+    batches = [rng.randint(0, 40, size=(50, 5)).astype(np.uint64) for _ in range(6)]
+    with ShardedLSH(bands=5, shards=3) as lsh:
+        got = [bool(k) for keys in batches for k in lsh.insert_unique(keys)]
+    assert got == _sequential(batches)
+
+
+def test_local_matches_sequential_first_occurrence():
+    rng = np.random.RandomState(1)
+    batches = [rng.randint(0, 40, size=(50, 5)).astype(np.uint64) for _ in range(6)]
+    with LocalLSH(bands=5) as lsh:
+        got = [bool(k) for keys in batches for k in lsh.insert_unique(keys)]
+    assert got == _sequential(batches)
@@ -0,0 +1,44 @@
+import importlib.util
+import os
+import random
+import sys
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    "merge_raws", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "scripts", "data", "merge_raws.py"))
+merge_raws = importlib.util.module_from_spec(_spec)
+# 进程池按模块名 pickle 任务函数
+sys.modules["merge_raws"] = merge_raws
+_spec.loader.exec_module(merge_raws)
+
+
+def _reference(paths):
+    """原 merge_raws.py：文本模式逐行读取（通用换行），strip 后按整行去重"""
+    seen, out = set(), []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                t = line.strip()
+                if t and t not in seen:
+                    seen.add(t)
+                    out.append(t)
+    return out
+
+
+@pytest.mark.parametrize("workers,budget", [(1, 1 << 20), (2, 256)])
+def test_mixed_line_endings_match_text_mode(tmp_path, workers, budget):
+    rng = random.Random(0)
+    words = [f"line {i}" for i in range(300)] + ["  padded  ", "中文行"]
+    paths = []
+    for name in ("primary.txt", "cc.txt"):
+        parts = [rng.choice(words) + rng.choice(["\n", "\r\n", "\r", " \r\n", "\n\n"]) for _ in range(2000)]
+        path = tmp_path / name
+        path.write_bytes("".join(parts).encode("utf-8"))
+        paths.append(str(path))
+    out = tmp_path / "out" / "all.txt"
+    merge_raws.merge_files(*paths, str(out), memory_budget=budget, workers=workers, shard_mb=2000 / (1 << 20))
+    got = out.read_bytes().decode("utf-8").split("\n")[:-1]
+    assert got == _reference(paths)
+    assert not any("\r" in t for t in got)
@@ -0,0 +1,41 @@
+import numpy as np
+from datasketch import MinHash, MinHashLSH
+
+from utils.minhash import MinHashEngine, to_lean_minhash
+
+
+def _reference(engine, text):
+    """逐行、不分块的朴素实现，作为批量结果的对照"""
+    hv = engine._window_hashes(np.array([ord(c) for c in text], dtype=np.uint64))
+    if len(hv) == 0:
+        return np.full(engine.num_perm, (1 << 32) - 1, dtype=np.uint64)
+    return engine._permute(hv).min(axis=0)
+
+
+def test_batch_matches_per_line_reference():
+    engine = MinHashEngine(num_perm=32, k_shingle=5, block_size=7)
+    texts = ["hello world", "abc", "", "hello world!", "中文文本去重测试样例", "x" * 50]
+    sigs = engine.signatures(texts)
+    assert sigs.shape == (len(texts), 32)
+    for text, sig in zip(texts, sigs):
+        assert (sig == _reference(engine, text)).all()
+
+
+def test_permutations_match_datasketch_legacy():
+    engine = MinHashEngine(num_perm=16, seed=3)
+    try:
+        m = MinHash(num_perm=16, seed=3, scheme="legacy")
+    except TypeError:
+        m = MinHash(num_perm=16, seed=3)
+    assert (m.permutations[0] == engine.a).all()
+    assert (m.permutations[1] == engine.b).all()
+
+
+def test_signatures_work_with_lsh():
+    engine = MinHashEngine(num_perm=64)
+    base = "the quick brown fox jumps over the lazy dog " * 3
+    sigs = engine.signatures([base, base + "!", "completely different sentence here"])
+    lsh = MinHashLSH(threshold=0.8, num_perm=64)
+    lsh.insert("0", to_lean_minhash(sigs[0]))
+    assert lsh.query(to_lean_minhash(sigs[1])) == ["0"]
+    assert lsh.query(to_lean_minhash(sigs[2])) == []
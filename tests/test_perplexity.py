@@ -0,0 +1,118 @@
+import math
+import random
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from utils.perplexity import (cached_sliding_nll, length_batches, perplexity, score_ids, score_lines,
+                              sliding_windows)
+
+
+@pytest.fixture(scope="module")
+def tiny_lm():
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(vocab_size=97, n_positions=64, n_embd=32, n_layer=2, n_head=2)
+    return transformers.GPT2LMHeadModel(config).eval()
+
+
+class CharTokenizer:
+    """每个字符一个 token，足够驱动 score_lines"""
+
+    def __call__(self, lines, truncation=True, max_length=None):
+        ids = [[ord(c) % 97 for c in line] for line in lines]
+        return {"input_ids": [s[:max_length] for s in ids] if truncation else ids}
+
+
+def test_length_batches():
+    lengths = [5, 1, 9, 3, 9, 2, 7]
+    batches = length_batches(lengths, batch_size=3)
+    assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+    assert [lengths[b[0]] for b in batches] == sorted((lengths[b[0]] for b in batches), reverse=True)
+    for b in length_batches(lengths, max_tokens=20):
+        assert len(b) * max(lengths[i] for i in b) <= 20 or len(b) == 1
+
+
+def test_batched_nll_matches_single_sequence(tiny_lm):
+    rng = random.Random(0)
+    seqs = [[rng.randrange(97) for _ in range(rng.randint(0, 40))] for _ in range(25)]
+    # 让 pad 位置的取值与真实 token（如 eos = 0）相同也不影响结果
+    seqs[3] = [0] * 10
+    expected = []
+    with torch.no_grad():
+        for s in seqs:
+            if len(s) < 2:
+                expected.append((0.0, 0))
+                continue
+            ids = torch.tensor([s])
+            loss = tiny_lm(ids, labels=ids).loss.item()
+            expected.append((loss * (len(s) - 1), len(s) - 1))
+    for kwargs in ({"batch_size": 4}, {"max_tokens": 64}):
+        got = score_ids(tiny_lm, seqs, torch.device("cpu"), **kwargs)
+        for (a, n), (b, m) in zip(got, expected):
+            assert n == m
+            assert a == pytest.approx(b, rel=1e-4, abs=1e-4)
+
+
+def test_score_lines_in_order(tiny_lm):
+    lines = [f"line {i} " + "x" * (i % 13) for i in range(30)]
+    out = list(score_lines(tiny_lm, CharTokenizer(), iter(lines), torch.device("cpu"),
+                           max_length=16, batch_size=4, window=7))
+    assert [o[0] for o in out] == lines
+    assert all(n == min(len(line), 16) - 1 for line, _, n in out)
+    total = perplexity(sum(o[1] for o in out), sum(o[2] for o in out))
+    assert math.isfinite(total) and total > 1
+
+
+def test_sliding_windows_score_every_token_once():
+    for n, max_length, stride in [(2, 4, 1), (10, 4, 2), (37, 8, 3), (64, 16, 15)]:
+        scored = []
+        for begin, end, skip in sliding_windows(n, max_length, stride):
+            assert end - begin <= max_length
+            scored += range(begin + 1 + skip, end)
+        assert scored == list(range(1, n))
+    with pytest.raises(ValueError):
+        sliding_windows(10, 4, 4)
+
+
+def test_sliding_window_matches_manual_windows(tiny_lm):
+    rng = random.Random(1)
+    doc = [rng.randrange(97) for _ in range(150)]
+    seqs = [doc, doc[:20]]
+    got = score_ids(tiny_lm, seqs, torch.device("cpu"), batch_size=3, max_length=32, stride=12, kv_cache=False)
+    assert got[0][1] == len(doc) - 1 and got[1][1] == 19
+    # 参照：HF 文档里的滑动窗口写法，labels 中上文部分置为 -100
+    expected, prev_end = 0.0, 0
+    with torch.no_grad():
+        for begin in range(0, len(doc), 12):
+            end = min(begin + 32, len(doc))
+            ids = torch.tensor([doc[begin:end]])
+            labels = ids.clone()
+            labels[:, :max(prev_end - begin, 1)] = -100
+            n = int((labels[:, 1:] != -100).sum())
+            expected += tiny_lm(ids, labels=labels).loss.item() * n
+            prev_end = end
+            if end == len(doc):
+                break
+    assert got[0][0] == pytest.approx(expected, rel=1e-4)
+
+
+def test_kv_cache_sliding_is_close_to_recompute(tiny_lm):
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(vocab_size=97, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                                      num_attention_heads=2, num_key_value_heads=2, max_position_embeddings=512)
+    model = transformers.LlamaForCausalLM(config).eval()
+    rng = random.Random(2)
+    doc = [rng.randrange(97) for _ in range(200)]
+    exact = score_ids(model, [doc], torch.device("cpu"), max_length=48, stride=16, kv_cache=False)[0]
+    # 默认走精确的逐窗口重算
+    assert score_ids(model, [doc], torch.device("cpu"), max_length=48, stride=16)[0] == exact
+    cached = cached_sliding_nll(model, doc, torch.device("cpu"), max_length=48, stride=16)
+    assert score_ids(model, [doc], torch.device("cpu"), max_length=48, stride=16, kv_cache=True)[0] == cached
+    # 复用 KV 缓存是近似：第一层之后的缓存带有已裁掉的上文，只要求每 token 平均 NLL 相差很小
+    assert cached[1] == exact[1] == len(doc) - 1
+    assert abs(cached[0] - exact[0]) / exact[1] < 0.01
+    # 绝对位置编码的模型不支持复用缓存
+    with pytest.raises(ValueError):
+        score_ids(tiny_lm, [doc], torch.device("cpu"), max_length=48, stride=16, kv_cache=True)
@@ -0,0 +1,122 @@
+import ast
+import os
+import random
+import string
+
+import pytest
+
+from data.pipeline import STAGE_CODE, parse_size, plan, run_pipeline
+from utils.shards import shard_ranges
+
+
+def test_parse_size():
+    assert parse_size("5GB") == 5 << 30
+    assert parse_size("500m") == 500 << 20
+    assert parse_size("1.5 GiB") == 3 << 29
+    assert parse_size(1024) == 1024
+    assert parse_size(None) is None
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_plan_splits_at_gates():
+    assert plan(["dedup", "split", "filter", "clean", "minify"]) == \
+        [([], "dedup"), (["split", "filter", "clean", "minify"], None)]
+    assert plan(["clean", "dedup"]) == [(["clean"], "dedup")]
+    with pytest.raises(ValueError):
+        plan(["dedup", "compress"])
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_pipeline(tmp_path, workers):
+    rng = random.Random(0)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(500)]
+    lines = ["  ".join(rng.choices(words, k=rng.randint(5, 12))) for _ in range(3000)]
+    lines += lines[:500] + ["", "   ", "{code} = 1;"]
+    src = tmp_path / "in.txt"
+    src.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    config = {"pipeline": ["dedup", "clean", "minify"]}
+
+    out = tmp_path / f"out{workers}.txt"
+    stats, written = run_pipeline(config, str(src), str(out), workers, chunk_bytes=4096)
+    kept = out.read_text(encoding="utf-8").splitlines()
+    assert written == out.stat().st_size and stats["output"] == len(kept)
+    assert stats["input"] == len(lines) - 2
+    assert len(set(kept)) == len(kept) and "{code} = 1;" not in kept
+    assert all("  " not in line for line in kept)
+    # 结果与进程数、分批无关
+    ref = tmp_path / "ref.txt"
+    run_pipeline(config, str(src), str(ref), 1, chunk_bytes=1 << 20)
+    assert kept == ref.read_text(encoding="utf-8").splitlines()
+
+    capped = tmp_path / "capped.txt"
+    _, n = run_pipeline(config, str(src), str(capped), workers, chunk_bytes=4096, target_bytes=2000)
+    assert 2000 <= n < 2000 + max(map(len, kept)) + 2
+    head = capped.read_text(encoding="utf-8").splitlines()
+    assert head == kept[:len(head)]
+
+
+def test_run_pipeline_stage_cache(tmp_path):
+    rng = random.Random(1)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(300)]
+    lines = [" ".join(rng.choices(words, k=rng.randint(3, 12))) for _ in range(2000)]
+    src = tmp_path / "in.txt"
+    src.write_text("\n".join(lines + lines[:300]) + "\n", encoding="utf-8")
+    cache = str(tmp_path / "cache")
+    config = {"pipeline": ["dedup", "clean", "minify"]}
+
+    def run(cfg, name):
+        out = tmp_path / name
+        stats, _ = run_pipeline(cfg, str(src), str(out), 2, chunk_bytes=8192, cache_dir=cache)
+        return stats, out.read_text(encoding="utf-8")
+
+    plain = tmp_path / "plain.txt"
+    run_pipeline(config, str(src), str(plain), 1, chunk_bytes=8192)
+    first, text1 = run(config, "a.txt")
+    assert text1 == plain.read_text(encoding="utf-8")
+    assert first["cache_miss"] > 0
+
+    again, text2 = run(config, "b.txt")
+    assert text2 == text1 and again["cache_miss"] == 0
+    assert {k: again[k] for k in ("input", "dedup", "clean", "minify")} == \
+        {k: first[k] for k in ("input", "dedup", "clean", "minify")}
+
+    # 只改 clean 的参数：dedup 段全部命中，clean 及之后重算，结果与不用缓存时相同
+    tweaked = dict(config, params={"clean": {"min_tok": 6}})
+    stats, text3 = run(tweaked, "c.txt")
+    n_shards = len(shard_ranges(str(src), 8192))
+    assert stats["cache_hit"] >= n_shards and 0 < stats["cache_miss"] <= 2 * n_shards
+    run_pipeline(tweaked, str(src), str(plain), 1, chunk_bytes=8192)
+    assert text3 == plain.read_text(encoding="utf-8") != text1
+
+
+def _repo_imports(rel, root):
+    """rel 导入的仓库内模块（data.* / utils.*，含函数内的延迟导入），返回相对路径集合"""
+    with open(os.path.join(root, rel), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    out = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module in ("data", "utils"):
+            names = [f"{node.module}.{a.name}" for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+        elif isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        else:
+            continue
+        out.update(n.replace(".", "/") + ".py" for n in names if n.split(".")[0] in ("data", "utils"))
+    return out
+
+
+def test_stage_code_lists_every_executed_module():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for stage, paths in STAGE_CODE.items():
+        for rel in paths:
+            # 流水线本身的导入（缓存、分片调度等）不属于阶段逻辑
+            if rel != "data/pipeline.py":
+                missing = _repo_imports(rel, root) - set(paths)
+                assert not missing, f"{stage} 阶段的代码版本缺少 {missing}（由 {rel} 导入）"
+    # 流水线里构造各阶段时用到的模块
+    made = {"split": "data/split_sentences.py", "filter": "data/filter_lang.py",
+            "clean": "data/clean_text.py", "dedup": "utils/lsh_shard.py"}
+    assert all(rel in STAGE_CODE[stage] for stage, rel in made.items())
@@ -0,0 +1,25 @@
+import random
+
+import numpy as np
+
+from utils.script_ratio import SCRIPTS, script_ratios
+
+
+def _ratio(line, name):
+    if not line:
+        return 0.0
+    hit = sum(any(lo <= ord(c) <= hi for lo, hi in SCRIPTS[name]) for c in line)
+    return hit / len(line)
+
+
+def test_script_ratios_match_per_char_reference():
+    rng = random.Random(0)
+    alphabet = "abc XYZ 123,.!é中文字，。ひらカナ한국어Привет𠀀😀\t"
+    lines = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(500)]
+    names = list(SCRIPTS)
+    got = script_ratios(lines, names)
+    expected = np.array([[_ratio(line, n) for n in names] for line in lines])
+    assert np.allclose(got, expected)
+    # ascii 与原 looks_english_ascii 的 ASCII 占比一致
+    assert np.allclose(got[:, names.index("ascii")],
+                       [sum(ord(c) < 128 for c in s) / len(s) if s else 0 for s in lines])
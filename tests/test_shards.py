@@ -0,0 +1,23 @@
+import pytest
+
+from utils.shards import map_shards, range_lines, shard_ranges
+
+
+def _lines(path, start, end):
+    return [line.rstrip("\n") for line in range_lines(path, start, end)]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_map_shards_covers_file_in_order(tmp_path, workers):
+    path = tmp_path / "in.txt"
+    lines = [f"line {i} " + "x" * (i % 37) for i in range(2000)]
+    path.write_bytes(("\n".join(lines[:1000]) + "\r\n" + "\n".join(lines[1000:])).encode("utf-8"))
+
+    ranges = shard_ranges(str(path), 500)
+    assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    data = path.read_bytes()
+    assert all(data[e - 1:e] == b"\n" for _, e in ranges[:-1])
+
+    got = [line for _, out in map_shards(_lines, str(path), 500, workers, max_inflight=2) for line in out]
+    assert got == lines
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+from utils.sig_cache import SignatureCache, iter_offset_lines
+
+
+def test_signature_cache_roundtrip_and_invalidation(tmp_path):
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_bytes("第一行\n\n  second line  \r\nthird\n".encode("utf-8"))
+    rows = list(iter_offset_lines(str(corpus)))
+    assert [t for _, _, t in rows] == ["第一行", "second line", "third"]
+    data = corpus.read_bytes()
+    assert [data[s:e].decode("utf-8").strip() for s, e, _ in rows] == ["第一行", "second line", "third"]
+
+    cache = SignatureCache(str(tmp_path / "cache"), str(corpus), num_perm=4, k_shingle=5)
+    assert cache.load() is None
+    sigs = np.arange(12, dtype=np.uint64).reshape(3, 4)
+    with cache.writer() as w:
+        w.append(sigs[:2], [(s, e) for s, e, _ in rows[:2]])
+        w.append(sigs[2:], [(s, e) for s, e, _ in rows[2:]])
+
+    got, offsets = cache.load()
+    assert isinstance(got, np.memmap)
+    assert np.array_equal(got, sigs)
+    assert offsets.tolist() == [[s, e] for s, e, _ in rows]
+    # 其他参数组合互不干扰
+    assert SignatureCache(str(tmp_path / "cache"), str(corpus), num_perm=8, k_shingle=5).load() is None
+    # 不同语料共用缓存根目录：各占一个子目录，互不覆盖
+    other = tmp_path / "sub" / "corpus.txt"
+    other.parent.mkdir()
+    other.write_bytes(data)
+    other_cache = SignatureCache(str(tmp_path / "cache"), str(other), num_perm=4, k_shingle=5)
+    assert other_cache.dir != cache.dir and other_cache.load() is None
+    with other_cache.writer() as w:
+        w.append(sigs + 1, [(s, e) for s, e, _ in rows])
+    assert np.array_equal(cache.load()[0], sigs)
+    assert np.array_equal(other_cache.load()[0], sigs + 1)
+
+    st = os.stat(corpus)
+    os.utime(corpus, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.load() is None
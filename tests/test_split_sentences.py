@@ -0,0 +1,99 @@
+import random
+import re
+
+import numpy as np
+import pytest
+
+pytest.importorskip("nltk")
+pytest.importorskip("transformers")
+
+import data.split_sentences as split_sentences
+
+MAX_TOKENS = 6
+
+
+def sent_tokenize(text):
+    return [s.strip() for s in re.findall(r"[^.]+\.?", text) if s.strip()]
+
+
+class ChunkTokenizer:
+    """把 UTF-8 字节切成 1～3 字节的 token（连续小写字母最多三个一组，其余每字节一个），记录每次调用的句数"""
+
+    def __init__(self):
+        self.calls = []
+        self.backend_tokenizer = self
+
+    normalizer = None
+
+    @staticmethod
+    def get_vocab():
+        return {"a": 0, "ab": 1, "abc": 2, " ": 3}
+
+    @staticmethod
+    def count(text):
+        return len(re.findall(rb"[a-z]{1,3}|.", text.encode("utf-8"), re.S))
+
+    def __call__(self, texts, add_special_tokens=True, return_attention_mask=True):
+        self.calls.append(list(texts))
+        return {"input_ids": [[0] * self.count(t) for t in texts]}
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    tok = ChunkTokenizer()
+    monkeypatch.setattr(split_sentences, "sent_tokenize", sent_tokenize)
+    monkeypatch.setattr(split_sentences.AutoTokenizer, "from_pretrained",
+                        staticmethod(lambda *a, **kw: tok))
+    monkeypatch.setattr(split_sentences, "BATCH_SENTENCES", 4)
+    return tok
+
+
+def _lines(n=40, seed=0):
+    rng = random.Random(seed)
+    words = ["a", "abcd", "xy", "é", "ab c", "abcabcabc", "z"]
+    return [". ".join(" ".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+                      for _ in range(rng.randint(1, 4))) + ".\n" for _ in range(n)]
+
+
+def test_token_bounds_contain_exact_count(tokenizer):
+    split_sentences.init_worker("stub", MAX_TOKENS)
+    assert split_sentences.MAX_TOKEN_BYTES == 3
+    for line in _lines(200):
+        for sent in sent_tokenize(line):
+            lower, upper = split_sentences.token_bounds(sent)
+            assert lower <= ChunkTokenizer.count(sent) <= upper
+
+
+@pytest.mark.parametrize("with_counts", [True, False])
+def test_split_block_never_misclassifies(tokenizer, with_counts):
+    split_sentences.init_worker("stub", MAX_TOKENS, with_counts)
+    lines = _lines()
+    sents = [s for line in lines for s in sent_tokenize(line)]
+    expected = [s for s in sents if ChunkTokenizer.count(s) <= MAX_TOKENS]
+    assert 0 < len(expected) < len(sents)
+
+    fragments, counts = split_sentences.split_block(lines)
+    assert fragments == expected
+    assert counts == ([ChunkTokenizer.count(s) for s in expected] if with_counts else None)
+
+    # 分批调用不超过 BATCH_SENTENCES；按字节长度就能确定超长的句子从不送去分词
+    tokenized = [s for call in tokenizer.calls for s in call]
+    assert all(len(call) <= 4 for call in tokenizer.calls)
+    assert all(split_sentences.token_bounds(s)[0] <= MAX_TOKENS for s in tokenized)
+    if not with_counts:
+        # 不需要计数时，必然不超限的句子也跳过分词
+        assert all(split_sentences.token_bounds(s)[1] > MAX_TOKENS for s in tokenized)
+        assert len(tokenized) < len(sents)
+
+
+def test_counts_sidecar_matches_output(tokenizer, tmp_path):
+    src = tmp_path / "in.txt"
+    src.write_text("".join(_lines(300, seed=1)), encoding="utf-8")
+    out = tmp_path / "out" / "sent.txt"
+    split_sentences.split_and_filter(str(src), str(out), MAX_TOKENS, "stub", workers=1,
+                                     counts_path=str(out) + ".ntok")
+    frags = out.read_text(encoding="utf-8").splitlines()
+    counts = np.fromfile(str(out) + ".ntok", dtype="<u4")
+    assert len(frags) == len(counts) > 0
+    assert counts.tolist() == [ChunkTokenizer.count(f) for f in frags]
+    assert max(counts) <= MAX_TOKENS
@@ -0,0 +1,36 @@
+import os
+
+from utils.stage_cache import StageCache, digest
+
+
+def test_digest_is_unambiguous():
+    assert digest("ab", "c") != digest("a", "bc")
+    assert digest(b"x") == digest("x")
+
+
+def test_get_put_and_lru_prune(tmp_path):
+    cache = StageCache(str(tmp_path / "c"))
+    assert cache.get(digest("missing")) is None
+    keys = [digest(str(i)) for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, (["line"] * 100, {"n": i}))
+        path = cache._path(key)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    assert cache.get(keys[2]) == (["line"] * 100, {"n": 2})
+
+    # keys[2] 刚被读过，最久未用的 keys[0]、keys[1] 先被淘汰
+    one = os.path.getsize(cache._path(keys[0]))
+    removed, freed = cache.prune(2 * one)
+    assert removed == 2 and freed == 2 * one
+    assert cache.get(keys[0]) is None and cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None and cache.get(keys[3]) is not None
+
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    cache = StageCache(str(tmp_path))
+    key = digest("k")
+    cache.put(key, [1, 2])
+    with open(cache._path(key), "wb") as f:
+        f.write(b"\x80")
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
@@ -0,0 +1,63 @@
+import random
+import re
+
+import pytest
+
+from utils.text_rules import TextCleaner
+
+
+def _advanced(raw):
+    """filter_text_advanced.py 原逻辑"""
+    s = raw.rstrip('\n').lstrip()
+    if not s.strip() or not re.match(r'^[A-Za-z0-9\u4e00-\u9fff]', s) or re.match(r'^[A-Za-z0-9-]+:', s):
+        return False
+    code = [r'<[^>]+>', r'\b(function|var|let|const|class)\b', r'[{}();=+\[\]\/\\]',
+            r'\b(import|export)\s', r'//|/\*|\*/']
+    if any(re.search(p, s) for p in code):
+        return False
+    return len(re.findall(r'\b[A-Za-z\u4e00-\u9fff]{4,}\b', s)) >= 2
+
+
+def _pretrain(raw):
+    """data/clean_pretrain.py 原逻辑"""
+    line = raw.strip()
+    if not line or re.match(r'^[0-9]', line):
+        return False
+    if re.match(r'^[A-Z][A-Za-z0-9]+(?: [A-Z][A-Za-z0-9]+){2,}$', line):
+        return False
+    if any(kw in line for kw in ['import ', 'def ', 'function ', '<script', '#include', 'printf', 'console.log']):
+        return False
+    if re.search(r'\d{2,5}(?:-\d{2,5})?', line) or re.search(r'\d{3,4}[- ]?\d{7,8}', line):
+        return False
+    if not 5 <= len(line.split()) <= 200:
+        return False
+    lower = line.lower()
+    return 'detected behavior' not in lower and 'user-agent' not in lower
+
+
+PIECES = ["hello", "World", "Title", "Case", "Here", "数据处理", "中文句子测试", "function", "var", "x=1",
+          "<b>", "import", "export ", "//", "*/", "12", "3", "-", "user-agent", "Detected Behavior", "def ",
+          "printf", "#include", "Header-Name:", "\t", "!", "１２", "İ", "words", "sentence", "class", "{"]
+
+
+@pytest.mark.parametrize("rulesets", [("advanced",), ("pretrain",), ("advanced", "pretrain")])
+def test_fused_rules_match_original_scripts(rulesets):
+    rng = random.Random(0)
+    lines = [" ".join(rng.choice(PIECES) for _ in range(rng.randint(0, 12))) + rng.choice(["", " ", "\t"]) + "\n"
+             for _ in range(20000)]
+    cleaner = TextCleaner(rulesets)
+    got = list(cleaner.clean_lines(lines))
+    # 只有 advanced 时与原 filter_text_advanced.py 一样保留行尾空白
+    strip = (lambda ln: ln.rstrip("\n").lstrip()) if rulesets == ("advanced",) else str.strip
+    expected = [strip(ln) for ln in lines
+                if ("advanced" not in rulesets or _advanced(ln)) and ("pretrain" not in rulesets or _pretrain(ln))]
+    assert got == expected
+    assert cleaner.stats["kept"] == len(got)
+    assert sum(cleaner.stats.values()) == len(lines)
+
+
+def test_advanced_only_keeps_trailing_whitespace():
+    lines = ["  plain english words here again \t\n", "  plain english words here again\n"]
+    assert list(TextCleaner(("advanced",)).clean_lines(lines)) == ["plain english words here again \t",
+                                                                   "plain english words here again"]
+    assert list(TextCleaner().clean_lines(lines)) == ["plain english words here again"] * 2
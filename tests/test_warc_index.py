@@ -0,0 +1,62 @@
+import gzip
+import io
+import os
+
+import pytest
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+from utils.warc_index import WarcIndex, index_path, iter_range_records
+
+
+def _write_warc(path, n):
+    with open(path, "wb") as f:
+        w = WARCWriter(f, gzip=True)
+        for i in range(n):
+            body = f"<p>page {i} " + "x" * (i * 37 % 500) + "</p>"
+            headers = StatusAndHeaders("200 OK", [("Content-Type", "text/html")], protocol="HTTP/1.0")
+            w.write_record(w.create_warc_record(f"http://example.com/{i}", "response",
+                                                payload=io.BytesIO(body.encode()), http_headers=headers))
+        w.write_record(w.create_warc_record("http://example.com/wet", "conversion",
+                                            payload=io.BytesIO("纯文本".encode())))
+
+
+def test_build_load_and_ranges(tmp_path):
+    path = str(tmp_path / "a.warc.gz")
+    _write_warc(path, 50)
+    idx = WarcIndex.open(path)
+    assert os.path.exists(index_path(path))
+    assert len(idx) == 51 and not idx.meta["truncated"]
+    assert idx.uri(0) == "http://example.com/0" and idx.uri(50) == "http://example.com/wet"
+    assert idx.rec_type(3) == "response" and idx.rec_type(50) == "conversion"
+    assert int(idx.offsets[0]) == 0 and int(idx.offsets[-1]) + int(idx.lengths[-1]) == os.path.getsize(path)
+
+    loaded = WarcIndex.load(path)
+    assert (loaded.offsets == idx.offsets).all() and loaded.uri(17) == idx.uri(17)
+    for i, j in idx.batches(7):
+        recs = list(iter_range_records(path, *idx.byte_range(i, j)))
+        assert [r.rec_headers.get_header("WARC-Target-URI") for r in recs] == [idx.uri(k) for k in range(i, j)]
+        assert [int(r.rec_headers.get_header("Content-Length")) for r in recs] == idx.clens[i:j].tolist()
+
+    # 源文件改动后索引失效
+    with open(path, "ab") as f:
+        f.write(gzip.compress(b"WARC/1.0\r\nWARC-Type: metadata\r\nContent-Length: 0\r\n\r\n\r\n\r\n"))
+    assert WarcIndex.load(path) is None
+    assert len(WarcIndex.open(path)) == 52
+
+
+def test_truncated_and_single_member(tmp_path):
+    path = str(tmp_path / "b.warc.gz")
+    _write_warc(path, 10)
+    full = WarcIndex.build(path, save=False)
+    with open(path, "r+b") as f:
+        f.truncate(int(full.offsets[-1]) + 5)
+    idx = WarcIndex.build(path, save=False)
+    assert idx.meta["truncated"] and len(idx) == 10
+
+    # 整个文件压成一个 member 时无法随机访问
+    single = str(tmp_path / "single.warc.gz")
+    with gzip.open(single, "wb") as f:
+        f.write(b"WARC/1.0\r\nWARC-Type: metadata\r\nContent-Length: 0\r\n\r\n\r\n\r\n" * 2)
+    with pytest.raises(ValueError):
+        WarcIndex.build(single, save=False)
@@ -0,0 +1,38 @@
+import gzip
+import io
+
+import pytest
+from warcio.archiveiterator import ArchiveIterator
+from warcio.warcwriter import WARCWriter
+
+from utils import wet
+
+
+def _wet_bytes(bodies):
+    buf = io.BytesIO()
+    w = WARCWriter(buf, gzip=True)
+    w.write_record(w.create_warcinfo_record("x.wet.gz", {"software": "test"}))
+    for i, body in enumerate(bodies):
+        w.write_record(w.create_warc_record(
+            f"http://example.com/{i}", "conversion", payload=io.BytesIO(body.encode("utf-8")),
+            warc_headers_dict={"WARC-Identified-Content-Language": "eng"}))
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("read_bytes", [1 << 22, 64, 5])
+def test_matches_warcio(monkeypatch, read_bytes):
+    bodies = ["hello\nworld", "", "WARC/1.0\r\n\r\nnot a header", "中文正文\n" * 50, "x" * 3000]
+    data = _wet_bytes(bodies)
+    monkeypatch.setattr(wet, "READ_BYTES", read_bytes)
+    got = list(wet.iter_wet_records(gzip.GzipFile(fileobj=io.BytesIO(data))))
+    ref = [(r.rec_headers.get_header("WARC-Target-URI"), r.content_stream().read())
+           for r in ArchiveIterator(io.BytesIO(data)) if r.rec_type == "conversion"]
+    assert [(r.uri, r.payload) for r in got] == ref
+    assert [r.payload.decode("utf-8") for r in got] == bodies
+    assert all(r.lang == "eng" and r.record_id.startswith("<urn:uuid:") for r in got)
+
+
+def test_truncated_record():
+    raw = gzip.decompress(_wet_bytes(["some text here"]))
+    with pytest.raises(EOFError):
+        list(wet.iter_wet_records(io.BytesIO(raw[:-8])))
@@ -0,0 +1,99 @@
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sys
+
+import pytest
+from warcio.warcwriter import WARCWriter
+
+from test_async_download import FILES, RangeHandler, server  # noqa: F401  本地 Range 服务及其 fixture
+
+_spec = importlib.util.spec_from_file_location(
+    "wet_pipeline", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 "scripts", "data", "wet_pipeline.py"))
+wet_pipeline = importlib.util.module_from_spec(_spec)
+# 进程池按模块名 pickle 任务函数
+sys.modules["wet_pipeline"] = wet_pipeline
+_spec.loader.exec_module(wet_pipeline)
+
+
+def _wet_gz(records):
+    buf = io.BytesIO()
+    w = WARCWriter(buf, gzip=True)
+    w.write_record(w.create_warcinfo_record("x.wet.gz", {"software": "test"}))
+    for i, (lang, body) in enumerate(records):
+        w.write_record(w.create_warc_record(
+            f"http://example.com/{i}", "conversion", payload=io.BytesIO(body.encode("utf-8")),
+            warc_headers_dict={"WARC-Identified-Content-Language": lang}))
+    return buf.getvalue()
+
+
+A = _wet_gz([("eng", "english one"), ("deu,eng", "deutsch"), ("eng,zho", "english two\n")])
+B = _wet_gz([("eng", "b text")])
+# 完整下载、但解压到一半出错
+CORRUPT = A[:len(A) // 2] + b"\x00" * 64
+
+
+def _manifest(out_dir):
+    with open(os.path.join(out_dir, wet_pipeline.MANIFEST_NAME), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_process_wet_removes_tmp_shard_on_error(tmp_path):
+    src = tmp_path / "c.warc.wet.gz"
+    src.write_bytes(CORRUPT)
+    shard = str(tmp_path / "c.txt")
+    with pytest.raises(Exception):
+        wet_pipeline.process_wet(str(src), shard, {"eng"})
+    assert list(tmp_path.iterdir()) == [src]
+
+
+def test_run_manifest_and_retry_only_failed(server, tmp_path, monkeypatch):  # noqa: F811
+    monkeypatch.setitem(FILES, "/cc/a.warc.wet.gz", A)
+    monkeypatch.setitem(FILES, "/cc/b.warc.wet.gz", B)
+    monkeypatch.setitem(FILES, "/cc/c.warc.wet.gz", CORRUPT)
+    paths = tmp_path / "wet.paths"
+    paths.write_text("".join(f"cc/{n}.warc.wet.gz\n" for n in "abcd"))
+    wet_dir, out_dir = tmp_path / "wet", tmp_path / "shards"
+    config = tmp_path / "cfg.json"
+    config.write_text(json.dumps({"wet_paths": str(paths), "cache_dir": str(wet_dir),
+                                  "mined_dir": str(out_dir), "lang_whitelist": ["en"]}))
+    argv = ["--config", str(config), "--base_url", server + "/", "-w", "2", "-r", "1", "--max_pending", "1"]
+
+    assert wet_pipeline.main(argv, timeout=5, backoff=0.01) == 2
+    # --config 的 lang_whitelist（ISO 639-1）按 WET 头的首选语言过滤
+    assert (out_dir / "a.txt").read_text() == "english one\nenglish two\n"
+    assert (out_dir / "b.txt").read_text() == "b text\n"
+    entries = {e["path"]: e for e in _manifest(out_dir)}
+    assert entries["cc/a.warc.wet.gz"]["status"] == "done" and entries["cc/a.warc.wet.gz"]["kept"] == 2
+    assert entries["cc/c.warc.wet.gz"]["status"] == "failed" and entries["cc/c.warc.wet.gz"]["stage"] == "parse"
+    assert entries["cc/d.warc.wet.gz"]["status"] == "failed" and entries["cc/d.warc.wet.gz"]["stage"] == "download"
+    # 解析失败：删掉下载的文件、不留临时分片
+    assert not (wet_dir / "c.warc.wet.gz").exists()
+    assert sorted(p.name for p in out_dir.iterdir()) == ["a.txt", "b.txt", wet_pipeline.MANIFEST_NAME]
+
+    # 崩溃时写了一半的行在下次打开时被丢弃，清单压缩为每个路径一条
+    with open(out_dir / wet_pipeline.MANIFEST_NAME, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entries["cc/a.warc.wet.gz"]) + "\n" + '{"path": "cc/a.wa')
+    monkeypatch.setitem(FILES, "/cc/c.warc.wet.gz", _wet_gz([("eng", "c text")]))
+    monkeypatch.setitem(FILES, "/cc/d.warc.wet.gz", B)
+    a_mtime = os.stat(out_dir / "a.txt").st_mtime_ns
+    RangeHandler.requests.clear()
+    assert wet_pipeline.main(argv, timeout=5, backoff=0.01) == 0
+    assert sorted(RangeHandler.requests) == ["/cc/c.warc.wet.gz", "/cc/d.warc.wet.gz"]
+    assert os.stat(out_dir / "a.txt").st_mtime_ns == a_mtime
+    assert (out_dir / "c.txt").read_text() == "c text\n"
+    # 打开时压缩成 4 条，本次又追加了 c、d 两条
+    entries = _manifest(out_dir)
+    assert len(entries) == 4 + 2
+    assert sorted(e["path"] for e in entries[4:]) == ["cc/c.warc.wet.gz", "cc/d.warc.wet.gz"]
+    assert sorted(e["path"] for e in entries[:4]) == [f"cc/{n}.warc.wet.gz" for n in "abcd"]
+    assert all(e["status"] == "done" for e in entries[4:])
+
+    # 分片丢失：重新解析（本地 WET 仍在，不再下载）
+    (out_dir / "b.txt").unlink()
+    RangeHandler.requests.clear()
+    assert wet_pipeline.main(argv, timeout=5, backoff=0.01) == 0
+    assert RangeHandler.requests == [] and (out_dir / "b.txt").read_text() == "b text\n"
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+基于 asyncio 的并发下载器（只用标准库）。
+
+- 并发数由信号量限制，每个文件一条连接（Connection: close）；
+- 未完成的文件以 <目标>.part 保存，重试或重跑时用 Range 请求从已有字节处续传；
+- 完成后校验大小（Content-Length / Content-Range 的总长，以及可选的期望大小）
+  和可选的摘要（md5 / sha1 / sha256），通过后才 rename 为目标文件；
+- download_files 在后台线程里跑事件循环，每完成一个文件就交给调用方，
+  调用方解压 / 解析已完成文件的同时，其余文件仍在下载。
+"""
+import asyncio
+import hashlib
+import os
+import queue
+import ssl
+import threading
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit
+
+READ_BYTES = 1 << 20
+MAX_REDIRECTS = 5
+USER_AGENT = "ai-data-downloader/1.0"
+
+# status: "done"（本次下载完成）/ "exists"（目标文件已存在且校验通过）/ "failed"
+DownloadResult = namedtuple("DownloadResult", ["url", "path", "status", "size", "error"])
+# digest: None 或 (算法名, 十六进制摘要)
+DownloadJob = namedtuple("DownloadJob", ["url", "path", "size", "digest"], defaults=(None, None))
+
+DIGEST_BY_LENGTH = {32: "md5", 40: "sha1", 64: "sha256"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, reason=""):
+        super().__init__(f"HTTP {status} {reason}".strip())
+        self.status = status
+
+
+class VerifyError(Exception):
+    pass
+
+
+class MalformedResponse(ValueError):
+    """状态行或响应头无法解析"""
+
+
+def parse_digest(hexdigest: str):
+    """按长度推断算法：32 → md5，40 → sha1，64 → sha256"""
+    hexdigest = hexdigest.strip().lower()
+    algo = DIGEST_BY_LENGTH.get(len(hexdigest))
+    if algo is None:
+        raise ValueError(f"cannot infer digest algorithm from {hexdigest!r}")
+    return algo, hexdigest
+
+
+def file_digest(path: str, algo: str) -> str:
+    h = hashlib.new(algo)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def verify_file(path: str, size=None, digest=None):
+    """大小与摘要（若给出）都相符时返回 True"""
+    if size is not None and os.path.getsize(path) != size:
+        return False
+    if digest is not None and file_digest(path, digest[0]) != digest[1]:
+        return False
+    return True
+
+
+async def _open(url, headers, timeout):
+    """发出 GET 请求，返回 (状态码, 小写响应头, reader, writer)"""
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    ctx = ssl.create_default_context() if secure else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ctx,
+                                server_hostname=parts.hostname if secure else None), timeout)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+    lines = [f"GET {target} HTTP/1.1", f"Host: {host}", f"User-Agent: {USER_AGENT}",
+             "Accept-Encoding: identity", "Connection: close"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    parts = status_line.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+        raise MalformedResponse(f"bad status line {status_line[:80]!r}")
+    status = int(parts[1])
+    resp = {}
+    for line in header_lines:
+        name, sep, value = line.partition(":")
+        if sep:
+            resp[name.strip().lower()] = value.strip()
+    return status, resp, reader, writer
+
+
+async def _iter_body(reader, headers, timeout):
+    """按 chunked / Content-Length / 读到连接关闭三种方式产出响应体数据块"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await asyncio.wait_for(reader.readuntil(b"\r\n"), timeout)
+            size = int(size_line.split(b";")[0], 16)
+            if size == 0:
+                return
+            remaining = size
+            while remaining:
+                chunk = await asyncio.wait_for(reader.read(min(remaining, READ_BYTES)), timeout)
+                if not chunk:
+                    raise ConnectionError("connection closed inside a chunk")
+                remaining -= len(chunk)
+                yield chunk
+            await asyncio.wait_for(reader.readexactly(2), timeout)
+    remaining = int(headers["content-length"]) if "content-length" in headers else None
+    while remaining is None or remaining > 0:
+        chunk = await asyncio.wait_for(reader.read(READ_BYTES if remaining is None else min(remaining, READ_BYTES)),
+                                       timeout)
+        if not chunk:
+            if remaining:
+                raise ConnectionError(f"connection closed with {remaining} bytes missing")
+            return
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def _content_range_total(value):
+    """'bytes 100-199/1000' 或 'bytes */1000' → (起点或 None, 总长或 None)"""
+    unit, _, spec = value.partition(" ")
+    rng, _, total = spec.partition("/")
+    start = None if rng == "*" else int(rng.split("-")[0])
+    return start, None if total in ("", "*") else int(total)
+
+
+async def _fetch_once(job, timeout):
+    """一次尝试：从 .part 已有字节续传，完成并校验后 rename；返回文件大小"""
+    part = job.path + ".part"
+    have = os.path.getsize(part) if os.path.exists(part) else 0
+    url = job.url
+    for _ in range(MAX_REDIRECTS + 1):
+        headers = {"Range": f"bytes={have}-"} if have else {}
+        status, resp, reader, writer = await _open(url, headers, timeout)
+        try:
+            if status in (301, 302, 303, 307, 308) and "location" in resp:
+                url = urljoin(url, resp["location"])
+                continue
+            if status == 416 and have:
+                # 已有字节数不小于文件大小：正好相等说明上次已下完，否则 .part 有问题，从头再来
+                _, total = _content_range_total(resp.get("content-range", ""))
+                if total != have:
+                    os.remove(part)
+                    raise VerifyError(f"partial file larger than remote ({have} > {total})")
+                break
+            if status == 206:
+                start, total = _content_range_total(resp.get("content-range", ""))
+                if start != have:
+                    raise VerifyError(f"server resumed at {start}, expected {have}")
+                mode = "ab"
+            elif status == 200:
+                # 服务器不支持 Range：整个文件重新下载
+                have, mode = 0, "wb"
+                total = int(resp["content-length"]) if "content-length" in resp else None
+            else:
+                raise HTTPError(status)
+            with open(part, mode) as f:
+                async for chunk in _iter_body(reader, resp, timeout):
+                    f.write(chunk)
+            break
+        finally:
+            writer.close()
+    else:
+        raise HTTPError(310, "too many redirects")
+
+    size = os.path.getsize(part)
+    if total is not None and size != total:
+        raise ConnectionError(f"got {size} of {total} bytes")
+    if job.size is not None and size != job.size:
+        os.remove(part)
+        raise VerifyError(f"size {size} != expected {job.size}")
+    if job.digest is not None:
+        got = file_digest(part, job.digest[0])
+        if got != job.digest[1]:
+            os.remove(part)
+            raise VerifyError(f"{job.digest[0]} {got} != expected {job.digest[1]}")
+    os.replace(part, job.path)
+    return size
+
+
+async def fetch(job: DownloadJob, retries: int = 3, timeout: float = 60, backoff: float = 1.0) -> DownloadResult:
+    """下载单个文件；网络错误与 5xx 按指数退避重试（保留 .part 续传），4xx 不重试"""
+    if os.path.exists(job.path) and verify_file(job.path, job.size, job.digest):
+        return DownloadResult(job.url, job.path, "exists", os.path.getsize(job.path), None)
+    os.makedirs(os.path.dirname(job.path) or ".", exist_ok=True)
+    error = None
+    for attempt in range(retries + 1):
+        try:
+            size = await _fetch_once(job, timeout)
+            return DownloadResult(job.url, job.path, "done", size, None)
+        except HTTPError as e:
+            error = e
+            if 400 <= e.status < 500 and e.status not in (408, 429):
+                break
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                VerifyError, ValueError) as e:
+            error = e
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** attempt)
+    return DownloadResult(job.url, job.path, "failed", None, f"{type(error).__name__}: {error}")
+
+
+async def download_all(jobs, concurrency: int = 8, on_result=None, gate=None, **kwargs):
+    """
+    并发下载全部 jobs（同时最多 concurrency 个），每完成一个调用 on_result(result)；返回结果列表（与 jobs 同序）。
+    gate: 可选的 threading.Semaphore，每个文件开始下载前获取一个名额，由调用方处理完该结果后 release，
+    用来限制「已下载、尚未处理」的文件数。
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(job):
+        async with sem:
+            if gate is not None:
+                await asyncio.to_thread(gate.acquire)
+            result = await fetch(job, **kwargs)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*(one(job) for job in jobs))
+
+
+def download_files(jobs, concurrency: int = 8, **kwargs):
+    """
+    同步接口：在后台线程里运行 download_all，按完成顺序产出 DownloadResult。
+    调用方处理已完成文件（解压、解析）时，其余下载在后台继续进行；
+    传入 gate 时每个产出的结果占一个名额，调用方处理完后须 gate.release()。
+    """
+    results = queue.Queue()
+    done = object()
+
+    def run():
+        try:
+            asyncio.run(download_all(list(jobs), concurrency, results.put, **kwargs))
+        except BaseException as e:
+            results.put(e)
+        results.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
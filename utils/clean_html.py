@@ -1,19 +1,117 @@
-from bs4 import BeautifulSoup
+"""
+HTML → 纯文本。
+
+基于 lxml 的解析器 target 接口：libxml2 边解析边回调 start / end / data，
+不构建任何树；script、style、noscript 子树内的文本直接丢弃。
+与原先 BeautifulSoup 的 get_text(separator=...) 一样，不同文本节点（以标签为界）之间
+以空白分隔，最后一次性把连续空白合并为单个空格。
+
+输入可以是 str 或 bytes；bytes 按 BOM → HTTP Content-Type → <meta> 声明 → UTF-8
+的顺序确定编码，都没有且不是合法 UTF-8 时按 windows-1252 解码。
+"""
+import codecs
 import re
 
-def clean_html(raw: str) -> str:
+from lxml import etree
+
+SKIP_TAGS = frozenset(("script", "style", "noscript"))
+
+# <meta charset="..."> 与 <meta http-equiv="Content-Type" content="...; charset=...">
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9._:-]+)""", re.I)
+_HEADER_CHARSET = re.compile(r"""charset\s*=\s*["']?\s*([A-Za-z0-9._:-]+)""", re.I)
+# 只在文档开头找 <meta> 声明（HTML 规范要求声明位于前 1024 字节内，这里放宽一些）
+SNIFF_BYTES = 4096
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+# 按 WHATWG 编码标准，这些标签实际都按 windows-1252 解码
+_WINDOWS_1252 = {"ascii", "us-ascii", "latin1", "latin-1", "iso-8859-1", "iso8859-1", "l1"}
+
+
+def _codec(label):
+    if not label:
+        return None
+    label = label.strip().lower()
+    if label in _WINDOWS_1252:
+        return "cp1252"
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+
+def sniff_encoding(data: bytes, content_type: str = None):
+    """返回 (编码名, 是否为声明的编码)；未声明时返回 ("utf-8", False)"""
+    for bom, name in _BOMS:
+        if data.startswith(bom):
+            return name, True
+    if content_type:
+        m = _HEADER_CHARSET.search(content_type)
+        name = _codec(m and m.group(1))
+        if name:
+            return name, True
+    m = _META_CHARSET.search(data[:SNIFF_BYTES])
+    name = _codec(m and m.group(1).decode("ascii"))
+    # 页面已被解码成字节流后 <meta> 声明 UTF-16 不可能属实，按 UTF-8 处理
+    if name and not name.startswith("utf-16"):
+        return name, True
+    return "utf-8", False
+
+
+def decode_html(data, content_type: str = None) -> str:
+    if not isinstance(data, (bytes, bytearray)):
+        return data
+    data = bytes(data)
+    name, declared = sniff_encoding(data, content_type)
+    if not declared:
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            name = "cp1252"
+    return data.decode(name, errors="replace")
+
+
+class _TextTarget:
+    """lxml 解析器 target：收集不在 SKIP_TAGS 内的文本，标签处插入分隔空格"""
+
+    def __init__(self):
+        self.parts = []
+        self.skip = 0
+
+    def start(self, tag, attrib):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        self.parts.append(" ")
+
+    def end(self, tag):
+        if tag in SKIP_TAGS and self.skip:
+            self.skip -= 1
+        self.parts.append(" ")
+
+    def data(self, text):
+        if not self.skip:
+            self.parts.append(text)
+
+    def close(self):
+        return " ".join("".join(self.parts).split())
+
+
+def clean_html(raw, content_type: str = None) -> str:
     """
     去除 HTML 中的脚本、样式、noscript 等标签，提取纯文本，
-    并合并多余空白为单个空格。
+    并合并多余空白为单个空格。raw 可为 str 或 bytes（bytes 时可传入 HTTP Content-Type 辅助判断编码）。
     """
-    soup = BeautifulSoup(raw, "html.parser")
-    # 移除脚本和样式等
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    # 提取文本
-    text = soup.get_text(separator="\n")
-    # 合并空白
-    return re.sub(r"\s+", " ", text).strip()
+    text = decode_html(raw, content_type)
+    if not text:
+        return ""
+    target = _TextTarget()
+    parser = etree.HTMLParser(target=target, remove_comments=True, remove_pis=True,
+                              no_network=True, recover=True)
+    try:
+        parser.feed(text)
+        return parser.close()
+    except (etree.ParserError, etree.XMLSyntaxError, ValueError):
+        # 文档被截断或不可解析：保留已回调出的文本
+        return target.close()
+
 
 # 本地简单测试
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+URL 列表抓取：线程池 + requests，供 scripts/data/download_texts.py 的 URL 模式使用。
+
+- 每个工作线程一个 requests.Session（连接池），同一主机的请求复用 TCP / TLS 连接；
+- crawl 按需从上游拉取 URL，最多 max_inflight 个在途，不再一次为整个列表创建 future；
+- HostLimiter 限制每个主机的同时请求数和请求速率，重试等待期间不占用主机名额；
+- 连接错误、超时、408 / 429 / 5xx 按指数退避（带随机抖动）重试，尊重 Retry-After；
+  其余 4xx 直接失败。
+"""
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "ai-data-crawler/1.0"
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+# HostLimiter 跟踪的主机数达到该值（之后为上次清理后的两倍）时清理空闲主机
+SWEEP_MIN_HOSTS = 1024
+
+# status 为最后一次响应的状态码（连接失败时为 None）；error 为 None 表示成功
+FetchResult = namedtuple("FetchResult", ["url", "status", "content", "headers", "error"])
+
+
+class HostLimiter:
+    """
+    每个主机同时至多 max_conns 个请求；rate > 0 时相邻请求的开始时间至少相隔 1 / rate 秒。
+    主机状态只在有请求使用或限速间隔未过时保留：最后一个请求结束时若间隔已过立即删除，
+    其余空闲主机在跟踪的主机数翻倍时统一清理，长时间抓取大量主机时内存不随主机数增长。
+    """
+
+    def __init__(self, max_conns: int = 4, rate: float = 0.0):
+        self.max_conns = max_conns
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        # 主机 → [信号量, 使用中与等待中的请求数, 下一个请求最早的开始时间]
+        self._hosts = {}
+        self._sweep_at = SWEEP_MIN_HOSTS
+
+    def __len__(self):
+        """当前跟踪的主机数"""
+        return len(self._hosts)
+
+    def _sweep(self, now):
+        for host in [h for h, (_, users, nxt) in self._hosts.items() if users == 0 and nxt <= now]:
+            del self._hosts[host]
+        self._sweep_at = max(SWEEP_MIN_HOSTS, 2 * len(self._hosts))
+
+    @contextmanager
+    def slot(self, host: str):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                if len(self._hosts) >= self._sweep_at:
+                    self._sweep(time.monotonic())
+                state = self._hosts[host] = [threading.BoundedSemaphore(self.max_conns), 0, 0.0]
+            state[1] += 1
+        try:
+            with state[0]:
+                if self.interval:
+                    with self._lock:
+                        now = time.monotonic()
+                        start = max(now, state[2])
+                        state[2] = start + self.interval
+                    if start > now:
+                        time.sleep(start - now)
+                yield
+        finally:
+            with self._lock:
+                state[1] -= 1
+                if state[1] == 0 and state[2] <= time.monotonic():
+                    del self._hosts[host]
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after=None) -> float:
+    """第 attempt 次（从 0 计）重试前的等待秒数：base × 2^attempt 的一半到全部之间随机，不超过 cap"""
+    if retry_after is not None:
+        return min(cap, retry_after)
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _retry_after(headers):
+    value = headers.get("Retry-After", "")
+    return float(value) if value.strip().isdigit() else None
+
+
+class Crawler:
+    def __init__(self, per_host: int = 4, host_rate: float = 0.0, retries: int = 3, timeout: float = 10,
+                 backoff: float = 0.5, max_backoff: float = 30.0, pool_size: int = 32):
+        """
+        per_host / host_rate: 每个主机的并发上限与每秒请求数（0 为不限）
+        retries: 首次请求失败后的最大重试次数
+        pool_size: 每个 Session 缓存连接池的主机数，以及每个主机保留的连接数
+        """
+        self.limiter = HostLimiter(per_host, host_rate)
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._local = threading.local()
+
+    def session(self) -> requests.Session:
+        """当前线程的 Session（首次调用时创建）"""
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["User-Agent"] = USER_AGENT
+            self._local.session = s
+        return s
+
+    def fetch(self, url: str, headers=None) -> FetchResult:
+        host = urlsplit(url).netloc
+        status, error = None, None
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                with self.limiter.slot(host):
+                    r = self.session().get(url, headers=headers, timeout=self.timeout)
+                    content = r.content
+                status = r.status_code
+                if status < 400:
+                    return FetchResult(url, status, content, r.headers, None)
+                error = f"HTTP {status}"
+                if status not in RETRY_STATUS:
+                    break
+                retry_after = _retry_after(r.headers)
+            except requests.RequestException as e:
+                status, error = None, f"{type(e).__name__}: {e}"
+            if attempt < self.retries:
+                time.sleep(backoff_delay(attempt, self.backoff, self.max_backoff, retry_after))
+        return FetchResult(url, status, b"", {}, error)
+
+
+def crawl(fn, urls, workers: int, max_inflight: int = 0):
+    """
+    用 workers 个线程对 urls 中的每一项调用 fn，按完成顺序产出 (url, 结果)。
+    上游迭代器按需拉取，最多 max_inflight（默认 workers × 4）个任务在途。
+    """
+    max_inflight = max_inflight or workers * 4
+    urls = iter(urls)
+    with ThreadPoolExecutor(max_workers=workers) as exe:
+        pending = {}
+        for url in urls:
+            pending[exe.submit(fn, url)] = url
+            if len(pending) >= max_inflight:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield pending.pop(fut), fut.result()
+            for url in urls:
+                pending[exe.submit(fn, url)] = url
+                if len(pending) >= max_inflight:
+                    break
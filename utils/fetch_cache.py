@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+按 URL 缓存的抓取结果，供 scripts/data/download_texts.py 的 URL 模式重跑时复用。
+
+每个 URL 一个条目（存储与 LRU 淘汰复用 utils.stage_cache.StageCache，key 为 URL 的摘要），
+内容包括原始响应体、Content-Type、ETag / Last-Modified、抓取时间和抽取出的文本：
+- 条目未过期（抓取后不到 ttl 秒）：直接返回缓存的文本，不发请求也不再清洗；
+- 已过期且有校验器：带 If-None-Match / If-Modified-Since 条件请求，
+  304 时沿用缓存的文本并刷新抓取时间，200 时按新响应重新清洗并覆盖；
+- 抽取代码（utils/clean_html.py）变化后，缓存的文本作废，用缓存的原始响应体重新抽取，不重新下载。
+失败的请求不写缓存。
+"""
+import threading
+import time
+
+from utils.stage_cache import StageCache, code_digest, digest
+
+# 条目里 text 对应的抽取代码版本
+EXTRACTOR_CODE = ["utils/clean_html.py"]
+
+
+class FetchCache:
+    """
+    - root: 缓存目录
+    - max_bytes: 大小上限，None 表示不限；运行中每新写入约 max_bytes / 8 字节按 LRU 淘汰一次
+    - ttl: 条目在多少秒内视为新鲜、无需重新验证
+    """
+
+    def __init__(self, root: str, max_bytes: int = None, ttl: float = 7 * 86400):
+        self.store = StageCache(root, max_bytes)
+        self.ttl = ttl
+        self.extractor = code_digest(EXTRACTOR_CODE)
+        self._lock = threading.Lock()
+        self._written = 0
+        self.stats = {"hit": 0, "revalidated": 0, "reextracted": 0, "miss": 0}
+
+    @staticmethod
+    def key(url: str) -> str:
+        return digest("url", url)
+
+    def get(self, url: str):
+        entry = self.store.get(self.key(url))
+        return entry if entry is not None and entry["url"] == url else None
+
+    def put(self, url: str, entry: dict):
+        self.store.put(self.key(url), entry)
+        if self.store.max_bytes is None:
+            return
+        with self._lock:
+            self._written += len(entry["body"]) + len(entry["text"])
+            if self._written < self.store.max_bytes // 8:
+                return
+            self._written = 0
+        self.store.prune()
+
+    def prune(self):
+        return self.store.prune()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def fetch_text(self, crawler, url: str, extract) -> str:
+        """
+        经缓存抓取 url 并返回 extract(body, content_type) 的结果；失败时返回空字符串。
+        crawler 为 utils.crawler.Crawler。
+        """
+        entry = self.get(url)
+        headers = {}
+        if entry is not None:
+            if time.time() - entry["fetched"] < self.ttl:
+                return self._text(url, entry, extract, "hit")
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        res = crawler.fetch(url, headers or None)
+        if res.error is not None:
+            return ""
+        if res.status == 304 and entry is not None:
+            entry["fetched"] = time.time()
+            return self._text(url, entry, extract, "revalidated", save=True)
+        self._count("miss")
+        ctype = res.headers.get("Content-Type")
+        text = extract(res.content, ctype)
+        self.put(url, {"url": url, "body": res.content, "content_type": ctype,
+                       "etag": res.headers.get("ETag"), "last_modified": res.headers.get("Last-Modified"),
+                       "fetched": time.time(), "extractor": self.extractor, "text": text})
+        return text
+
+    def _text(self, url, entry, extract, kind, save=False):
+        if entry["extractor"] != self.extractor:
+            kind, save = "reextracted", True
+            entry["text"] = extract(entry["body"], entry["content_type"])
+            entry["extractor"] = self.extractor
+        self._count(kind)
+        if save:
+            self.put(url, entry)
+        return entry["text"]
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+精确去重用的紧凑指纹存储。
+
+Python set 存整行或 32 位十六进制 MD5 字符串，每条记录要 100+ 字节；这里只保存
+64/128 位 blake2b 指纹（uint64 或 16 字节定长 numpy 数组），每条 8/16 字节。
+
+ExactDeduper 在内存预算内完全在线工作：每批记录立即给出“首次出现”的结果。
+超过预算后切换到外存模式：已有指纹冻结为过滤器，之后的候选记录顺序写入 spool 文件，
+(指纹, 序号) 按预算切成有序 run 落盘；finish() 对所有 run 做分块多路归并，
+把每个指纹最早的序号记到位图里，再顺序回读 spool 输出。输出顺序与输入顺序一致。
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# 一次归并从每个 run 读取的条目数
+MERGE_BLOCK = 1 << 16
+
+
+def fp_dtype(bits: int):
+    if bits == 64:
+        return np.dtype("<u8")
+    if bits == 128:
+        # 定长字节串按 memcmp 排序，配合大端摘要即为数值顺序
+        return np.dtype("V16")
+    raise ValueError(f"bits must be 64 or 128, got {bits}")
+
+
+def fingerprints(texts, bits: int = 64) -> np.ndarray:
+    """一批文本的 blake2b 指纹"""
+    size = bits // 8
+    raw = b"".join(hashlib.blake2b(t.encode("utf-8"), digest_size=size).digest() for t in texts)
+    return np.frombuffer(raw, dtype=fp_dtype(bits))
+
+
+class SortedKeySet:
+    """
+    若干有序数组组成的集合；新段按二进制计数器方式与前一段合并，段数保持 O(log n)。
+    支持 uint64 与定长字节串 dtype。
+    """
+
+    def __init__(self):
+        self.segments = []
+
+    def __len__(self):
+        return sum(len(a) for a in self.segments)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.segments)
+
+    def contains(self, q: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(q), dtype=bool)
+        for arr in self.segments:
+            pos = np.searchsorted(arr, q)
+            hit |= arr[np.minimum(pos, len(arr) - 1)] == q
+        return hit
+
+    def add(self, keys: np.ndarray):
+        if len(keys) == 0:
+            return
+        self.segments.append(np.sort(keys))
+        while len(self.segments) > 1 and len(self.segments[-2]) <= 2 * len(self.segments[-1]):
+            b = self.segments.pop()
+            a = self.segments.pop()
+            self.segments.append(np.sort(np.concatenate([a, b])))
+
+
+def first_occurrence(fps: np.ndarray, seen: SortedKeySet) -> np.ndarray:
+    """批内首次出现且不在 seen 中的掩码"""
+    keep = np.zeros(len(fps), dtype=bool)
+    _, first = np.unique(fps, return_index=True)
+    keep[first] = True
+    keep &= ~seen.contains(fps)
+    return keep
+
+
+class ExactDeduper:
+    """
+    - memory_budget: 指纹占用的内存上限（字节），一半给在线集合，一半给外存模式的 run 缓冲
+    - bits: 指纹位数，64 或 128
+    - tmp_dir: 外存模式下 spool / run / 位图文件所在目录的父目录
+    记录中不能含换行符（外存模式按行 spool）。
+    """
+
+    def __init__(self, memory_budget: int = 1 << 30, bits: int = 64, tmp_dir=None):
+        self.bits = bits
+        self.memory_budget = memory_budget
+        self.tmp_dir = tmp_dir
+        self.seen = SortedKeySet()
+        self.n_in = 0
+        self.n_out = 0
+        self._work = None
+        self._spool = None
+        self._n_spooled = 0
+        # spool 开头由 seed() 登记、已经输出过的记录数，finish() 时不再产出
+        self._n_seeded = 0
+        self._buf_fps = []
+        self._buf_seq = []
+        self._buf_bytes = 0
+        self._runs = []
+
+    @property
+    def external(self):
+        return self._work is not None
+
+    def feed(self, texts, fps=None) -> list:
+        """
+        送入一批记录，返回其中可以立即输出的记录（按输入顺序）。
+        fps 为已算好的指纹（如在子进程中用 fingerprints(texts, bits) 计算），缺省时在此计算。
+        """
+        texts = list(texts)
+        self.n_in += len(texts)
+        if not texts:
+            return []
+        if fps is None:
+            fps = fingerprints(texts, self.bits)
+        if self.external:
+            self._spill_candidates(texts, fps)
+            return []
+
+        keep = first_occurrence(fps, self.seen)
+        self.seen.add(fps[keep])
+        out = [t for t, k in zip(texts, keep) if k]
+        self.n_out += len(out)
+        if self.seen.nbytes > self.memory_budget // 2:
+            self._start_external()
+        return out
+
+    def seed(self, texts, fps=None):
+        """
+        把已经输出过的记录登记为已见、不再产出（续跑时用已有输出重建状态），计入 n_out。
+        须在任何 feed() 之前调用；可分批多次调用，中途转入外存模式也不会重复产出。
+        """
+        if self._n_spooled != self._n_seeded:
+            raise RuntimeError("seed() must be called before feed()")
+        if not self.external:
+            self.feed(texts, fps)
+            return
+        before = self._n_spooled
+        self.feed(texts, fps)
+        self._n_seeded = self._n_spooled
+        self.n_out += self._n_spooled - before
+
+    def _start_external(self):
+        self._work = tempfile.mkdtemp(prefix="exact_dedup_", dir=self.tmp_dir)
+        self._spool = open(os.path.join(self._work, "spool.txt"), "w",
+                           encoding="utf-8", newline="\n")
+
+    def _spill_candidates(self, texts, fps):
+        # 与冻结集合碰撞的一定是重复，直接丢弃；其余写入 spool 并记录 (指纹, 序号)
+        cand = ~self.seen.contains(fps)
+        seq0 = self._n_spooled
+        for t, c in zip(texts, cand):
+            if c:
+                if "\n" in t:
+                    raise ValueError("ExactDeduper records must not contain newlines")
+                self._spool.write(t + "\n")
+        n = int(cand.sum())
+        self._n_spooled += n
+        self._buf_fps.append(fps[cand])
+        self._buf_seq.append(np.arange(seq0, seq0 + n, dtype=np.uint64))
+        self._buf_bytes += n * (fps.itemsize + 8)
+        if self._buf_bytes > self.memory_budget // 2:
+            self._flush_run()
+
+    def _flush_run(self):
+        if not self._buf_bytes:
+            return
+        fps = np.concatenate(self._buf_fps)
+        seq = np.concatenate(self._buf_seq)
+        # run 内先去重：同一指纹只保留最早序号
+        uniq, first = np.unique(fps, return_index=True)
+        base = os.path.join(self._work, f"run-{len(self._runs):05d}")
+        np.save(base + ".fp.npy", uniq)
+        np.save(base + ".seq.npy", seq[first])
+        self._runs.append(base)
+        self._buf_fps, self._buf_seq, self._buf_bytes = [], [], 0
+
+    def finish(self):
+        """产出外存模式下剩余的待输出记录（在线模式下为空），并清理临时文件"""
+        if not self.external:
+            return
+        try:
+            self._flush_run()
+            self._spool.close()
+            bitmap = self._merge_runs()
+            with open(self._spool.name, "r", encoding="utf-8", newline="\n") as f:
+                for i, line in enumerate(f):
+                    if i % MERGE_BLOCK == 0:
+                        bits = np.unpackbits(bitmap[i >> 3:(i + MERGE_BLOCK) >> 3], bitorder="little")
+                    if bits[i % MERGE_BLOCK] and i >= self._n_seeded:
+                        self.n_out += 1
+                        yield line.rstrip("\n")
+        finally:
+            shutil.rmtree(self._work, ignore_errors=True)
+            self._work = None
+
+    def _merge_runs(self):
+        """分块多路归并所有 run，返回 spool 序号的保留位图（memmap）"""
+        bitmap = np.memmap(os.path.join(self._work, "keep.bits"), dtype=np.uint8,
+                           mode="w+", shape=(max(1, (self._n_spooled + 7) // 8),))
+        runs = [(np.load(b + ".fp.npy", mmap_mode="r"), np.load(b + ".seq.npy", mmap_mode="r"))
+                for b in self._runs]
+        pos = [0] * len(runs)
+        while True:
+            active = [k for k, (fp, _) in enumerate(runs) if pos[k] < len(fp)]
+            if not active:
+                break
+            # 本轮上界：各 run 当前块末尾的最小值；所有 run 中 ≤ 上界的条目本轮一次处理完
+            lasts = np.array([runs[k][0][min(pos[k] + MERGE_BLOCK, len(runs[k][0])) - 1]
+                              for k in active], dtype=runs[active[0]][0].dtype)
+            bound = np.sort(lasts)[0]
+            fps, seqs = [], []
+            for k in active:
+                fp, seq = runs[k]
+                end = pos[k] + int(np.searchsorted(fp[pos[k]:], bound, side="right"))
+                fps.append(np.asarray(fp[pos[k]:end]))
+                seqs.append(np.asarray(seq[pos[k]:end]))
+                pos[k] = end
+            uniq, inv = np.unique(np.concatenate(fps), return_inverse=True)
+            kept = np.full(len(uniq), np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(kept, inv, np.concatenate(seqs).astype(np.int64))
+            np.bitwise_or.at(bitmap, kept >> 3, (1 << (kept & 7)).astype(np.uint8))
+        return bitmap
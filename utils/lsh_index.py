@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+追加式磁盘 LSH 分桶索引。
+
+与 MinHashLSH 相同的 (b, r) 分带方式，但每个文档只保存 b 个 64 位分带哈希：
+- 自上次 flush 以来插入的条目放在内存表（每个 band 一个 set）里；
+- flush() 把内存表排序后写成一个新的段文件 seg-XXXXXX.npy（形状 (b, n)，每行有序），
+  已有段文件从不改写，因此一次 checkpoint 只写入新增条目；
+- 查询时段文件以 mmap 方式打开，按批 searchsorted，索引无需整体装入内存。
+
+索引只回答“是否存在候选重复”，不保存文档 key；这正是流式去重所需的全部信息。
+段列表由调用方随 checkpoint 一起持久化（见 state()/open()），保证索引与进度一致。
+"""
+import json
+import os
+
+import numpy as np
+from datasketch.lsh import _optimal_param
+
+from utils.minhash import _fmix64
+
+# 段数超过该值时合并为一个段，控制查询时需要扫描的文件数
+DEFAULT_MAX_SEGMENTS = 32
+
+_BAND_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def lsh_bands(threshold: float, num_perm: int):
+    """与 MinHashLSH 默认权重相同的 (b, r) 选择"""
+    return _optimal_param(threshold, num_perm, 0.5, 0.5)
+
+
+def band_keys(sigs: np.ndarray, b: int, r: int) -> np.ndarray:
+    """(n, num_perm) 签名 → (n, b) 分带哈希；第 j 列是签名第 j*r:(j+1)*r 位的 64 位摘要"""
+    sigs = np.asarray(sigs, dtype=np.uint64)
+    keys = np.empty((len(sigs), b), dtype=np.uint64)
+    for j in range(b):
+        h = np.full(len(sigs), j, dtype=np.uint64)
+        for col in sigs[:, j * r:(j + 1) * r].T:
+            h = _fmix64(h * _BAND_MULT + col)
+        keys[:, j] = h
+    return keys
+
+
+class DiskLSHIndex:
+    """
+    - path: 段文件目录
+    - threshold / num_perm: 含义同 MinHashLSH，用于推导 (b, r)
+    - segments: 已提交的段文件名列表（从 checkpoint 恢复时传入）
+    """
+
+    def __init__(self, path: str, threshold: float = 0.8, num_perm: int = 128,
+                 segments=None, max_segments: int = DEFAULT_MAX_SEGMENTS,
+                 bands=None):
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.max_segments = max_segments
+        if bands is None:
+            bands = lsh_bands(threshold, num_perm)
+        self.b, self.r = bands
+        os.makedirs(path, exist_ok=True)
+        self.segments = list(segments or [])
+        self._arrays = [self._load(name) for name in self.segments]
+        self._mem = [set() for _ in range(self.b)]
+        self._next_id = self._scan_next_id()
+        self._gc()
+
+    @classmethod
+    def open(cls, path: str, state: dict, **kwargs):
+        """按 state() 保存的参数与段列表重新打开索引（只 mmap，不读入数据）"""
+        return cls(path, threshold=state["threshold"], num_perm=state["num_perm"],
+                   segments=state["segments"], bands=(state["b"], state["r"]), **kwargs)
+
+    def state(self) -> dict:
+        return {"threshold": self.threshold, "num_perm": self.num_perm,
+                "b": self.b, "r": self.r, "segments": list(self.segments)}
+
+    def __len__(self):
+        return sum(a.shape[1] for a in self._arrays) + len(self._mem[0])
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name), mmap_mode="r")
+
+    def _scan_next_id(self):
+        ids = [int(f[4:10]) for f in os.listdir(self.path)
+               if f.startswith("seg-") and f.endswith(".npy")]
+        return max(ids, default=0) + 1
+
+    def _gc(self):
+        """删除未被已提交段列表引用的文件（崩溃残留、合并前的旧段）"""
+        live = set(self.segments)
+        for f in os.listdir(self.path):
+            if f.startswith("seg-") and f not in live:
+                os.remove(os.path.join(self.path, f))
+
+    def band_keys(self, sigs: np.ndarray) -> np.ndarray:
+        """(n, num_perm) 签名 → (n, b) 分带哈希"""
+        sigs = np.asarray(sigs, dtype=np.uint64)
+        if sigs.ndim != 2 or sigs.shape[1] != self.num_perm:
+            raise ValueError(f"Expecting signatures of shape (n, {self.num_perm}), got {sigs.shape}")
+        return band_keys(sigs, self.b, self.r)
+
+    def _hits_on_disk(self, keys: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(keys), dtype=bool)
+        for arr in self._arrays:
+            for j in range(self.b):
+                band = arr[j]
+                if len(band) == 0:
+                    continue
+                pos = np.searchsorted(band, keys[:, j])
+                hit |= band[np.minimum(pos, len(band) - 1)] == keys[:, j]
+        return hit
+
+    def query_batch(self, sigs: np.ndarray) -> np.ndarray:
+        """返回布尔数组：每行签名是否与索引中已有条目在任一 band 上碰撞"""
+        keys = self.band_keys(sigs)
+        hit = self._hits_on_disk(keys)
+        for i, row in enumerate(keys.tolist()):
+            if not hit[i]:
+                hit[i] = any(k in mem for k, mem in zip(row, self._mem))
+        return hit
+
+    def insert_unique(self, sigs: np.ndarray) -> np.ndarray:
+        """
+        按顺序“先到先得”：与索引或本批更早保留的行碰撞的行视为重复，
+        其余行插入内存表。返回布尔数组，True 表示该行被保留。
+        """
+        keys = self.band_keys(sigs)
+        keep = ~self._hits_on_disk(keys)
+        for i, row in enumerate(keys.tolist()):
+            if not keep[i]:
+                continue
+            if any(k in mem for k, mem in zip(row, self._mem)):
+                keep[i] = False
+                continue
+            for k, mem in zip(row, self._mem):
+                mem.add(k)
+        return keep
+
+    def flush(self):
+        """
+        把内存表写成新段文件并返回其文件名（无新增条目时返回 None）。
+        调用方应随后把 state() 写入 checkpoint；旧段文件在下一次 flush 时才删除，
+        以免 checkpoint 尚未落盘时就丢失其引用的数据。
+        """
+        self._gc()
+        if not self._mem[0]:
+            return None
+        arr = np.empty((self.b, len(self._mem[0])), dtype=np.uint64)
+        for j, mem in enumerate(self._mem):
+            arr[j] = np.fromiter(mem, dtype=np.uint64, count=len(mem))
+        arr.sort(axis=1)
+        name = self._write(arr)
+        self.segments.append(name)
+        self._arrays.append(self._load(name))
+        self._mem = [set() for _ in range(self.b)]
+        if len(self.segments) > self.max_segments:
+            self.compact()
+        return name
+
+    def compact(self):
+        """把所有段合并为一个新段（旧文件留待下次 flush/打开时回收）"""
+        if len(self.segments) <= 1:
+            return
+        merged = np.concatenate([np.asarray(a) for a in self._arrays], axis=1)
+        merged.sort(axis=1)
+        name = self._write(merged)
+        self.segments = [name]
+        self._arrays = [self._load(name)]
+
+    def _write(self, arr):
+        name = f"seg-{self._next_id:06d}.npy"
+        self._next_id += 1
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, name))
+        return name
+
+
+def write_json_atomic(path: str, obj):
+    """先写临时文件再 rename，避免 checkpoint 写到一半时崩溃留下损坏的 JSON"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+按 band 分片的多进程 LSH 去重。
+
+MinHashLSH 的 query/insert 是单线程的，签名计算加速后它就成了瓶颈。这里把 b 个 band
+轮流分给若干常驻分片进程，每个进程只持有自己那几个 band 的索引（有序 uint64 数组）：
+
+1. 主进程把一批行的分带哈希 (n, b) 按列发给各分片；
+2. 各分片并行返回：哪些行与已保留的历史条目碰撞，以及本批内部同桶的分组；
+3. 主进程按输入顺序合并，得到与顺序执行 `if not lsh.query(m): lsh.insert(...)`
+   完全相同的“先到先得”结果，再把保留掩码发回各分片写入索引。
+
+只有本批内部确有同桶冲突的行需要在主进程里逐行判定，其余全部向量化。
+"""
+import multiprocessing as mp
+
+import numpy as np
+
+from utils.fingerprint import SortedKeySet
+
+
+def batch_groups(col: np.ndarray):
+    """
+    单个 band 内的批内分桶。返回 (idx, rep)：所有落在非单元素桶里的行号，
+    以及该桶中最早的行号（作为桶的代表）。
+    """
+    n = len(col)
+    order = np.argsort(col, kind="stable")
+    s = col[order]
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    gid = np.repeat(np.arange(len(starts)), sizes)
+    shared = sizes[gid] > 1
+    return order[shared], order[starts][gid][shared]
+
+
+def resolve_first_occurrence(n: int, hit: np.ndarray, groups) -> np.ndarray:
+    """
+    合并各 band 的结果。
+    - hit: 与历史已保留条目碰撞的行（必然丢弃）
+    - groups: [(band, idx, rep), ...]，见 batch_groups
+    返回保留掩码，语义等同于按顺序逐行 query/insert。
+    """
+    conflicted = np.zeros(n, dtype=bool)
+    for _, idx, rep in groups:
+        conflicted[idx[rep < idx]] = True
+    keep = ~hit & ~conflicted
+    todo = np.flatnonzero(~hit & conflicted)
+    if len(todo) == 0:
+        return keep
+
+    # 批内无冲突的保留行一定是其所在各桶的第一个成员，先把这些桶标记为“已有保留”
+    marked = set()
+    in_todo = np.zeros(n, dtype=bool)
+    in_todo[todo] = True
+    buckets = {int(i): [] for i in todo}
+    for band, idx, rep in groups:
+        kept_rep = keep[idx]
+        marked.update((band, int(r)) for r in rep[kept_rep])
+        sel = in_todo[idx]
+        for i, r in zip(idx[sel].tolist(), rep[sel].tolist()):
+            buckets[i].append((band, r))
+
+    for i in todo.tolist():
+        bk = buckets[i]
+        if any(b in marked for b in bk):
+            continue
+        keep[i] = True
+        marked.update(bk)
+    return keep
+
+
+class BandIndex:
+    """若干 band 的有序键索引：先 query 一批分带哈希，再按保留掩码 insert 同一批"""
+
+    def __init__(self, n_bands: int):
+        self.index = [SortedKeySet() for _ in range(n_bands)]
+        self._last = None
+
+    def query(self, keys: np.ndarray):
+        """返回 (hit, groups)：与已有条目的碰撞掩码，以及每个 band 的 batch_groups"""
+        self._last = keys
+        hit = np.zeros(len(keys), dtype=bool)
+        groups = []
+        for j, idx in enumerate(self.index):
+            hit |= idx.contains(keys[:, j])
+            groups.append(batch_groups(keys[:, j]))
+        return hit, groups
+
+    def insert(self, keep: np.ndarray):
+        for j, idx in enumerate(self.index):
+            idx.add(np.unique(self._last[keep, j]))
+        self._last = None
+
+
+class LocalLSH:
+    """单进程版本，接口与 ShardedLSH 相同；适合签名已算好、只剩 LSH 的场景"""
+
+    def __init__(self, bands: int):
+        self.bands = bands
+        self._index = BandIndex(bands)
+
+    def insert_unique(self, keys: np.ndarray) -> np.ndarray:
+        hit, groups = self._index.query(keys)
+        keep = resolve_first_occurrence(
+            len(keys), hit, [(band, idx, rep) for band, (idx, rep) in enumerate(groups)])
+        self._index.insert(keep)
+        return keep
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _shard_main(conn, n_bands):
+    index = BandIndex(n_bands)
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        op, payload = msg
+        if op == "query":
+            conn.send(index.query(payload))
+        elif op == "insert":
+            index.insert(payload)
+    conn.close()
+
+
+class ShardedLSH:
+    """
+    - bands: LSH 的 band 数 b（分带哈希由调用方计算，见 utils.lsh_index.band_keys）
+    - shards: 分片进程数，超过 b 时按 b 计
+    """
+
+    def __init__(self, bands: int, shards: int):
+        shards = max(1, min(shards, bands))
+        self.bands = bands
+        self.shard_bands = [list(range(s, bands, shards)) for s in range(shards)]
+        ctx = mp.get_context()
+        self._conns = []
+        self._procs = []
+        for owned in self.shard_bands:
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_shard_main, args=(child, len(owned)), daemon=True)
+            p.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(p)
+
+    def insert_unique(self, keys: np.ndarray) -> np.ndarray:
+        """keys: (n, b) 分带哈希。返回保留掩码，并把保留行写入各分片索引"""
+        for conn, owned in zip(self._conns, self.shard_bands):
+            conn.send(("query", np.ascontiguousarray(keys[:, owned])))
+        hit = np.zeros(len(keys), dtype=bool)
+        groups = []
+        for conn, owned in zip(self._conns, self.shard_bands):
+            shard_hit, shard_groups = conn.recv()
+            hit |= shard_hit
+            groups.extend((band, idx, rep) for band, (idx, rep) in zip(owned, shard_groups))
+        keep = resolve_first_occurrence(len(keys), hit, groups)
+        for conn in self._conns:
+            conn.send(("insert", keep))
+        return keep
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for p in self._procs:
+            p.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
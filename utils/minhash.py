@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+NumPy 向量化 MinHash 签名引擎。
+
+原实现对每个字符 shingle 调用一次 MinHash.update()（SHA1 + 一次 num_perm 维运算），
+Python 循环是大语料去重的主要开销。这里一次性把整行（或整批行）的所有 shingle
+用滚动多项式哈希 + fmix64 求出 32 位哈希，再以矩阵运算完成全部 num_perm 个置换和
+按行取最小值。
+
+置换参数与 datasketch 的 legacy 方案（datasketch < 2.0 的默认实现）完全一致，
+因此签名可直接包装成 LeanMinHash 交给 MinHashLSH，也能和同 seed 的签名比较
+Jaccard；但 shingle 哈希函数不同（不是 SHA1），不要与 datasketch 逐条 update
+得到的签名混入同一个索引。
+"""
+import numpy as np
+from datasketch import LeanMinHash
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MERSENNE_SHIFT = np.uint64(61)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# 滚动哈希的基数（FNV-1 64 位素数，奇数保证乘法在 mod 2^64 下可逆）
+_BASE = np.uint64(0x100000001B3)
+_FMIX_C1 = np.uint64(0xFF51AFD7ED558CCD)
+_FMIX_C2 = np.uint64(0xC4CEB9FE1A85EC53)
+_SHIFT = np.uint64(33)
+
+# 每块最多处理的 shingle 数，限制 (块大小 × num_perm) 中间矩阵的内存
+DEFAULT_BLOCK_SIZE = 1 << 14
+
+
+def _fmix64(h: np.ndarray) -> np.ndarray:
+    """MurmurHash3 的 64 位终结混合，把滚动哈希打散到全部比特位。"""
+    h = h ^ (h >> _SHIFT)
+    h = h * _FMIX_C1
+    h = h ^ (h >> _SHIFT)
+    h = h * _FMIX_C2
+    return h ^ (h >> _SHIFT)
+
+
+def to_lean_minhash(hashvalues, seed: int = 1) -> LeanMinHash:
+    """把一行签名包装成 MinHashLSH 可直接 insert/query 的 LeanMinHash。"""
+    try:
+        return LeanMinHash(seed=seed, hashvalues=hashvalues, scheme="legacy")
+    except TypeError:
+        # datasketch < 2.0 没有 scheme 参数，本身就是 legacy 方案
+        return LeanMinHash(seed=seed, hashvalues=hashvalues)
+
+
+class MinHashEngine:
+    """
+    批量计算字符 shingle 的 MinHash 签名。
+    - num_perm: 置换个数，需与 MinHashLSH 的 num_perm 一致
+    - k_shingle: shingle 长度（字符）
+    - seed: 置换参数的随机种子，与 datasketch 的 seed 含义相同
+    - block_size: 每次矩阵运算最多处理的 shingle 数
+    """
+
+    def __init__(self, num_perm: int = 128, k_shingle: int = 5, seed: int = 1,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        self.num_perm = num_perm
+        self.k_shingle = k_shingle
+        self.seed = seed
+        self.block_size = block_size
+        # 与 datasketch legacy 方案相同的置换参数生成方式
+        gen = np.random.RandomState(seed)
+        self.a, self.b = np.array(
+            [(gen.randint(1, _MERSENNE_PRIME, dtype=np.uint64),
+              gen.randint(0, _MERSENNE_PRIME, dtype=np.uint64))
+             for _ in range(num_perm)],
+            dtype=np.uint64,
+        ).T
+
+    def _window_hashes(self, codepoints: np.ndarray) -> np.ndarray:
+        """对码点数组的每个长度为 k 的窗口求 32 位哈希（跨行窗口由调用方剔除）。"""
+        n = len(codepoints) - self.k_shingle + 1
+        if n <= 0:
+            return np.empty(0, dtype=np.uint64)
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(self.k_shingle):
+            h = h * _BASE + codepoints[j:j + n]
+        return _fmix64(h) & _MAX_HASH
+
+    def _permute(self, hv: np.ndarray) -> np.ndarray:
+        """(n,) 哈希 → (n, num_perm) 置换结果，公式同 datasketch legacy。"""
+        phv = hv[:, None] * self.a
+        phv += self.b
+        # x mod (2^61 - 1) = (x & p) + (x >> 61)，再做一次条件减法；原地运算比 % 快
+        high = phv >> _MERSENNE_SHIFT
+        phv &= _MERSENNE_PRIME
+        phv += high
+        phv[phv >= _MERSENNE_PRIME] -= _MERSENNE_PRIME
+        phv &= _MAX_HASH
+        return phv
+
+    def signatures(self, texts) -> np.ndarray:
+        """
+        计算一批文本的签名，返回形状为 (len(texts), num_perm) 的 uint64 数组。
+        短于 k_shingle 的文本没有 shingle，签名为全 _MAX_HASH（与空 MinHash 相同）。
+        """
+        texts = list(texts)
+        k = self.k_shingle
+        out = np.full((len(texts), self.num_perm), _MAX_HASH, dtype=np.uint64)
+        if not texts:
+            return out
+
+        # 1. 所有行拼成一个码点数组，一次求全部窗口哈希
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        codepoints = np.frombuffer(
+            "".join(texts).encode("utf-32-le", errors="surrogatepass"), dtype="<u4"
+        ).astype(np.uint64)
+        window = self._window_hashes(codepoints)
+
+        # 2. 剔除跨行窗口，使每行的 shingle 在 hv 中连续存放
+        counts = np.maximum(lengths - k + 1, 0)
+        total = int(counts.sum())
+        if total == 0:
+            return out
+        line_starts = np.cumsum(lengths) - lengths
+        seg_starts = np.cumsum(counts) - counts
+        hv = window[np.arange(total) + np.repeat(line_starts - seg_starts, counts)]
+
+        # 3. 分块置换 + 按行分段取最小值
+        nz = np.flatnonzero(counts)
+        seg_lo = seg_starts[nz]
+        seg_hi = seg_lo + counts[nz]
+        for r0 in range(0, total, self.block_size):
+            r1 = min(r0 + self.block_size, total)
+            lo = np.searchsorted(seg_hi, r0, side="right")
+            hi = np.searchsorted(seg_lo, r1, side="left")
+            rows = nz[lo:hi]
+            local = np.maximum(seg_lo[lo:hi], r0) - r0
+            mins = np.minimum.reduceat(self._permute(hv[r0:r1]), local, axis=0)
+            out[rows] = np.minimum(out[rows], mins)
+        return out
+
+    def signature(self, text: str) -> np.ndarray:
+        """单行签名，形状 (num_perm,)。"""
+        return self.signatures([text])[0]
+
+    def minhash(self, text: str) -> LeanMinHash:
+        """单行签名包装为 LeanMinHash。"""
+        return to_lean_minhash(self.signature(text), self.seed)
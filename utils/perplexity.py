@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+因果语言模型的困惑度打分引擎，compute_ppl.py、scripts/eval_ppl.py、scripts/validate_perplexity.py 共用。
+
+- 输入按窗口（默认 4096 行）读入并分词，窗口内按 token 数排序后分批，同一批长度相近，padding 最少；
+  结果仍按输入顺序产出，内存只与窗口大小有关；
+- 分批方式二选一：每批固定 batch_size 条，或 token 预算模式（每批「条数 × 最长长度」≤ max_tokens）；
+- 每条序列的 NLL 由 logits 逐 token 计算，只统计真实 token 的预测（掩码来自序列长度，
+  与 pad_token_id 是否等于 eos 无关），返回 (NLL 之和, 预测 token 数)，
+  总体困惑度 = exp(ΣNLL / Σtoken)，按 token 精确加权；
+- 长文本可用滑动窗口打分（stride）：窗口长 max_length、每次前进 stride，每个 token 恰好被预测一次、
+  至少带 max_length - stride 个 token 的上文，得到整篇文档的精确困惑度而不只是前缀；
+  默认逐窗口重算，各窗口与短行一起按长度分批；
+  kv_cache=True 时（仅限旋转位置编码 RoPE 的模型）改为复用上一步的 past_key_values
+  （裁到 max_length - stride），每步只前向 stride 个新 token。这是近似：第一层之后的缓存
+  是在被裁掉的 token 仍可见时算出的，其信息会带进后面的窗口，结果与逐窗口重算略有出入，
+  不能与精确结果直接比较；
+- 只依赖 torch + transformers，CPU 上用 gpt2 等小模型即可运行。
+"""
+import math
+
+import torch
+import torch.nn.functional as F
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+# 一次读入、排序的行数
+SORT_WINDOW = 4096
+
+
+def load_lm(model_path: str, device=None, trust_remote_code: bool = False):
+    """加载本地模型，返回 (model, tokenizer, device)；device 默认有 GPU 用 GPU，否则 CPU（float32）"""
+    device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True,
+                                              trust_remote_code=trust_remote_code)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path, local_files_only=True, trust_remote_code=trust_remote_code,
+        torch_dtype=torch.float16 if device.type == "cuda" else torch.float32)
+    model.to(device).eval()
+    return model, tokenizer, device
+
+
+def length_batches(lengths, batch_size: int = 8, max_tokens: int = None):
+    """
+    按长度从长到短排序后分批，返回下标列表的列表。
+    max_tokens 给出时按 token 预算分批（条数 × 批内最长长度 ≤ max_tokens，单条超出预算时独占一批），
+    否则每批 batch_size 条。
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    if not max_tokens:
+        return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    batches, batch = [], []
+    for i in order:
+        # 降序排列，批内最长的是第一条
+        if batch and (len(batch) + 1) * lengths[batch[0]] > max_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+@torch.no_grad()
+def batch_nll(model, seqs, device, skip=None):
+    """
+    seqs: 若干 token id 列表（各自长度 ≥ 2），右侧补齐后一次前向。
+    skip: 每条序列开头只作上文、不计分的预测数（滑动窗口用），默认全计。
+    返回 ([每条的 NLL 之和], [每条计分的预测数 = 长度 - 1 - skip])。
+    """
+    width = max(len(s) for s in seqs)
+    ids = torch.zeros((len(seqs), width), dtype=torch.long)
+    mask = torch.zeros((len(seqs), width), dtype=torch.long)
+    target_mask = torch.zeros((len(seqs), width - 1))
+    for row, s in enumerate(seqs):
+        ids[row, :len(s)] = torch.tensor(s, dtype=torch.long)
+        mask[row, :len(s)] = 1
+        target_mask[row, skip[row] if skip else 0:len(s) - 1] = 1
+    ids, mask, target_mask = ids.to(device), mask.to(device), target_mask.to(device)
+    logits = model(input_ids=ids, attention_mask=mask).logits[:, :-1]
+    # 位置 t 的 logits 预测 t + 1 的 token；目标为 padding 或上文的位置不计
+    nll = F.cross_entropy(logits.float().transpose(1, 2), ids[:, 1:], reduction="none")
+    return (nll * target_mask).sum(dim=1).tolist(), target_mask.sum(dim=1).long().tolist()
+
+
+def sliding_windows(n: int, max_length: int, stride: int):
+    """
+    长度 n 的序列的滑动窗口：[(begin, end, skip), ...]，窗口为 [begin, end)，
+    窗口内前 skip 个预测只作上文。除第 0 个 token 外每个 token 恰好计分一次。
+    """
+    if not 0 < stride < max_length:
+        # stride = max_length 时窗口首个 token 没有上文，既不能计分也不能被上一窗口预测
+        raise ValueError(f"stride must be in (0, max_length), got {stride}")
+    windows, prev_end = [], 0
+    for begin in range(0, n, stride):
+        end = min(begin + max_length, n)
+        windows.append((begin, end, max(prev_end, begin + 1) - (begin + 1)))
+        prev_end = end
+        if end == n:
+            break
+    return windows
+
+
+def rotary_positions(model) -> bool:
+    """模型是否使用旋转位置编码（位置不受绝对位置表长度限制，裁剪后的 KV 缓存可以接着用）"""
+    cfg = model.config
+    return any(getattr(cfg, k, None) is not None for k in ("rope_theta", "rope_parameters", "rotary_dim"))
+
+
+def _crop_past(past, keep: int):
+    """只保留 KV 缓存中最后 keep 个位置；兼容 tuple 格式和 transformers 各版本的 Cache 对象"""
+    if hasattr(past, "layers"):
+        for layer in past.layers:
+            layer.keys, layer.values = layer.keys[..., -keep:, :], layer.values[..., -keep:, :]
+        return past
+    if hasattr(past, "key_cache"):
+        for i in range(len(past.key_cache)):
+            past.key_cache[i] = past.key_cache[i][..., -keep:, :]
+            past.value_cache[i] = past.value_cache[i][..., -keep:, :]
+        return past
+    return tuple((k[..., -keep:, :], v[..., -keep:, :]) for k, v in past)
+
+
+@torch.no_grad()
+def cached_sliding_nll(model, seq, device, max_length: int, stride: int):
+    """
+    与 sliding_windows 相同的窗口划分，但第一个窗口之后每步只前向 stride 个新 token，
+    上文取自裁剪到 max_length - stride 的 past_key_values（position_ids 用绝对位置）。
+    近似结果：缓存的上文在更早的窗口里算出，带有已被裁掉的 token 的信息，与逐窗口重算不完全相同。
+    返回 (NLL 之和, 预测数 = len(seq) - 1)。
+    """
+    ids = torch.tensor(seq, dtype=torch.long, device=device).unsqueeze(0)
+    out = model(input_ids=ids[:, :max_length], use_cache=True)
+    logits = out.logits[0].float()
+    nll = F.cross_entropy(logits[:-1], ids[0, 1:max_length], reduction="sum").item()
+    last, past = logits[-1:], out.past_key_values
+    for start in range(max_length, len(seq), stride):
+        end = min(start + stride, len(seq))
+        past = _crop_past(past, max_length - stride)
+        out = model(input_ids=ids[:, start:end], past_key_values=past, use_cache=True,
+                    position_ids=torch.arange(start, end, device=device).unsqueeze(0))
+        logits = out.logits[0].float()
+        # 块内第一个 token 由上一步最后一个位置的 logits 预测
+        nll += F.cross_entropy(torch.cat([last, logits[:-1]]), ids[0, start:end], reduction="sum").item()
+        last, past = logits[-1:], out.past_key_values
+    return nll, len(seq) - 1
+
+
+def score_ids(model, seqs, device, batch_size: int = 8, max_tokens: int = None,
+              max_length: int = None, stride: int = None, kv_cache: bool = False):
+    """
+    按长度分批打分，按输入顺序返回 [(NLL 之和, 预测 token 数), ...]；长度 < 2 的序列为 (0.0, 0)。
+    给出 stride 时，长于 max_length 的序列按滑动窗口打分整篇：默认切成窗口与其余序列一起分批精确重算；
+    kv_cache=True 时逐条复用 KV 缓存（近似，见 cached_sliding_nll；只支持旋转位置编码的模型）。
+    """
+    if stride is not None and not 0 < stride < max_length:
+        raise ValueError(f"stride must be in (0, max_length), got {stride}")
+    if kv_cache and not rotary_positions(model):
+        raise ValueError("kv_cache requires a model with rotary position embeddings")
+    out = [(0.0, 0)] * len(seqs)
+    # 打分单元：(所属序列, token ids, 开头只作上文的预测数)
+    units = []
+    for i, s in enumerate(seqs):
+        if len(s) < 2:
+            continue
+        if stride is None or len(s) <= max_length:
+            units.append((i, s, 0))
+        elif kv_cache:
+            out[i] = cached_sliding_nll(model, s, device, max_length, stride)
+        else:
+            units += [(i, s[begin:end], skip) for begin, end, skip in sliding_windows(len(s), max_length, stride)]
+    for batch in length_batches([len(u[1]) for u in units], batch_size, max_tokens):
+        nll, n = batch_nll(model, [units[b][1] for b in batch], device, [units[b][2] for b in batch])
+        for b, a, c in zip(batch, nll, n):
+            i = units[b][0]
+            out[i] = (out[i][0] + a, out[i][1] + c)
+    return out
+
+
+def _windows(lines, size):
+    window = []
+    for line in lines:
+        window.append(line)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def score_lines(model, tokenizer, lines, device, max_length: int = 512, batch_size: int = 8,
+                max_tokens: int = None, window: int = SORT_WINDOW, stride: int = None, kv_cache: bool = False):
+    """
+    对每行文本打分，按输入顺序产出 (行, NLL 之和, 预测 token 数)。
+    stride 为 None 时超过 max_length 的行截断，否则按滑动窗口打分整行（见 score_ids）。
+    lines 可以是惰性迭代器，每次只读入 window 行。
+    """
+    for chunk in _windows(lines, window):
+        if stride is None:
+            seqs = tokenizer(chunk, truncation=True, max_length=max_length)["input_ids"]
+        else:
+            seqs = tokenizer(chunk)["input_ids"]
+        scores = score_ids(model, seqs, device, batch_size, max_tokens, max_length, stride, kv_cache)
+        for line, (nll, n) in zip(chunk, scores):
+            yield line, nll, n
+
+
+def perplexity(nll_sum: float, n_tokens: int) -> float:
+    """exp(平均 NLL)；没有可预测的 token 时为 inf"""
+    return math.exp(nll_sum / n_tokens) if n_tokens else float("inf")
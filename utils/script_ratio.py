@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+向量化的文字系统（script）占比，用作语言识别前的廉价预过滤。
+
+一批行拼成一个 UTF-32 码点数组，查 65536 项的位表得到每个字符属于哪些文字系统，
+再按行 reduceat 求占比；整批只有常数次 numpy 调用，不再逐字符跑 Python 循环。
+除 ascii（与原 looks_english_ascii 完全一致：码点 < 128）外，每种文字都把空白、
+数字和常见标点（含全角 / CJK 标点）算作本文字字符，这样中文句子里的 “，。” 和
+阿拉伯数字不会拉低中文占比。
+"""
+import numpy as np
+
+# 各文字系统都接受的中性字符：ASCII 非字母、通用标点、CJK 符号与标点、全角 ASCII
+_NEUTRAL = [(0x00, 0x40), (0x5B, 0x60), (0x7B, 0x7F), (0x2000, 0x206F),
+            (0x3000, 0x303F), (0xFF00, 0xFF65)]
+_HAN = [(0x2E80, 0x2FDF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0x20000, 0x3FFFF)]
+
+# 文字系统 → 码点区间（闭区间）
+SCRIPTS = {
+    "ascii": [(0x00, 0x7F)],
+    "latin": [(0x00, 0x7F), (0xC0, 0x24F), (0x1E00, 0x1EFF)] + _NEUTRAL,
+    "han": _HAN + _NEUTRAL,
+    "japanese": _HAN + [(0x3040, 0x30FF), (0x31F0, 0x31FF), (0xFF66, 0xFF9F)] + _NEUTRAL,
+    "hangul": [(0x1100, 0x11FF), (0x3130, 0x318F), (0xAC00, 0xD7AF)] + _NEUTRAL,
+    "cyrillic": [(0x400, 0x52F)] + _NEUTRAL,
+    "arabic": [(0x600, 0x6FF), (0x750, 0x77F)] + _NEUTRAL,
+    "devanagari": [(0x900, 0x97F)] + _NEUTRAL,
+}
+
+# fastText 语言标签 → 预过滤使用的文字系统；未列出的语言不做预过滤
+LANG_SCRIPTS = {
+    "en": "ascii",
+    "zh": "han", "wuu": "han", "yue": "han",
+    "ja": "japanese",
+    "ko": "hangul",
+    "ru": "cyrillic", "uk": "cyrillic", "bg": "cyrillic", "sr": "cyrillic",
+    "ar": "arabic", "fa": "arabic", "ur": "arabic",
+    "hi": "devanagari", "mr": "devanagari", "ne": "devanagari",
+    **{lang: "latin" for lang in ("de", "fr", "es", "it", "pt", "nl", "sv", "da", "no",
+                                  "fi", "pl", "cs", "ro", "hu", "tr", "id", "vi")},
+}
+
+_NAMES = list(SCRIPTS)
+_TABLE = np.zeros(0x10000, dtype=np.uint8)
+_ASTRAL = []  # (bit, lo, hi)：BMP 以外的区间
+for _bit, _name in enumerate(_NAMES):
+    for _lo, _hi in SCRIPTS[_name]:
+        if _lo <= 0xFFFF:
+            _TABLE[_lo:min(_hi, 0xFFFF) + 1] |= 1 << _bit
+        if _hi > 0xFFFF:
+            _ASTRAL.append((1 << _bit, max(_lo, 0x10000), _hi))
+
+
+def script_ratios(lines, scripts) -> np.ndarray:
+    """
+    lines: 字符串列表；scripts: SCRIPTS 中的名字列表。
+    返回 (len(lines), len(scripts)) 的 float 数组，空行的占比为 0。
+    """
+    n = len(lines)
+    out = np.zeros((n, len(scripts)))
+    lengths = np.fromiter(map(len, lines), dtype=np.int64, count=n)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return out
+    cp = np.frombuffer("".join(lines).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    bits = _TABLE[np.minimum(cp, 0xFFFF)]
+    astral = np.flatnonzero(cp > 0xFFFF)
+    if len(astral):
+        bits[astral] = 0
+        c = cp[astral]
+        for bit, lo, hi in _ASTRAL:
+            bits[astral[(c >= lo) & (c <= hi)]] |= bit
+    # 各非空行在拼接串中的起点；空行不占位置，跳过它们后 reduceat 的分段恰好是各行
+    starts = (np.cumsum(lengths) - lengths)[nonempty]
+    for j, name in enumerate(scripts):
+        hits = np.add.reduceat((bits & (1 << _NAMES.index(name))) != 0, starts, dtype=np.int64)
+        out[nonempty, j] = hits / lengths[nonempty]
+    return out
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+按换行对齐的字节分片读取器，供所有逐行处理的阶段共用。
+
+- shard_ranges：把大文件切成若干 [start, end) 区间，每个区间从行首开始、在行尾结束；
+- 子进程按区间自行从 mmap 读取数据，进程间只传递 (path, start, end) 三元组，
+  不再由主进程逐行读取再 pickle 行列表；
+- map_shards：最多 max_inflight 个分片同时在途，按分片顺序产出各自的结果，
+  调用方据此按原顺序写出，内存只与在途分片数有关。
+"""
+import io
+import mmap
+import os
+from collections import deque
+from multiprocessing import Pool
+
+# 每个进程里已映射的文件：path → (mmap, 文件大小, mtime)
+_MAPS = {}
+
+
+def _mapped(path):
+    st = os.stat(path)
+    cached = _MAPS.get(path)
+    if cached is not None and cached[1:] == (st.st_size, st.st_mtime_ns):
+        return cached[0]
+    if cached is not None:
+        cached[0].close()
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+    _MAPS[path] = (mm, st.st_size, st.st_mtime_ns)
+    return mm
+
+
+def shard_ranges(path, shard_bytes):
+    """把文件切成按换行对齐的 [start, end) 字节区间"""
+    mm = _mapped(path)
+    size = len(mm)
+    ranges = []
+    start = 0
+    while start < size:
+        end = min(start + shard_bytes, size)
+        if end < size:
+            nl = mm.find(b"\n", end - 1)
+            end = size if nl < 0 else nl + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def read_range(path, start, end):
+    return _mapped(path)[start:end]
+
+
+def range_lines(path, start, end, errors="ignore"):
+    """区间内的文本行，换行处理与文本模式 open 相同（\\r\\n、\\r 都视为换行）"""
+    text = read_range(path, start, end).decode("utf-8", errors=errors)
+    return io.StringIO(text, newline=None)
+
+
+def imap_bounded(pool, fn, args_iter, max_inflight):
+    """
+    按顺序产出 fn(*args) 的结果，最多 max_inflight 个任务同时在途。
+    与 pool.imap 不同，上游迭代器是按需拉取的，可以串接多个阶段形成有界流水线。
+    """
+    pending = deque()
+    for args in args_iter:
+        pending.append(pool.apply_async(fn, args))
+        if len(pending) >= max_inflight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def map_shards(fn, path, shard_bytes, workers, initializer=None, initargs=(), max_inflight=0):
+    """
+    对每个分片调用 fn(path, start, end)，按分片顺序产出 ((start, end), 结果)。
+    fn / initializer 须为模块级函数；workers ≤ 1 时在当前进程内顺序执行，便于调试。
+    """
+    ranges = shard_ranges(path, shard_bytes)
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for start, end in ranges:
+            yield (start, end), fn(path, start, end)
+        return
+
+    with Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        results = imap_bounded(pool, fn, ((path, *rng) for rng in ranges), max_inflight or workers * 2)
+        yield from zip(ranges, results)
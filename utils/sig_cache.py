@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+MinHash 签名缓存。
+
+只调 --threshold 的重跑不应重新计算签名：签名按 (语料, num_perm, shingle_size, 引擎)
+保存一次，之后以 np.memmap 零拷贝打开，按任意阈值的 (b, r) 直接求分带哈希。
+子目录名带语料绝对路径的摘要，多个语料共用一个 --sig_cache 目录时互不覆盖。
+
+目录结构（root 为 --sig_cache 指定的目录）：
+  root/n128-k5-numpy-<路径摘要>/
+    meta.json    语料路径、大小、mtime 与行数；meta.json 存在即表示缓存完整
+    sigs.u64     (n, num_perm) uint64 签名，行优先
+    offsets.i64  (n, 2) int64，每个非空行在输入文件中的 [start, end) 字节区间
+构建时先写同级临时目录，完成后整体 rename，中途崩溃不会留下半个缓存。
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from utils.lsh_index import write_json_atomic
+
+CACHE_VERSION = 1
+
+
+def corpus_stat(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def iter_offset_lines(path: str):
+    """逐行产出 (start, end, text)：text 为 strip 后的非空行，[start, end) 为原始行（不含换行）"""
+    pos = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            start, pos = pos, pos + len(raw)
+            text = raw.decode("utf-8").strip()
+            if text:
+                yield start, start + len(raw.rstrip(b"\r\n")), text
+
+
+def _memmap(path, dtype, shape):
+    if shape[0] == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class SignatureCache:
+    """
+    - root: 缓存根目录，每个 (语料, 参数组合) 各占一个子目录
+    - corpus_path: 语料文件，按其绝对路径区分子目录
+    - num_perm / k_shingle / engine: 签名参数，任一不同即视为不同缓存
+    """
+
+    def __init__(self, root: str, corpus_path: str, num_perm: int, k_shingle: int, engine: str = "numpy"):
+        self.corpus_path = corpus_path
+        self.num_perm = num_perm
+        self.k_shingle = k_shingle
+        self.engine = engine
+        path_digest = hashlib.sha1(os.path.abspath(corpus_path).encode("utf-8")).hexdigest()[:16]
+        self.dir = os.path.join(root, f"n{num_perm}-k{k_shingle}-{engine}-{path_digest}")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+
+    def _meta(self):
+        return {"version": CACHE_VERSION, "corpus": corpus_stat(self.corpus_path),
+                "num_perm": self.num_perm, "k_shingle": self.k_shingle, "engine": self.engine}
+
+    def load(self):
+        """
+        缓存有效时返回 (sigs, offsets) 两个只读 memmap；
+        不存在、参数不符或语料已改动（大小 / mtime 变化）时返回 None。
+        """
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        n = meta.pop("lines")
+        if meta != self._meta():
+            return None
+        sigs = _memmap(os.path.join(self.dir, "sigs.u64"), np.uint64, (n, self.num_perm))
+        offsets = _memmap(os.path.join(self.dir, "offsets.i64"), np.int64, (n, 2))
+        return sigs, offsets
+
+    def writer(self) -> "SignatureWriter":
+        return SignatureWriter(self)
+
+
+class SignatureWriter:
+    """按输入顺序追加签名批次；commit() 后缓存才对 load() 可见"""
+
+    def __init__(self, cache: SignatureCache):
+        self.cache = cache
+        self.n = 0
+        self.tmp_dir = cache.dir + ".tmp"
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self._sigs = open(os.path.join(self.tmp_dir, "sigs.u64"), "wb")
+        self._offsets = open(os.path.join(self.tmp_dir, "offsets.i64"), "wb")
+
+    def append(self, sigs: np.ndarray, offsets):
+        sigs = np.ascontiguousarray(sigs, dtype=np.uint64)
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        if sigs.shape != (len(offsets), self.cache.num_perm):
+            raise ValueError(f"Expecting signatures of shape ({len(offsets)}, {self.cache.num_perm}), "
+                             f"got {sigs.shape}")
+        self._sigs.write(sigs.tobytes())
+        self._offsets.write(offsets.tobytes())
+        self.n += len(offsets)
+
+    def commit(self):
+        for f in (self._sigs, self._offsets):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        meta = self.cache._meta()
+        meta["lines"] = self.n
+        write_json_atomic(os.path.join(self.tmp_dir, "meta.json"), meta)
+        shutil.rmtree(self.cache.dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.cache.dir)
+
+    def abort(self):
+        for f in (self._sigs, self._offsets):
+            f.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
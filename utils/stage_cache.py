@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+按内容寻址的阶段结果缓存。
+
+每个阶段的一批输出以 key 保存，key 由「输入摘要 + 阶段参数 + 阶段代码版本」派生：
+  key_0 = digest(分片的原始字节)
+  key_i = digest(key_{i-1}, 第 i 个阶段的指纹)
+阶段指纹见 stage_fingerprint。上游任何字节、参数或相关源文件变化都会换出一串新 key，
+未变化的前缀阶段直接命中；改一条清洗规则只会让 clean 及其之后的阶段重算。
+
+目录结构：root/<key 前两位>/<key>，每个条目是一个 pickle 文件；
+写入先落临时文件再 rename，多个进程 / 线程并发读写同一目录是安全的。
+命中时刷新条目的 mtime，prune 按 mtime 从旧到新淘汰，直到总大小不超过上限（LRU）。
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+# 条目格式或 key 派生方式变化时递增，旧缓存自然失效
+CACHE_VERSION = 1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def digest(*parts) -> str:
+    """对若干 bytes / str 求 128 位 blake2b 摘要（带长度前缀，拼接方式不会产生歧义）"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def code_digest(paths) -> str:
+    """源文件内容的摘要（路径相对仓库根目录），作为阶段的代码版本"""
+    parts = []
+    for rel in paths:
+        with open(os.path.join(ROOT, rel), "rb") as f:
+            parts += [rel, f.read()]
+    return digest(*parts)
+
+
+def path_stat(path):
+    """模型等外部文件的身份：(大小, mtime)；不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def stage_fingerprint(name: str, params: dict, code_paths, extra=None) -> str:
+    """阶段指纹：阶段名、参数（JSON 规范化）、代码版本，以及 extra（如模型文件的 path_stat）"""
+    return digest(json.dumps({"version": CACHE_VERSION, "stage": name, "params": params,
+                              "code": code_digest(code_paths), "extra": extra},
+                             sort_keys=True, ensure_ascii=False))
+
+
+class StageCache:
+    """
+    - root: 缓存目录
+    - max_bytes: prune() 的默认大小上限，None 表示不限
+    """
+
+    def __init__(self, root: str, max_bytes: int = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str):
+        """命中返回保存的对象并刷新其 LRU 时间，未命中返回 None；损坏的条目会被删除"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def entries(self):
+        """[(mtime_ns, 大小, 路径), ...]，不含写入中的临时文件"""
+        out = []
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                out.append((st.st_mtime_ns, st.st_size, e.path))
+        return out
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self, max_bytes: int = None):
+        """按最近使用时间从旧到新删除条目，直到总大小 ≤ max_bytes；返回 (删除条数, 删除字节数)"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0, 0
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+单遍文本清洗规则引擎，合并 filter_text_advanced.py（advanced）与
+data/clean_pretrain.py（pretrain）两套规则。
+
+每条规则都保持原脚本的语义，所有正则只编译一次，按开销从低到高分级判定，
+第一条命中的规则即为拒绝原因：
+1. 行首字符：两套规则合成一个带命名分组的 match，只看第一个字符
+2. 词数上下限（str.split）
+3. 行首锚定规则：header 样式、目录式标题合成一个 match
+4. 全行搜索规则：逐条独立 search，便宜且选择性高的在前。sre 对多分支交替没有
+   前缀加速，实测把它们合成一个大正则反而比逐条慢 2–3 倍，因此只把纯字面量的
+   关键字表合成一条；以 \b 开头的关键字规则先用字面量正则预筛；
+   爬虫日志按原脚本做 lower() 子串匹配
+5. advanced 的保留条件：至少两个长度 ≥ 4 的中英文单词（找到两个即停）
+"""
+import re
+from collections import Counter
+
+RULESETS = ("advanced", "pretrain")
+
+# clean_pretrain.has_code 的关键字（子串匹配）
+CODE_SNIPPETS = ["import ", "def ", "function ", "<script", "#include", "printf", "console.log"]
+
+# (规则名, 所属规则集, 正则)；同一级合成一个带命名分组的 match
+LEAD_RULES = [
+    ("digit_start", "pretrain", r"[0-9]"),
+    ("lead_char", "advanced", r"[^A-Za-z0-9\u4e00-\u9fff]"),
+]
+ANCHORED_RULES = [
+    ("header", "advanced", r"[A-Za-z0-9-]+:"),
+    ("title", "pretrain", r"[A-Z][A-Za-z0-9]+(?: [A-Z][A-Za-z0-9]+){2,}$"),
+]
+# (规则名, 所属规则集, 正则, 预筛正则)；按顺序逐条 search，预筛不命中则跳过该规则
+SEARCH_RULES = [
+    # 原 [{}();=+\[\]\/\\] 与 //、/*、*/ ——后三者都含 /，已被字符类覆盖
+    ("code_symbol", "advanced", r"[{}();=+\[\]/\\]", None),
+    ("html_tag", "advanced", r"<[^>]+>", None),
+    # 原规则 \d{2,5}(?:-\d{2,5})? 与 \d{3,4}[- ]?\d{7,8}，两者命中当且仅当行内有两个连续数字
+    ("contact", "pretrain", r"\d\d", None),
+    ("code_snippet", "pretrain", "|".join(map(re.escape, CODE_SNIPPETS)), None),
+    ("code_keyword", "advanced", r"\b(?:function|var|let|const|class)\b|\b(?:import|export)\s",
+     r"function|var|let|const|class|import|export"),
+]
+# (规则名, 所属规则集, 子串)：在 lower() 后的行中查找，与原脚本相同
+LOWER_RULES = [
+    ("crawler_log", "pretrain", ("detected behavior", "user-agent")),
+]
+# advanced 原本作用在只去掉行首空白的行上，\b(?:import|export)\s 能匹配行尾的空白；
+# 这里统一在 strip 后的行上判定，行尾是这两个词且原行有尾随空白时单独补判
+TRAILING_KEYWORD = re.compile(r"\b(?:import|export)$")
+LENGTH_RULE = ("length", "pretrain")
+WORDS_RULE = ("too_few_words", "advanced")
+
+WORD_PATTERN = re.compile(r"\b[A-Za-z\u4e00-\u9fff]{4,}\b")
+
+
+def _combine(rules, rulesets):
+    parts = [f"(?P<{name}>{pat})" for name, rs, pat in rules if rs in rulesets]
+    return re.compile("|".join(parts)) if parts else None
+
+
+def rule_names(rulesets=RULESETS):
+    names = [name for name, rs, _ in LEAD_RULES if rs in rulesets]
+    names += [LENGTH_RULE[0]] if LENGTH_RULE[1] in rulesets else []
+    names += [name for name, rs, _ in ANCHORED_RULES if rs in rulesets]
+    names += [rule[0] for rule in SEARCH_RULES + LOWER_RULES if rule[1] in rulesets]
+    names += [WORDS_RULE[0]] if WORDS_RULE[1] in rulesets else []
+    return names
+
+
+class TextCleaner:
+    """
+    - rulesets: 启用的规则集，"advanced" / "pretrain" 的任意组合
+    - min_tok / max_tok: pretrain 的词数范围（同 clean_pretrain.is_short_or_long）
+    stats 记录每条规则拒绝的行数，以及 "kept"（保留）和 "empty"（空行）。
+    输出与原脚本一致：启用 pretrain 时去掉两端空白，只有 advanced 时只去掉行首空白。
+    """
+
+    def __init__(self, rulesets=RULESETS, min_tok: int = 5, max_tok: int = 200):
+        rulesets = tuple(rulesets)
+        unknown = set(rulesets) - set(RULESETS)
+        if unknown:
+            raise ValueError(f"Unknown rulesets: {sorted(unknown)}")
+        self.rulesets = rulesets
+        self.min_tok = min_tok
+        self.max_tok = max_tok
+        self._lead = _combine(LEAD_RULES, rulesets)
+        self._anchored = _combine(ANCHORED_RULES, rulesets)
+        self._search = [(name, re.compile(pat), pre and re.compile(pre))
+                        for name, rs, pat, pre in SEARCH_RULES if rs in rulesets]
+        self._lower = [(name, subs) for name, rs, subs in LOWER_RULES if rs in rulesets]
+        self._check_length = LENGTH_RULE[1] in rulesets
+        self._check_words = WORDS_RULE[1] in rulesets
+        self._trailing_keyword = "advanced" in rulesets
+        self._lstrip_only = "pretrain" not in rulesets
+        self.stats = Counter()
+
+    def reject_reason(self, line: str, trailing_space: bool = False):
+        """
+        line 须已 strip 且非空，trailing_space 表示原行是否有尾随空白；
+        返回拒绝它的规则名，保留则返回 None
+        """
+        if self._lead is not None:
+            m = self._lead.match(line)
+            if m:
+                return m.lastgroup
+        if self._check_length:
+            n = len(line.split())
+            if n < self.min_tok or n > self.max_tok:
+                return LENGTH_RULE[0]
+        if self._anchored is not None:
+            m = self._anchored.match(line)
+            if m:
+                return m.lastgroup
+        for name, pat, pre in self._search:
+            if (pre is None or pre.search(line)) and pat.search(line):
+                return name
+        if self._lower:
+            lower = line.lower()
+            for name, subs in self._lower:
+                if any(sub in lower for sub in subs):
+                    return name
+        if trailing_space and self._trailing_keyword and TRAILING_KEYWORD.search(line):
+            return "code_keyword"
+        if self._check_words:
+            words = WORD_PATTERN.finditer(line)
+            if next(words, None) is None or next(words, None) is None:
+                return WORDS_RULE[0]
+        return None
+
+    def clean_lines(self, lines):
+        """逐行清洗，产出保留的行（已 strip，只有 advanced 时为 lstrip），同时更新 stats"""
+        stats = self.stats
+        for raw in lines:
+            body = raw.rstrip("\n")
+            line = body.strip()
+            if not line:
+                stats["empty"] += 1
+                continue
+            reason = self.reject_reason(line, body[-1].isspace())
+            if reason is None:
+                stats["kept"] += 1
+                yield body.lstrip() if self._lstrip_only else line
+            else:
+                stats[reason] += 1
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+WARC / WET .gz 的记录级随机访问索引。
+
+Common Crawl 的 .warc.gz / .wet.gz 是多 member gzip，每条记录单独压缩成一个 member。
+扫描一遍文件（逐 member 解压，只保留 WARC 头），把每条记录的 member 偏移、压缩长度、
+Content-Length、WARC-Type 与 URI 存进同目录的紧凑旁路文件 <文件>.idx.npz：
+
+  offsets   uint64  member 在文件中的起始字节
+  lengths   uint32  member 的压缩长度
+  clens     uint64  记录的 Content-Length
+  types     uint8   WARC-Type 在 TYPES 中的下标
+  uri_blob  uint8   所有 WARC-Target-URI 以 \\n 连接后的 UTF-8 字节，uri_ends 为各自的结束位置
+  meta      JSON    源文件大小 / mtime、记录数、是否被截断
+
+有了索引，任意记录区间 [i, j) 对应一段连续字节，不同进程可以各自解压互不重叠的区间；
+中断的任务也可以从记录号精确续跑。源文件大小或 mtime 变化时索引自动失效。
+"""
+import io
+import json
+import os
+import zlib
+
+import numpy as np
+from warcio.archiveiterator import ArchiveIterator
+
+from utils.shards import read_range
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx.npz"
+TYPES = ("warcinfo", "response", "request", "metadata", "conversion", "resource", "revisit", "other")
+# 扫描时每次读取的压缩字节数
+READ_BYTES = 1 << 20
+# 每个 member 只保留解压后的前若干字节用于解析 WARC 头
+HEAD_BYTES = 1 << 14
+
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def parse_warc_head(head: bytes):
+    """解析 WARC 头，返回 (头部长度（含空行）, {小写字段名: 值})；头不完整时返回 (None, {})"""
+    end = head.find(b"\r\n\r\n")
+    if end < 0 or not head.startswith(b"WARC/"):
+        return None, {}
+    fields = {}
+    for line in head[:end].split(b"\r\n")[1:]:
+        name, sep, value = line.partition(b":")
+        if sep:
+            fields[name.strip().lower().decode("latin-1")] = value.strip().decode("utf-8", errors="replace")
+    return end + 4, fields
+
+
+def scan_members(f):
+    """
+    逐个 gzip member 解压，产出 (偏移, 压缩长度, 解压后前 HEAD_BYTES 字节, 解压后总长度)。
+    文件末尾不完整的 member 会引发 EOFError（此前的 member 都已产出）。
+    """
+    pos, buf = 0, b""
+    while True:
+        if not buf:
+            buf = f.read(READ_BYTES)
+            if not buf:
+                return
+        start, head, total = pos, b"", 0
+        d = zlib.decompressobj(31)
+        while not d.eof:
+            if not buf:
+                buf = f.read(READ_BYTES)
+                if not buf:
+                    raise EOFError(f"gzip member at byte {start} is truncated")
+            out = d.decompress(buf)
+            pos += len(buf) - len(d.unused_data)
+            buf = d.unused_data
+            if len(head) < HEAD_BYTES:
+                head += out[:HEAD_BYTES - len(head)]
+            total += len(out)
+        yield start, pos - start, head, total
+
+
+class WarcIndex:
+    """
+    - offsets / lengths / clens / types: 见模块说明
+    - meta: 源文件信息；meta["truncated"] 为真表示文件末尾有不完整的 member，索引只含此前的记录
+    """
+
+    def __init__(self, path, offsets, lengths, clens, types, uri_blob, uri_ends, meta):
+        self.path = path
+        self.offsets = offsets
+        self.lengths = lengths
+        self.clens = clens
+        self.types = types
+        self._uri_blob = uri_blob
+        self._uri_ends = uri_ends
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @staticmethod
+    def _source_meta(path):
+        st = os.stat(path)
+        return {"version": INDEX_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    @classmethod
+    def build(cls, path: str, save: bool = True) -> "WarcIndex":
+        """扫描 path 建立索引；save 为真时写入旁路文件（先写临时文件再 rename）"""
+        meta = cls._source_meta(path)
+        offsets, lengths, clens, types, uris = [], [], [], [], []
+        truncated = False
+        with open(path, "rb") as f:
+            try:
+                for off, length, head, total in scan_members(f):
+                    head_len, fields = parse_warc_head(head)
+                    if head_len is None:
+                        raise ValueError(f"{path}: member at byte {off} does not start with a WARC header")
+                    clen = int(fields.get("content-length", 0))
+                    # 记录 = 头 + 内容 + \r\n\r\n；member 比一条记录长说明不是逐记录压缩的
+                    if total > head_len + clen + 4:
+                        raise ValueError(f"{path}: member at byte {off} holds more than one record; "
+                                         "random access needs one gzip member per record")
+                    rtype = fields.get("warc-type", "other")
+                    offsets.append(off)
+                    lengths.append(length)
+                    clens.append(clen)
+                    types.append(TYPES.index(rtype) if rtype in TYPES else TYPES.index("other"))
+                    uris.append(fields.get("warc-target-uri", "").replace("\n", " "))
+            except EOFError:
+                truncated = True
+            except zlib.error as e:
+                raise ValueError(f"{path}: not a multi-member gzip file ({e})") from None
+        meta.update(records=len(offsets), truncated=truncated)
+        blob = "\n".join(uris).encode("utf-8")
+        ends = np.cumsum([len(u.encode("utf-8")) + 1 for u in uris], dtype=np.uint64) - 1 \
+            if uris else np.zeros(0, dtype=np.uint64)
+        idx = cls(path, np.asarray(offsets, dtype=np.uint64), np.asarray(lengths, dtype=np.uint32),
+                  np.asarray(clens, dtype=np.uint64), np.asarray(types, dtype=np.uint8),
+                  np.frombuffer(blob, dtype=np.uint8), ends, meta)
+        if save:
+            idx.save()
+        return idx
+
+    def save(self):
+        out = index_path(self.path)
+        tmp = out + ".tmp.npz"
+        np.savez(tmp, offsets=self.offsets, lengths=self.lengths, clens=self.clens, types=self.types,
+                 uri_blob=self._uri_blob, uri_ends=self._uri_ends, meta=np.array(json.dumps(self.meta)))
+        os.replace(tmp, out)
+
+    @classmethod
+    def load(cls, path: str):
+        """读取旁路索引；不存在或源文件已改动时返回 None"""
+        try:
+            data = np.load(index_path(path))
+        except FileNotFoundError:
+            return None
+        with data:
+            meta = json.loads(str(data["meta"]))
+            if {k: meta.get(k) for k in ("version", "size", "mtime_ns")} != cls._source_meta(path):
+                return None
+            return cls(path, data["offsets"], data["lengths"], data["clens"], data["types"],
+                       data["uri_blob"], data["uri_ends"], meta)
+
+    @classmethod
+    def open(cls, path: str) -> "WarcIndex":
+        """有效索引存在则读取，否则建立并保存"""
+        return cls.load(path) or cls.build(path)
+
+    def uri(self, i: int) -> str:
+        start = int(self._uri_ends[i - 1]) + 1 if i else 0
+        return bytes(self._uri_blob[start:int(self._uri_ends[i])]).decode("utf-8")
+
+    def rec_type(self, i: int) -> str:
+        return TYPES[self.types[i]]
+
+    def byte_range(self, i: int, j: int):
+        """记录 [i, j) 对应的 [start, end) 字节区间"""
+        if i >= j:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[j - 1]) + int(self.lengths[j - 1])
+
+    def batches(self, size: int, start: int = 0, end: int = None):
+        """把记录 [start, end) 切成每段至多 size 条的 (i, j) 区间"""
+        end = len(self) if end is None else end
+        return [(i, min(i + size, end)) for i in range(start, end, size)]
+
+
+def iter_range_records(path: str, start: int, end: int):
+    """解压 [start, end) 字节区间内的 member（须为 byte_range 给出的边界），按顺序产出 warcio 记录"""
+    yield from ArchiveIterator(io.BytesIO(read_range(path, start, end)))
+
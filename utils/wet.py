@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+WET 记录流式解析。
+
+按 WARC 头里的 Content-Length 切分记录：每次从（已解压的）二进制流读取一大块，
+只在缓冲区里查找头部结束的 \\r\\n\\r\\n 并解析这几行头字段，正文按长度整块切出，
+不逐行处理正文；每条正文只复制一次（从读缓冲切片成 bytes）。
+只产出 conversion 记录（纯文本正文），warcinfo 等记录跳过。
+"""
+import gzip
+from collections import namedtuple
+
+# 每次从流中读取的字节数
+READ_BYTES = 1 << 22
+
+WetRecord = namedtuple("WetRecord", ["uri", "lang", "date", "record_id", "payload"])
+WetRecord.__doc__ = "payload 为正文 bytes（UTF-8）；lang 为 WARC-Identified-Content-Language（可能是逗号分隔的多个）"
+
+
+def parse_headers(block: bytes) -> dict:
+    """WARC 头块（不含首行与结尾空行）→ {小写字段名: 值}"""
+    fields = {}
+    for line in block.split(b"\r\n"):
+        name, sep, value = line.partition(b":")
+        if sep:
+            fields[name.strip().lower().decode("latin-1")] = value.strip().decode("utf-8", errors="replace")
+    return fields
+
+
+def iter_wet_records(stream, rec_types=("conversion",)):
+    """
+    stream: 已解压的二进制流（如 gzip.open(path, "rb")），需支持 read(n)。
+    按顺序产出 WetRecord；文件末尾不完整的记录会引发 EOFError。
+    """
+    buf, pos, eof = b"", 0, False
+
+    def fill(need):
+        """保证 buf[pos:] 至少有 need 字节；不够时才读取，并顺便丢弃已消费的部分。返回是否足够"""
+        nonlocal buf, pos, eof
+        if len(buf) - pos >= need:
+            return True
+        parts = [buf[pos:]]
+        have, pos = len(parts[0]), 0
+        while have < need and not eof:
+            chunk = stream.read(max(READ_BYTES, need - have))
+            if not chunk:
+                eof = True
+                break
+            parts.append(chunk)
+            have += len(chunk)
+        buf = b"".join(parts)
+        return have >= need
+
+    while True:
+        # 记录之间是 \r\n\r\n，找到下一条记录的开头
+        start = buf.find(b"WARC/", pos)
+        while start < 0:
+            if eof:
+                return
+            pos = max(pos, len(buf) - 4)  # "WARC/" 可能跨越读块边界
+            fill(len(buf) - pos + 1)
+            start = buf.find(b"WARC/", pos)
+        pos = start
+        head_end = buf.find(b"\r\n\r\n", pos)
+        while head_end < 0:
+            if eof:
+                raise EOFError("truncated WARC header at end of stream")
+            fill(len(buf) - pos + 1)
+            head_end = buf.find(b"\r\n\r\n", pos)
+        fields = parse_headers(buf[buf.find(b"\r\n", pos) + 2:head_end])
+        length = int(fields.get("content-length", 0))
+        body = head_end + 4 - pos
+        if not fill(body + length):
+            raise EOFError("truncated WARC record at end of stream")
+        if fields.get("warc-type") in rec_types:
+            yield WetRecord(fields.get("warc-target-uri", ""),
+                            fields.get("warc-identified-content-language", ""),
+                            fields.get("warc-date", ""),
+                            fields.get("warc-record-id", ""),
+                            buf[pos + body:pos + body + length])
+        pos += body + length
+
+
+def open_wet(path: str):
+    """按扩展名打开 .wet / .wet.gz（多 member gzip 由 gzip 模块透明处理）"""
+    return gzip.open(path, "rb") if path.endswith((".gz", ".gzip")) else open(path, "rb")
+
+
+def iter_wet_file(path: str, rec_types=("conversion",)):
+    with open_wet(path) as f:
+        yield from iter_wet_records(f, rec_types)